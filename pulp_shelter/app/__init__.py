@@ -1,3 +1,5 @@
+from django.db.models.signals import post_delete, post_save
+
 from pulpcore.plugin import PulpPluginAppConfig
 
 
@@ -6,3 +8,18 @@ class PulpShelterPluginAppConfig(PulpPluginAppConfig):
 
     name = 'pulp_shelter.app'
     label = 'shelter'
+
+    def ready(self):
+        """
+        Connect the receivers keeping columnar snapshots in step with repository versions.
+
+        They are connected in every process, rather than only in those which happen to import
+        :mod:`pulp_shelter.app.columns`.
+        """
+        super().ready()
+        # Models can only be imported once the apps are loaded.
+        from pulpcore.plugin.models import RepositoryVersion
+        from pulp_shelter.app.columns import invalidate_repository, remove_repository_version
+
+        post_save.connect(invalidate_repository, sender=RepositoryVersion)
+        post_delete.connect(remove_repository_version, sender=RepositoryVersion)
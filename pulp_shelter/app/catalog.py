@@ -0,0 +1,163 @@
+"""
+The catalog of a shelter publication.
+
+The catalog lists every published animal in the manifest format, grouped by shelter. It is
+written uncompressed and in every available :data:`ENCODINGS`, each shelter being compressed
+independently, so that a client can fetch and decompress a single shelter with an HTTP range
+request. The ranges, along with the digest of every file, are listed in a small index.
+"""
+import json
+import os
+import zlib
+
+from pulp_shelter.app.manifest import encode_entry
+from pulp_shelter.app.utils import file_digests
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+CATALOG_NAME = 'animals.ndjson'
+
+INDEX_NAME = 'index.json'
+
+
+class Identity:
+    """
+    A compressor which leaves the data as it is.
+    """
+
+    def compress(self, data):
+        """
+        Return the data unchanged.
+        """
+        return data
+
+    def flush(self):
+        """
+        Return no buffered data, as there is none.
+        """
+        return b''
+
+
+def gzip_compressor():
+    """
+    Return a compressor writing a gzip member.
+
+    Concatenated gzip members form a valid gzip file, while each of them can also be
+    decompressed on its own.
+    """
+    return zlib.compressobj(9, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+
+
+ENCODINGS = [('', Identity), ('.gz', gzip_compressor)]
+if zstandard is not None:
+    # Like gzip members, concatenated zstd frames form a valid zstd file.
+    ENCODINGS.append(('.zst', lambda: zstandard.ZstdCompressor(level=19).compressobj()))
+
+
+class CatalogWriter:
+    """
+    Write the catalog and its index into the working directory.
+
+    Use it as a context manager, calling :meth:`write_shelter` once per shelter::
+
+        with CatalogWriter() as catalog:
+            for shelter, entries in shelters:
+                catalog.write_shelter(shelter, entries)
+        paths = catalog.paths
+    """
+
+    def __init__(self, directory='', name=CATALOG_NAME, index_name=INDEX_NAME):
+        """
+        Write the catalog and its index into the working directory.
+
+        Args:
+            directory (str): A subdirectory to write the files into.
+            name (str): The name of the uncompressed catalog, compressed ones get a suffix.
+            index_name (str): The name of the index.
+
+        """
+        self.directory = directory
+        self.names = {name + suffix: compressor for suffix, compressor in ENCODINGS}
+        self.index_name = index_name
+        self.files = {}
+        self.shelters = {}
+
+    def __enter__(self):
+        """
+        Open every catalog file.
+        """
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+        self.files = {name: open(self.path(name), 'wb') for name in self.names}
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        """
+        Close every catalog file, and write the index unless an error occurred.
+        """
+        for fp in self.files.values():
+            fp.close()
+        if exc_type is None:
+            self.write_index()
+
+    @property
+    def paths(self):
+        """
+        The paths of all written files, the index being the last one.
+        """
+        return [self.path(name) for name in self.names] + [self.path(self.index_name)]
+
+    def path(self, name):
+        """
+        Return the path of a file within the directory of the catalog.
+
+        Args:
+            name (str): The name of the file.
+
+        Returns:
+            str: The path relative to the working directory.
+
+        """
+        return os.path.join(self.directory, name)
+
+    def write_shelter(self, shelter, entries):
+        """
+        Append the animals of a shelter to every catalog file.
+
+        Args:
+            shelter (str): The name of the shelter.
+            entries (iterable): Manifest entries of the animals in the shelter.
+
+        """
+        compressors = {name: compressor() for name, compressor in self.names.items()}
+        offsets = {name: fp.tell() for name, fp in self.files.items()}
+        count = 0
+        for entry in entries:
+            line = encode_entry(entry).encode()
+            for name, fp in self.files.items():
+                fp.write(compressors[name].compress(line))
+            count += 1
+        for name, fp in self.files.items():
+            fp.write(compressors[name].flush())
+        self.shelters[shelter] = {
+            'count': count,
+            'ranges': {
+                name: [offsets[name], fp.tell() - offsets[name]]
+                for name, fp in self.files.items()
+            }
+        }
+
+    def write_index(self):
+        """
+        Write the index of the size and digest of every file, and the ranges of every shelter.
+        """
+        index = {
+            'files': {name: file_digests(self.path(name), ('sha256',)) for name in self.names},
+            'shelters': self.shelters,
+        }
+        with open(self.path(self.index_name), 'w') as fp:
+            json.dump(index, fp, indent=2, sort_keys=True)
@@ -0,0 +1,454 @@
+"""
+A columnar snapshot of the animals of a repository version, for analytics and matching.
+
+The snapshot of a version is a directory of NumPy arrays, one per field, which is memory-mapped
+rather than read: every API and worker process of a host shares the pages of the same copy, and
+only the pages of the columns a question reads are ever loaded. Categorical fields are
+dictionary-encoded, each animal holding the index of its value in the sorted values of the
+field, and the words of the bios are stored as an inverted index.
+
+The content of a complete repository version never changes, so its snapshot is written once,
+on first use, and removed with the version. Processes keep the snapshots they opened most
+recently, and drop those of the older versions of a repository once they use a newer one, or
+save one themselves.
+
+Snapshots need the optional ``numpy`` package.
+"""
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import uuid
+from array import array
+from collections import OrderedDict
+
+from django.conf import settings
+from pulp_shelter.app.lookup import NATURAL_KEY
+from pulp_shelter.app.models import Animal
+from pulp_shelter.app.utils import optional_module
+
+
+# Only imported once a snapshot is used, sparing its import to processes which never do.
+numpy = optional_module('numpy')
+
+
+# Where the snapshots of repository versions are written.
+COLUMNS_DIR = getattr(
+    settings, 'SHELTER_COLUMNS_DIR', os.path.join(settings.MEDIA_ROOT, 'shelter', 'columns')
+)
+
+# The number of repository versions whose snapshot is kept open by a process.
+COLUMN_SNAPSHOTS = getattr(settings, 'SHELTER_COLUMN_SNAPSHOTS', 4)
+
+# Bumped whenever the layout of a snapshot changes, so that older snapshots are rewritten.
+FORMAT_VERSION = 1
+
+CATEGORICAL_FIELDS = ('species', 'breed', 'shelter', 'sex')
+
+NUMERIC_FIELDS = ('age', 'weight', 'reserved')
+
+FIELDS = ('pk',) + CATEGORICAL_FIELDS + NUMERIC_FIELDS + ('bio',)
+
+META_NAME = 'meta.json'
+
+TOKEN = re.compile(r'\w+')
+
+
+def words(text):
+    """
+    Return the distinct words of a text, as the words of bios are indexed.
+
+    Args:
+        text (str): The text.
+
+    Returns:
+        set: The lowercase words.
+
+    """
+    return set(TOKEN.findall(text.lower()))
+
+
+def write_columns(directory, rows):
+    """
+    Write the snapshot of animals into a directory.
+
+    The snapshot is written next to the directory and renamed into place, so a snapshot is
+    never seen half written. If another process wrote it first, that one is kept.
+
+    Args:
+        directory (str): The directory of the snapshot, which should not exist yet.
+        rows (iterable): The values of the :data:`FIELDS` of every animal.
+
+    """
+    pks = bytearray()
+    values = {field: {} for field in CATEGORICAL_FIELDS}
+    codes = {field: array('i') for field in CATEGORICAL_FIELDS}
+    numbers = {'age': array('i'), 'weight': array('d'), 'reserved': array('b')}
+    word_codes = {}
+    word_rows, word_ids = array('i'), array('i')
+
+    for row, (pk, *fields) in enumerate(rows):
+        pks += pk.bytes
+        for field, value in zip(CATEGORICAL_FIELDS, fields):
+            codes[field].append(values[field].setdefault(value, len(values[field])))
+        for field, value in zip(NUMERIC_FIELDS, fields[len(CATEGORICAL_FIELDS):]):
+            numbers[field].append(value)
+        for word in words(fields[-1]):
+            word_rows.append(row)
+            word_ids.append(word_codes.setdefault(word, len(word_codes)))
+
+    columns = {
+        'pk': numpy.array(pks, dtype=numpy.uint8).reshape(-1, 16),
+        'age': numpy.array(numbers['age'], dtype=numpy.int32),
+        'weight': numpy.array(numbers['weight'], dtype=numpy.float64),
+        'reserved': numpy.array(numbers['reserved'], dtype=bool),
+    }
+    dictionaries = {}
+    for field in CATEGORICAL_FIELDS:
+        # Codes follow the sorted values, so that they also sort like the values.
+        dictionaries[field] = sorted(values[field])
+        recode = numpy.zeros(len(values[field]), dtype=numpy.int32)
+        for code, value in enumerate(dictionaries[field]):
+            recode[values[field][value]] = code
+        columns[field] = recode[numpy.array(codes[field], dtype=numpy.int32)]
+
+    # The rows of every word, grouped by word: those of word ``i`` are
+    # ``word_rows[word_offsets[i]:word_offsets[i + 1]]``.
+    word_ids = numpy.array(word_ids, dtype=numpy.int32)
+    order = numpy.argsort(word_ids, kind='stable')
+    columns['word_rows'] = numpy.array(word_rows, dtype=numpy.int32)[order]
+    columns['word_offsets'] = numpy.zeros(len(word_codes) + 1, dtype=numpy.int64)
+    numpy.cumsum(numpy.bincount(word_ids, minlength=len(word_codes)),
+                 out=columns['word_offsets'][1:])
+    dictionaries['words'] = sorted(word_codes, key=word_codes.get)
+
+    parent = os.path.dirname(os.path.abspath(directory))
+    os.makedirs(parent, exist_ok=True)
+    working = tempfile.mkdtemp(dir=parent, prefix='.')
+    try:
+        for name, column in columns.items():
+            numpy.save(os.path.join(working, name + '.npy'), column)
+        with open(os.path.join(working, META_NAME), 'w') as fp:
+            json.dump({
+                'format': FORMAT_VERSION,
+                'count': len(columns['pk']),
+                'dictionaries': dictionaries
+            }, fp)
+        os.rename(working, directory)
+    except OSError:
+        if not os.path.isdir(directory):
+            raise
+    finally:
+        shutil.rmtree(working, ignore_errors=True)
+
+
+class ColumnSnapshot:
+    """
+    The memory-mapped snapshot of animals, column by column.
+
+    Every categorical column holds codes, which index the :attr:`dictionaries` of the field.
+    """
+
+    def __init__(self, directory):
+        """
+        Map the snapshot in a directory.
+
+        Args:
+            directory (str): The directory of the snapshot.
+
+        Raises:
+            ValueError: If the snapshot is of another format.
+
+        """
+        with open(os.path.join(directory, META_NAME)) as fp:
+            meta = json.load(fp)
+        if meta['format'] != FORMAT_VERSION:
+            raise ValueError('Snapshot format {found} is not {expected}.'.format(
+                found=meta['format'], expected=FORMAT_VERSION
+            ))
+        self.directory = directory
+        self.dictionaries = meta['dictionaries']
+        self.codes = {
+            field: {value: code for code, value in enumerate(dictionary)}
+            for field, dictionary in self.dictionaries.items()
+        }
+        self.columns = {}
+        for name in ('pk',) + CATEGORICAL_FIELDS + NUMERIC_FIELDS + ('word_rows', 'word_offsets'):
+            self.columns[name] = numpy.load(os.path.join(directory, name + '.npy'), mmap_mode='r')
+        self.count = meta['count']
+
+    def __len__(self):
+        """
+        Return the number of animals.
+        """
+        return self.count
+
+    def __getitem__(self, field):
+        """
+        Return the column of a field.
+
+        Args:
+            field (str): The field.
+
+        Returns:
+            numpy.ndarray: The values of the field, or their codes for a categorical field.
+
+        """
+        return self.columns[field]
+
+    def code(self, field, value):
+        """
+        Return the code of a value of a categorical field.
+
+        Args:
+            field (str): The categorical field.
+            value (str): The value.
+
+        Returns:
+            int: The code of the value, None if no animal has it.
+
+        """
+        return self.codes[field].get(value)
+
+    def pks(self, rows):
+        """
+        Return the primary keys of animals.
+
+        Args:
+            rows (iterable): The rows of the animals.
+
+        Returns:
+            list: The primary keys, as UUIDs.
+
+        """
+        return [uuid.UUID(bytes=self.columns['pk'][row].tobytes()) for row in rows]
+
+    def word_hits(self, keywords):
+        """
+        Count how many of the keywords the bio of every animal contains.
+
+        Args:
+            keywords (iterable): Lowercase words.
+
+        Returns:
+            numpy.ndarray: The number of keywords found in the bio of every animal.
+
+        """
+        hits = numpy.zeros(len(self), dtype=numpy.int32)
+        offsets = self.columns['word_offsets']
+        for keyword in set(keywords):
+            code = self.codes['words'].get(keyword)
+            if code is not None:
+                hits[self.columns['word_rows'][offsets[code]:offsets[code + 1]]] += 1
+        return hits
+
+    def groups(self, group_by):
+        """
+        Split the animals by the value of a categorical field.
+
+        Args:
+            group_by (str): The categorical field, None for a single group of every animal.
+
+        Returns:
+            list: Tuples of the value and the rows of every group with animals, sorted by value.
+
+        """
+        if group_by is None:
+            return [(None, numpy.arange(len(self)))]
+        codes = self.columns[group_by]
+        order = numpy.argsort(codes, kind='stable')
+        boundaries = numpy.cumsum(numpy.bincount(codes, minlength=len(
+            self.dictionaries[group_by]
+        )))
+        groups = []
+        start = 0
+        for code, end in enumerate(boundaries):
+            if end > start:
+                groups.append((self.dictionaries[group_by][code], order[start:end]))
+            start = end
+        return groups
+
+    def counts(self, field, group_by=None):
+        """
+        Count the animals by the value of a categorical field.
+
+        Args:
+            field (str): The categorical field.
+            group_by (str): The categorical field to count each value of separately.
+
+        Returns:
+            dict: The number of animals of every value, by the value of ``group_by`` if given.
+
+        """
+        dictionary = self.dictionaries[field]
+        counts = {}
+        for group, rows in self.groups(group_by):
+            found = numpy.bincount(self.columns[field][rows], minlength=len(dictionary))
+            counts[group] = {dictionary[code]: int(count)
+                             for code, count in enumerate(found) if count}
+        return counts[None] if group_by is None else counts
+
+    def describe(self, field, group_by=None):
+        """
+        Summarize the values of a numeric field.
+
+        Outliers are the values beyond 1.5 interquartile ranges from the quartiles.
+
+        Args:
+            field (str): The numeric field.
+            group_by (str): The categorical field to summarize each value of separately.
+
+        Returns:
+            dict: The ``count``, ``min``, ``max``, ``mean``, ``std`` and ``quartiles`` of the
+                values, with the ``fences`` and number of ``outliers``, by the value of
+                ``group_by`` if given.
+
+        """
+        summaries = {}
+        for group, rows in self.groups(group_by):
+            values = numpy.asarray(self.columns[field][rows], dtype=numpy.float64)
+            if not len(values):
+                summaries[group] = {'count': 0}
+                continue
+            quartiles = numpy.percentile(values, (25, 50, 75))
+            spread = 1.5 * (quartiles[2] - quartiles[0])
+            fences = (quartiles[0] - spread, quartiles[2] + spread)
+            summaries[group] = {
+                'count': len(values),
+                'min': float(values.min()),
+                'max': float(values.max()),
+                'mean': float(values.mean()),
+                'std': float(values.std()),
+                'quartiles': [float(quartile) for quartile in quartiles],
+                'fences': [float(fence) for fence in fences],
+                'outliers': int(((values < fences[0]) | (values > fences[1])).sum()),
+            }
+        return summaries[None] if group_by is None else summaries
+
+
+def read_columns(repository_version):
+    """
+    Map the snapshot of a repository version, writing it first if there is none.
+
+    Args:
+        repository_version (pulpcore.plugin.models.RepositoryVersion): A complete version.
+
+    Returns:
+        ColumnSnapshot: The snapshot of the version.
+
+    """
+    directory = os.path.join(COLUMNS_DIR, str(repository_version.pk))
+    try:
+        return ColumnSnapshot(directory)
+    except (OSError, ValueError):
+        shutil.rmtree(directory, ignore_errors=True)
+    rows = Animal.objects.filter(
+        pk__in=repository_version.content
+    ).order_by(*NATURAL_KEY).values_list(*FIELDS)
+    write_columns(directory, rows.iterator())
+    return ColumnSnapshot(directory)
+
+
+class SnapshotCache:
+    """
+    The snapshots of the repository versions opened by a process, least recently used first.
+
+    Versions are mostly created and deleted by task workers, and the signals of their models
+    are only received by the process saving or deleting them. Other processes rather learn of
+    the new version of a repository when it is first used: the snapshots of the older versions
+    are dropped then.
+    """
+
+    def __init__(self, maxsize=COLUMN_SNAPSHOTS):
+        """
+        The snapshots of the repository versions opened by a process.
+
+        Args:
+            maxsize (int): The most snapshots to keep open.
+
+        """
+        self.maxsize = maxsize
+        self.snapshots = OrderedDict()
+        self.lock = threading.Lock()
+        # Counts the invalidations, for snapshots read meanwhile not to be kept.
+        self.generation = 0
+
+    def get(self, repository_version):
+        """
+        Return the snapshot of a repository version.
+
+        The snapshots of the older versions of the same repository are dropped. Reading a
+        snapshot can take a while, so it is done without holding the lock: threads reading the
+        same version at once keep the snapshot of the first one to be done, and a snapshot read
+        while the cache was invalidated is returned without being kept.
+
+        Args:
+            repository_version (pulpcore.plugin.models.RepositoryVersion): A complete version.
+
+        Returns:
+            ColumnSnapshot: The snapshot of the version.
+
+        """
+        with self.lock:
+            entry = self.snapshots.get(repository_version.pk)
+            if entry is not None:
+                self.snapshots.move_to_end(repository_version.pk)
+                return entry[2]
+            generation = self.generation
+        snapshot = read_columns(repository_version)
+        with self.lock:
+            if generation != self.generation:
+                return snapshot
+            entry = self.snapshots.get(repository_version.pk)
+            if entry is None:
+                for pk, (repository_pk, number, cached) in list(self.snapshots.items()):
+                    if repository_pk == repository_version.repository_id and \
+                            number < repository_version.number:
+                        del self.snapshots[pk]
+                entry = (repository_version.repository_id, repository_version.number, snapshot)
+                self.snapshots[repository_version.pk] = entry
+                if len(self.snapshots) > self.maxsize:
+                    self.snapshots.popitem(last=False)
+            self.snapshots.move_to_end(repository_version.pk)
+            return entry[2]
+
+    def invalidate(self, repository_pk=None, repository_version_pk=None):
+        """
+        Drop the snapshots of a repository, or of a repository version.
+
+        Args:
+            repository_pk: The primary key of the repository.
+            repository_version_pk: The primary key of the repository version.
+
+        """
+        with self.lock:
+            self.generation += 1
+            for pk, (snapshot_repository_pk, number, snapshot) in list(self.snapshots.items()):
+                if repository_pk == snapshot_repository_pk or repository_version_pk == pk:
+                    del self.snapshots[pk]
+
+
+SNAPSHOTS = SnapshotCache()
+
+
+def invalidate_repository(sender, instance, created, **kwargs):
+    """
+    Drop the snapshots of the older versions of a repository, once it has a new version.
+
+    Connected by the app config of the plugin, in every process.
+    """
+    if created:
+        SNAPSHOTS.invalidate(repository_pk=instance.repository_id)
+
+
+def remove_repository_version(sender, instance, **kwargs):
+    """
+    Drop the snapshot of a deleted repository version, and remove it from the disk.
+
+    Connected by the app config of the plugin, in every process, so that the snapshot is
+    removed whichever process deletes the version.
+    """
+    SNAPSHOTS.invalidate(repository_version_pk=instance.pk)
+    shutil.rmtree(os.path.join(COLUMNS_DIR, str(instance.pk)), ignore_errors=True)
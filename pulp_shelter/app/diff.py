@@ -0,0 +1,116 @@
+"""
+Compute which animals were added, removed or changed between two repository versions.
+
+Content units are immutable and an :class:`~pulp_shelter.app.models.Animal` is identified by
+``species``, ``breed``, ``name`` and ``shelter``, so a "changed" animal shows up as one unit
+removed and another one added. Such pairs are matched on :data:`DIFF_IDENTITY` and reported
+once, together with the fields which differ.
+"""
+from collections import defaultdict
+
+from django.db.models import Exists, OuterRef
+
+from pulp_shelter.app.models import Animal
+
+
+DIFF_IDENTITY = ('species', 'breed', 'name')
+
+DIFF_FIELDS = ('species', 'breed', 'name', 'age', 'sex', 'weight', 'bio', 'shelter',
+               'reserved', 'picture')
+
+CHUNK_SIZE = 2000
+
+ADDED = 'added'
+REMOVED = 'removed'
+CHANGED = 'changed'
+
+
+def diff_versions(base_version, version):
+    """
+    Yield the differences in animals between two repository versions.
+
+    Added and removed animals are streamed from server-side cursors. Only the animals which
+    pair up as changed are held in memory, as they have to be matched with each other.
+
+    Args:
+        base_version (pulpcore.plugin.models.RepositoryVersion): The version to compare from.
+        version (pulpcore.plugin.models.RepositoryVersion): The version to compare to.
+
+    Yields:
+        dict: A record with the kind of ``change`` and the ``animal`` it applies to. Records
+            of changed animals also carry the old and new value of each differing field.
+
+    """
+    added = Animal.objects.filter(pk__in=version.content).exclude(
+        pk__in=base_version.content
+    )
+    removed = Animal.objects.filter(pk__in=base_version.content).exclude(
+        pk__in=version.content
+    )
+    added, removed = (
+        added.annotate(paired=Exists(removed.filter(**_identity_refs()))),
+        removed.annotate(paired=Exists(added.filter(**_identity_refs()))),
+    )
+
+    for change, queryset in ((REMOVED, removed), (ADDED, added)):
+        for animal in _rows(queryset.filter(paired=False)):
+            yield {'change': change, 'animal': animal}
+
+    old_by_identity = _group(_rows(removed.filter(paired=True)))
+    new_by_identity = _group(_rows(added.filter(paired=True)))
+    for identity in sorted(new_by_identity):
+        old, new = old_by_identity[identity], new_by_identity[identity]
+        if len(old) == 1 and len(new) == 1:
+            yield {'change': CHANGED, 'animal': new[0], 'fields': _changed_fields(*old, *new)}
+            continue
+        # Several animals share the identity, there is no telling which became which.
+        for animal in old:
+            yield {'change': REMOVED, 'animal': animal}
+        for animal in new:
+            yield {'change': ADDED, 'animal': animal}
+
+
+def changed_shelters(base_version, version):
+    """
+    Return the shelters with animals added or removed between two repository versions.
+
+    Args:
+        base_version (pulpcore.plugin.models.RepositoryVersion): The version to compare from.
+        version (pulpcore.plugin.models.RepositoryVersion): The version to compare to.
+
+    Returns:
+        set: The names of the shelters.
+
+    """
+    added = Animal.objects.filter(pk__in=version.content).exclude(pk__in=base_version.content)
+    removed = Animal.objects.filter(pk__in=base_version.content).exclude(pk__in=version.content)
+    shelters = set()
+    for queryset in (added, removed):
+        shelters.update(queryset.order_by().values_list('shelter', flat=True).distinct())
+    return shelters
+
+
+def _identity_refs():
+    return {field: OuterRef(field) for field in DIFF_IDENTITY}
+
+
+def _rows(queryset):
+    rows = queryset.order_by(*DIFF_IDENTITY, 'shelter').values('pk', *DIFF_FIELDS)
+    for row in rows.iterator(chunk_size=CHUNK_SIZE):
+        row['pk'] = str(row['pk'])
+        yield row
+
+
+def _group(rows):
+    groups = defaultdict(list)
+    for row in rows:
+        groups[tuple(row[field] for field in DIFF_IDENTITY)].append(row)
+    return groups
+
+
+def _changed_fields(old, new):
+    return {
+        field: [old[field], new[field]]
+        for field in DIFF_FIELDS
+        if old[field] != new[field]
+    }
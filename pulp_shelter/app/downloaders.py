@@ -0,0 +1,186 @@
+import asyncio
+import logging
+from gettext import gettext as _
+
+import aiohttp
+
+from pulpcore.plugin.download import HttpDownloader
+
+from pulp_shelter.app.metrics import ARTIFACTS_DOWNLOADED, BYTES_DOWNLOADED
+from pulp_shelter.app.throttling import THROTTLED_STATUSES, parse_retry_after
+
+
+log = logging.getLogger(__name__)
+
+MAX_THROTTLED_ATTEMPTS = 10
+
+
+def response_validators(headers):
+    """
+    Pick the HTTP validators of a response, which tell whether a later copy is the same file.
+
+    Args:
+        headers (multidict.CIMultiDictProxy): The headers of the response.
+
+    Returns:
+        dict: The ``etag``, ``last_modified`` and ``size``, each None if not sent.
+
+    """
+    size = headers.get('Content-Length')
+    return {
+        'etag': headers.get('ETag'),
+        'last_modified': headers.get('Last-Modified'),
+        'size': int(size) if size and size.isdigit() else None,
+    }
+
+
+class ShelterHttpDownloader(HttpDownloader):
+    """
+    An HttpDownloader which paces its requests with the throttle of its remote.
+
+    Responses with a status in :data:`~pulp_shelter.app.throttling.THROTTLED_STATUSES` shrink
+    the concurrency of the remote and pause it for as long as the ``Retry-After`` header asks,
+    or with an exponential backoff, before the request is retried.
+
+    The validators of every successful download are recorded, so that the file can be
+    revalidated with a conditional request instead of being downloaded again.
+    """
+
+    def __init__(self, *args, throttle=None, validator_cache=None, **kwargs):
+        """
+        An HttpDownloader which paces its requests with the throttle of its remote.
+
+        Args:
+            throttle (pulp_shelter.app.throttling.Throttle): Shared by every downloader of the
+                remote.
+            validator_cache (dict): If given, the validators of the response are stored in it
+                under the downloaded URL.
+
+        """
+        self.throttle = throttle
+        self.validator_cache = validator_cache
+        super().__init__(*args, **kwargs)
+
+    async def _run(self, extra_data=None):
+        """
+        Download, validate, and compute digests on the `url`, as fast as the upstream allows.
+
+        Args:
+            extra_data (dict): Extra data passed by the downloader.
+
+        Raises:
+            aiohttp.ClientResponseError: If the upstream kept throttling the request, or
+                responded with any other error.
+
+        """
+        loop = asyncio.get_event_loop()
+        for attempt in range(1, MAX_THROTTLED_ATTEMPTS + 1):
+            async with self.throttle:
+                started = loop.time()
+                async with self.session.get(self.url, proxy=self.proxy,
+                                            proxy_auth=self.proxy_auth, auth=self.auth) as response:
+                    if response.status in THROTTLED_STATUSES and attempt < MAX_THROTTLED_ATTEMPTS:
+                        self.back_off(attempt, response)
+                        continue
+                    response.raise_for_status()
+                    self.throttle.succeeded(loop.time() - started)
+                    to_return = await self._handle_response(response)
+                    await response.release()
+            ARTIFACTS_DOWNLOADED.inc()
+            BYTES_DOWNLOADED.inc(to_return.artifact_attributes['size'])
+            if self.validator_cache is not None:
+                self.validator_cache[self.url] = response_validators(response.headers)
+            if self._close_session_on_finalize:
+                self.session.close()
+            return to_return
+
+    async def not_modified(self, etag=None, last_modified=None, size=None):
+        """
+        Tell whether the file at the `url` is the one previously downloaded from it.
+
+        A conditional ``HEAD`` request is sent. The file is unchanged if the upstream answers
+        ``304 Not Modified``, or if it ignores the condition but sends the same validators.
+
+        Args:
+            etag (str): The ``ETag`` of the previous download.
+            last_modified (str): The ``Last-Modified`` of the previous download.
+            size (int): The size of the previous download.
+
+        Returns:
+            bool: True if the file is unchanged, False if it changed or could not be told.
+
+        """
+        headers = {}
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+        if not headers:
+            return False
+
+        loop = asyncio.get_event_loop()
+        try:
+            async with self.throttle:
+                started = loop.time()
+                async with self.session.head(self.url, headers=headers, proxy=self.proxy,
+                                             proxy_auth=self.proxy_auth,
+                                             auth=self.auth) as response:
+                    if response.status in THROTTLED_STATUSES:
+                        self.back_off(1, response)
+                        return False
+                    self.throttle.succeeded(loop.time() - started)
+                    if response.status == 304:
+                        return True
+                    if response.status != 200:
+                        return False
+                    validators = response_validators(response.headers)
+        except aiohttp.ClientError:
+            return False
+        if size is not None and validators['size'] not in (None, size):
+            return False
+        if etag:
+            return validators['etag'] == etag
+        return validators['last_modified'] == last_modified
+
+    async def content_length(self):
+        """
+        Ask the upstream for the size of the file at the `url`, without downloading it.
+
+        Returns:
+            int: The ``Content-Length`` of a ``HEAD`` request, None if the upstream does not
+                tell.
+
+        """
+        loop = asyncio.get_event_loop()
+        try:
+            async with self.throttle:
+                started = loop.time()
+                async with self.session.head(self.url, proxy=self.proxy,
+                                             proxy_auth=self.proxy_auth,
+                                             auth=self.auth) as response:
+                    if response.status in THROTTLED_STATUSES:
+                        self.back_off(1, response)
+                        return None
+                    self.throttle.succeeded(loop.time() - started)
+                    if response.status != 200:
+                        return None
+                    return response_validators(response.headers)['size']
+        except aiohttp.ClientError:
+            return None
+
+    def back_off(self, attempt, response):
+        """
+        Report a throttled response to the throttle of the remote.
+
+        Args:
+            attempt (int): The number of times the request was throttled in a row, from 1.
+            response (aiohttp.ClientResponse): The throttled response.
+
+        """
+        delay = self.throttle.throttled(
+            attempt, parse_retry_after(response.headers.get('Retry-After'))
+        )
+        log.info(_('{url} is throttled, retrying in {delay:.1f}s').format(
+            url=self.url,
+            delay=delay
+        ))
@@ -0,0 +1,94 @@
+"""
+The geometry behind finding the shelters of the registry near a point.
+
+Every :class:`~pulp_shelter.app.models.Shelter` is bucketed into a cell of a grid of
+:data:`CELL_DEGREES` of latitude and longitude, and the cells are indexed. A radius query only
+reads the shelters of the cells overlapping the bounding box of its circle, before measuring
+their exact great-circle distance. A k-nearest query runs radius queries of growing radius
+until enough shelters are found.
+"""
+import math
+
+
+EARTH_RADIUS = 6371.0088
+
+CELL_DEGREES = 1.0
+
+# The first radius, in kilometres, of a k-nearest query.
+NEAREST_RADIUS = 50.0
+
+# Half of the circumference of the Earth, beyond which no point lies.
+MAX_DISTANCE = math.pi * EARTH_RADIUS
+
+
+def distance(latitude, longitude, other_latitude, other_longitude):
+    """
+    Return the great-circle distance between two points.
+
+    Args:
+        latitude (float): The latitude of the first point, in degrees.
+        longitude (float): The longitude of the first point, in degrees.
+        other_latitude (float): The latitude of the second point, in degrees.
+        other_longitude (float): The longitude of the second point, in degrees.
+
+    Returns:
+        float: The distance in kilometres.
+
+    """
+    phi, other_phi = math.radians(latitude), math.radians(other_latitude)
+    delta_phi = other_phi - phi
+    delta_lambda = math.radians(other_longitude - longitude)
+    a = math.sin(delta_phi / 2) ** 2 + \
+        math.cos(phi) * math.cos(other_phi) * math.sin(delta_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS * math.asin(min(1.0, math.sqrt(a)))
+
+
+def grid_cell(latitude, longitude):
+    """
+    Return the cell of the grid a point lies in.
+
+    Args:
+        latitude (float): The latitude, in degrees.
+        longitude (float): The longitude, in degrees.
+
+    Returns:
+        tuple: The latitude and longitude indexes of the cell.
+
+    """
+    return (
+        math.floor(latitude / CELL_DEGREES),
+        math.floor((longitude + 180) % 360 / CELL_DEGREES)
+    )
+
+
+def cell_ranges(latitude, longitude, radius):
+    """
+    Return the cells of the grid overlapping the bounding box of a circle.
+
+    Args:
+        latitude (float): The latitude of the centre, in degrees.
+        longitude (float): The longitude of the centre, in degrees.
+        radius (float): The radius, in kilometres.
+
+    Returns:
+        tuple: The inclusive range of latitude indexes, and a list of inclusive ranges of
+            longitude indexes, two of them if the box crosses the antimeridian.
+
+    """
+    delta_latitude = math.degrees(radius / EARTH_RADIUS)
+    south, north = latitude - delta_latitude, latitude + delta_latitude
+    columns = math.ceil(360 / CELL_DEGREES)
+    latitudes = (grid_cell(max(south, -90), 0)[0], grid_cell(min(north, 90), 0)[0])
+    if south <= -90 or north >= 90:
+        return latitudes, [(0, columns - 1)]
+
+    # The meridians tangent to the circle bound its longitudes.
+    ratio = math.sin(radius / EARTH_RADIUS) / math.cos(math.radians(latitude))
+    if ratio >= 1:
+        return latitudes, [(0, columns - 1)]
+    delta_longitude = math.degrees(math.asin(ratio))
+    west = grid_cell(0, longitude - delta_longitude)[1]
+    east = grid_cell(0, longitude + delta_longitude)[1]
+    if west <= east:
+        return latitudes, [(west, east)]
+    return latitudes, [(west, columns - 1), (0, east)]
@@ -0,0 +1,102 @@
+"""
+A bounded cache resolving the natural keys of animals to the primary keys of saved content.
+
+A sync expecting most of its animals to be unchanged loads the animals of the latest version of
+the repository into a cache with a single query, and resolves them from it instead of querying
+them batch by batch. rq runs every task in a process forked for it, so the cache cannot outlive
+the job: every sync makes and warms its own.
+
+Natural keys are stored as a 128 bit digest rather than as tuples of strings, which keeps an
+entry small; a collision between two of the digests is far too unlikely to be of concern.
+Animals of the warmed version are not orphans, so orphan cleanup does not delete them behind
+the back of the cache.
+"""
+import hashlib
+
+from django.conf import settings
+
+from pulp_shelter.app.models import Animal
+
+
+NATURAL_KEY = Animal._meta.unique_together[0]
+
+# The number of animals loaded into the cache of a sync.
+LOOKUP_SIZE = getattr(settings, 'SHELTER_LOOKUP_SIZE', 100000)
+
+
+def key_digest(values):
+    """
+    Return the digest a natural key is stored under.
+
+    Args:
+        values (iterable): The values of the natural key fields.
+
+    Returns:
+        int: A 128 bit digest of the values.
+
+    """
+    encoded = '\0'.join(str(value) for value in values).encode()
+    return int.from_bytes(hashlib.blake2b(encoded, digest_size=16).digest(), 'big')
+
+
+class ContentLookup:
+    """
+    A bounded cache of the primary keys of animals, by natural key, for a single sync.
+    """
+
+    def __init__(self, maxsize=LOOKUP_SIZE):
+        """
+        A bounded cache of the primary keys of animals, by natural key.
+
+        Args:
+            maxsize (int): The most animals to keep.
+
+        """
+        self.maxsize = maxsize
+        self.entries = {}
+
+    def __len__(self):
+        """
+        Return the number of cached animals.
+        """
+        return len(self.entries)
+
+    def get(self, animal):
+        """
+        Look up the primary key of an animal.
+
+        Args:
+            animal (pulp_shelter.app.models.Animal): An animal, usually unsaved.
+
+        Returns:
+            The primary key of the animal, or None if the animal is not cached.
+
+        """
+        return self.entries.get(key_digest(getattr(animal, field) for field in NATURAL_KEY))
+
+    def put(self, values, pk):
+        """
+        Cache the primary key of an animal, unless the cache is full.
+
+        Args:
+            values (iterable): The values of the natural key fields of the animal.
+            pk: The primary key of the animal.
+
+        """
+        if len(self.entries) < self.maxsize:
+            self.entries[key_digest(values)] = pk
+
+    def warm(self, repository_version):
+        """
+        Cache the animals of a repository version, up to the size of the cache.
+
+        Args:
+            repository_version (pulpcore.plugin.models.RepositoryVersion): The version whose
+                animals are likely to be synced again.
+
+        """
+        rows = Animal.objects.filter(
+            pk__in=repository_version.content
+        ).values_list('pk', *NATURAL_KEY)[:self.maxsize]
+        for pk, *values in rows.iterator():
+            self.put(values, pk)
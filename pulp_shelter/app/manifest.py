@@ -0,0 +1,215 @@
+"""
+The shelter manifest format.
+
+A manifest is newline-delimited JSON, one :class:`~pulp_shelter.app.models.Animal` per line,
+with the picture path relative to the manifest. Being line based, it can be written and read
+one entry at a time regardless of the size of a shelter.
+"""
+import json
+import sys
+from collections import namedtuple
+from gettext import gettext as _
+
+from pulp_shelter.app.models import Animal
+
+
+MANIFEST_NAME = 'animals.ndjson'
+
+MANIFEST_FIELDS = ('species', 'breed', 'name', 'age', 'sex', 'weight', 'bio', 'shelter',
+                   'reserved', 'picture')
+
+RECORD_FIELDS = MANIFEST_FIELDS + ('size', 'sha256')
+
+# Fields whose few distinct values repeat over many animals, so each value is kept only once.
+INTERNED_FIELDS = ('species', 'breed', 'sex', 'shelter')
+
+
+def record_schema():
+    """
+    Gather the constraints of the ``Animal`` model on the fields of a record.
+
+    Returns:
+        dict: The constraints, as expected by :func:`pulp_shelter.app.validation.validate_record`.
+
+    """
+    types = {
+        'CharField': 'string',
+        'TextField': 'string',
+        'IntegerField': 'integer',
+        'FloatField': 'number',
+        'BooleanField': 'boolean',
+    }
+    schema = {
+        'fields': RECORD_FIELDS,
+        'types': {'size': 'integer', 'sha256': 'sha256'},
+        'required': set(),
+        'not_blank': set(),
+        'max_lengths': {},
+        'choices': {},
+    }
+    for name in MANIFEST_FIELDS:
+        field = Animal._meta.get_field(name)
+        schema['types'][name] = types[field.get_internal_type()]
+        if not field.has_default() and not field.null:
+            schema['required'].add(name)
+        if field.get_internal_type() == 'CharField':
+            schema['not_blank'].add(name)
+            schema['max_lengths'][name] = field.max_length
+        if field.choices:
+            schema['choices'][name] = tuple(choice for choice, label in field.choices)
+    return schema
+
+
+# Sent along with every batch of records to validate, see pulp_shelter.app.validation.
+RECORD_SCHEMA = record_schema()
+
+
+def encode_entry(entry):
+    """
+    Encode a single manifest entry as a line.
+
+    Args:
+        entry (dict): Values of :data:`MANIFEST_FIELDS`, optionally with the ``size`` and
+            ``sha256`` of the picture.
+
+    Returns:
+        str: The entry, terminated by a newline.
+
+    """
+    return json.dumps(entry, sort_keys=True) + '\n'
+
+
+def dump_entry(entry, fp):
+    """
+    Write a single manifest entry.
+
+    Args:
+        entry (dict): Values of :data:`MANIFEST_FIELDS`, optionally with the ``size`` and
+            ``sha256`` of the picture.
+        fp (file): A text file opened for writing.
+
+    """
+    fp.write(encode_entry(entry))
+
+
+def read_manifest(fp):
+    """
+    Read the entries of a manifest one at a time.
+
+    Args:
+        fp (file): A text file opened for reading.
+
+    Yields:
+        dict: The next manifest entry.
+
+    Raises:
+        ValueError: If a line is not a JSON object.
+
+    """
+    for number, line in enumerate(fp, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            entry = None
+        if not isinstance(entry, dict):
+            raise ValueError(_('Invalid manifest entry on line {number}').format(number=number))
+        yield entry
+
+
+def animal_from_entry(entry):
+    """
+    Make an in-memory Animal out of a manifest entry.
+
+    Args:
+        entry (dict): A manifest entry.
+
+    Returns:
+        pulp_shelter.app.models.Animal: The unsaved animal.
+
+    """
+    return Animal(**{field: entry[field] for field in MANIFEST_FIELDS if field in entry})
+
+
+class AnimalRecord(namedtuple('AnimalRecord', RECORD_FIELDS)):
+    """
+    A manifest entry in a compact, immutable form.
+
+    A record is a plain tuple with no per-instance dictionary, and shares the strings of its
+    repeated values with the other records, so it takes a fraction of the memory of the parsed
+    entry, let alone of an Animal. Fields missing from the entry are None.
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def from_entry(cls, entry):
+        """
+        Make a record out of a manifest entry.
+
+        Args:
+            entry (dict): A manifest entry.
+
+        Returns:
+            AnimalRecord: The record.
+
+        """
+        values = []
+        for field in RECORD_FIELDS:
+            value = entry.get(field)
+            if field in INTERNED_FIELDS and isinstance(value, str):
+                value = sys.intern(value)
+            values.append(value)
+        return cls(*values)
+
+    def animal(self):
+        """
+        Make the in-memory Animal of the record.
+
+        Returns:
+            pulp_shelter.app.models.Animal: The unsaved animal.
+
+        """
+        return Animal(**{
+            field: value for field, value in zip(MANIFEST_FIELDS, self) if value is not None
+        })
+
+
+class InvalidLine(namedtuple('InvalidLine', ('number', 'text', 'error'))):
+    """
+    A line of a manifest which is not an entry, being no JSON object.
+    """
+
+    __slots__ = ()
+
+
+def read_records(fp):
+    """
+    Read the records of a manifest one at a time.
+
+    Unlike :func:`read_manifest`, a line which is not an entry does not stop the reading, so
+    that a sync can quarantine it and go on.
+
+    Args:
+        fp (file): A text file opened for reading.
+
+    Yields:
+        AnimalRecord: The record of the next entry, or an :class:`InvalidLine` with the number
+            of the line.
+
+    """
+    for number, line in enumerate(fp, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            yield InvalidLine(number, line, _('Not valid JSON.'))
+            continue
+        if not isinstance(entry, dict):
+            yield InvalidLine(number, line, _('Not a JSON object.'))
+            continue
+        yield AnimalRecord.from_entry(entry)
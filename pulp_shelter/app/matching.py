@@ -0,0 +1,158 @@
+"""
+Rank the animals of a repository version against the profile of an adopter.
+
+Scoring reads the columnar snapshot of the version instead of the ``Animal`` table, see
+:mod:`pulp_shelter.app.columns`. A profile is scored with a few array operations per batch of
+animals, and only the best animals of each batch are kept.
+
+Scoring needs the optional ``numpy`` package.
+"""
+from pulp_shelter.app.columns import SNAPSHOTS, numpy, words
+
+
+# The number of animals scored at once, which bounds the memory of the intermediate arrays.
+BATCH_SIZE = 65536
+
+# What every criterion of a profile adds to the score of an animal meeting it.
+WEIGHTS = {
+    'species': 4.0,
+    'age': 2.0,
+    'weight': 2.0,
+    'sex': 1.0,
+    'keywords': 3.0,
+}
+
+
+class Ranker:
+    """
+    Score the animals of a columnar snapshot.
+
+    Ties between scores are broken by the order of the animals, that of their natural key in
+    the snapshot of a repository version.
+    """
+
+    def __init__(self, columns):
+        """
+        Score the animals of a columnar snapshot.
+
+        Args:
+            columns (pulp_shelter.app.columns.ColumnSnapshot): The snapshot.
+
+        """
+        self.columns = columns
+
+    def __len__(self):
+        """
+        Return the number of animals.
+        """
+        return len(self.columns)
+
+    def score(self, profile, start, end, keyword_share):
+        """
+        Score a batch of animals against a profile.
+
+        Args:
+            profile (dict): The criteria of the adopter, as validated by
+                :class:`~pulp_shelter.app.serializers.AnimalMatchSerializer`.
+            start (int): The first animal of the batch.
+            end (int): The animal after the last one of the batch.
+            keyword_share (numpy.ndarray): The share of the keywords of the profile found in
+                the bio of every animal, None if the profile has no keywords.
+
+        Returns:
+            numpy.ndarray: The score of every animal of the batch, minus infinity for those
+                which are reserved.
+
+        """
+        scores = numpy.zeros(end - start, dtype=numpy.float64)
+        columns = self.columns
+        if profile.get('species'):
+            codes = [columns.code('species', species) for species in profile['species']]
+            scores += WEIGHTS['species'] * numpy.isin(
+                columns['species'][start:end], [code for code in codes if code is not None]
+            )
+        if profile.get('min_age') is not None or profile.get('max_age') is not None:
+            scores += WEIGHTS['age'] * self.in_range(
+                columns['age'][start:end], profile.get('min_age'), profile.get('max_age')
+            )
+        if profile.get('min_weight') is not None or profile.get('max_weight') is not None:
+            scores += WEIGHTS['weight'] * self.in_range(
+                columns['weight'][start:end], profile.get('min_weight'), profile.get('max_weight')
+            )
+        sex = columns.code('sex', profile['sex']) if profile.get('sex') else None
+        if sex is not None:
+            scores += WEIGHTS['sex'] * (columns['sex'][start:end] == sex)
+        if keyword_share is not None:
+            scores += WEIGHTS['keywords'] * keyword_share[start:end]
+        scores[columns['reserved'][start:end]] = -numpy.inf
+        return scores
+
+    @staticmethod
+    def in_range(values, minimum, maximum):
+        """
+        Tell which values are within bounds.
+
+        Args:
+            values (numpy.ndarray): The values.
+            minimum: The lowest value in range, None for no bound.
+            maximum: The highest value in range, None for no bound.
+
+        Returns:
+            numpy.ndarray: Whether every value is in range.
+
+        """
+        matches = numpy.ones(len(values), dtype=bool)
+        if minimum is not None:
+            matches &= values >= minimum
+        if maximum is not None:
+            matches &= values <= maximum
+        return matches
+
+    def top(self, profile, count):
+        """
+        Find the animals matching a profile best.
+
+        Args:
+            profile (dict): The criteria of the adopter.
+            count (int): The number of animals to find.
+
+        Returns:
+            list: Tuples of the primary key and the score of at most ``count`` animals which
+                are not reserved, the best first.
+
+        """
+        keywords = {word for keyword in profile.get('keywords', ()) for word in words(keyword)}
+        keyword_share = self.columns.word_hits(keywords) / len(keywords) if keywords else None
+        best_rows = numpy.zeros(0, dtype=numpy.int64)
+        best_scores = numpy.zeros(0, dtype=numpy.float64)
+        for start in range(0, len(self), BATCH_SIZE):
+            end = min(start + BATCH_SIZE, len(self))
+            scores = numpy.concatenate(
+                (best_scores, self.score(profile, start, end, keyword_share))
+            )
+            rows = numpy.concatenate((best_rows, numpy.arange(start, end)))
+            # The best first, and the first rows among equal scores, so that the same animals
+            # are kept whatever the batches.
+            kept = numpy.lexsort((rows, -scores))[:count]
+            best_scores, best_rows = scores[kept], rows[kept]
+
+        adoptable = best_scores > -numpy.inf
+        return list(zip(self.columns.pks(best_rows[adoptable]),
+                        (float(score) for score in best_scores[adoptable])))
+
+
+def match(repository_version, profile, count):
+    """
+    Rank the animals of a repository version against the profile of an adopter.
+
+    Args:
+        repository_version (pulpcore.plugin.models.RepositoryVersion): A complete version.
+        profile (dict): The criteria of the adopter.
+        count (int): The number of animals to find.
+
+    Returns:
+        list: Tuples of the primary key and the score of at most ``count`` animals which are
+            not reserved, the best first.
+
+    """
+    return Ranker(SNAPSHOTS.get(repository_version)).top(profile, count)
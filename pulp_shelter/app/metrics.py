@@ -0,0 +1,367 @@
+"""
+Counters and histograms of the shelter workloads, exported in the Prometheus text format.
+
+Metrics are collected with the optional ``prometheus_client`` package, in its multiprocess
+mode: Pulp runs the API in several processes and every task in a work-horse process forked by
+an rq worker, so each process keeps its values in files of a directory shared by all of them.
+Rather than being scraped from an endpoint, the values of all processes are summed up into a
+single file of the ``SHELTER_METRICS_DIR`` setting, which the textfile collector of the
+Prometheus node exporter picks up. Tasks write it once they are over, and API processes at most
+every :data:`WRITE_INTERVAL` seconds from a thread of their own.
+
+Work-horses are gone once their job is over, leaving their files behind. Before every write,
+the files of the processes which are gone are merged into a single archive file and removed,
+so the totals are kept while the number of files stays bounded.
+
+Nothing is collected unless ``prometheus_client`` is installed, and nothing is written unless
+the setting is configured.
+"""
+import errno
+import fcntl
+import glob
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from gettext import gettext as _
+
+from django.conf import settings
+
+
+log = logging.getLogger(__name__)
+
+METRICS_DIR = getattr(settings, 'SHELTER_METRICS_DIR', None)
+
+# The file written into the SHELTER_METRICS_DIR.
+METRICS_NAME = 'pulp_shelter.prom'
+
+# The directory of the values of every process, within the SHELTER_METRICS_DIR.
+MULTIPROCESS_NAME = 'multiprocess'
+
+if METRICS_DIR:
+    # prometheus_client tells where to keep the values of a process when it is imported.
+    os.environ.setdefault(
+        'PROMETHEUS_MULTIPROC_DIR', os.path.join(METRICS_DIR, MULTIPROCESS_NAME)
+    )
+    os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+
+try:
+    import prometheus_client
+    from prometheus_client import multiprocess
+    from prometheus_client.mmap_dict import MmapedDict, mmap_key
+except ImportError:
+    prometheus_client = None
+
+# Upper bounds, in seconds, of the buckets of the histograms of durations.
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900)
+
+# The least number of seconds between two writes of the metrics of an API process.
+WRITE_INTERVAL = 15
+
+# The kinds of metrics whose values are kept in files, see compact().
+KINDS = ('counter', 'histogram')
+
+
+class NullMetric:
+    """
+    Stand for a metric when ``prometheus_client`` is not installed, ignoring every value.
+    """
+
+    def labels(self, **labels):
+        """
+        Return the series of some label values, this very metric.
+        """
+        return self
+
+    def inc(self, amount=1):
+        """
+        Ignore an amount to add.
+        """
+
+    def observe(self, value):
+        """
+        Ignore an observed value.
+        """
+
+    @contextmanager
+    def time(self):
+        """
+        Run a block of code without timing it.
+        """
+        yield
+
+
+def counter(name, documentation, labelnames=()):
+    """
+    Make a total which only ever goes up, such as a number of processed animals.
+
+    Args:
+        name (str): The name of the metric.
+        documentation (str): Its help text.
+        labelnames (tuple): The names of its labels.
+
+    Returns:
+        prometheus_client.Counter: The counter, a :class:`NullMetric` without the package.
+
+    """
+    if prometheus_client is None:
+        return NullMetric()
+    return prometheus_client.Counter(name, documentation, labelnames, registry=None)
+
+
+def histogram(name, documentation, labelnames=(), buckets=DURATION_BUCKETS):
+    """
+    Make a distribution of observed values, such as durations, counted into buckets.
+
+    Args:
+        name (str): The name of the metric.
+        documentation (str): Its help text.
+        labelnames (tuple): The names of its labels.
+        buckets (tuple): The increasing upper bounds of the buckets, ``+Inf`` excluded.
+
+    Returns:
+        prometheus_client.Histogram: The histogram, a :class:`NullMetric` without the package.
+
+    """
+    if prometheus_client is None:
+        return NullMetric()
+    return prometheus_client.Histogram(
+        name, documentation, labelnames, registry=None, buckets=buckets
+    )
+
+
+def process_gone(path):
+    """
+    Tell whether the process which wrote a file of values is gone.
+
+    Args:
+        path (str): The file, named after the kind of its metrics and the pid of the process.
+
+    Returns:
+        bool: True if the process is gone, False if it runs or the file is an archive.
+
+    """
+    pid = os.path.basename(path)[:-len('.db')].rsplit('_', 1)[-1]
+    if not pid.isdigit():
+        return False
+    try:
+        os.kill(int(pid), 0)
+    except OSError as exc:
+        return exc.errno == errno.ESRCH
+    return False
+
+
+def compact(directory):
+    """
+    Merge the values of the processes which are gone into archive files, and remove their files.
+
+    Every kind of metric has its own archive, holding the sum of the values of the processes
+    merged into it. The archive is replaced atomically, so a collector reading the directory
+    meanwhile sees either the old archive and the files merged into the new one, or the new
+    archive.
+
+    Args:
+        directory (str): The directory of the values of every process.
+
+    """
+    for kind in KINDS:
+        gone = [
+            path for path in glob.glob(os.path.join(directory, kind + '_*.db'))
+            if process_gone(path)
+        ]
+        if not gone:
+            continue
+        archive = os.path.join(directory, kind + '_archive.db')
+        merged = gone + [archive] if os.path.exists(archive) else gone
+        metrics = multiprocess.MultiProcessCollector.merge(merged, accumulate=False)
+        temporary = archive + '.tmp'
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        values = MmapedDict(temporary)
+        try:
+            for metric in metrics:
+                for sample in metric.samples:
+                    key = mmap_key(metric.name, sample.name, list(sample.labels),
+                                   list(sample.labels.values()), metric.documentation)
+                    values.write_value(key, sample.value, 0.0)
+        finally:
+            values.close()
+        os.replace(temporary, archive)
+        for path in gone:
+            os.remove(path)
+
+
+@contextmanager
+def locked(directory):
+    """
+    Hold the lock of a directory of values, which processes compact and collect in turn.
+
+    Args:
+        directory (str): The directory of the values of every process.
+
+    """
+    with open(os.path.join(directory, '.lock'), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def write_metrics(directory=None, multiprocess_dir=None):
+    """
+    Write the metrics of every process for the textfile collector of the node exporter.
+
+    The file is replaced atomically, so the collector never reads a partial file.
+
+    Args:
+        directory (str): The directory to write into. Defaults to the ``SHELTER_METRICS_DIR``
+            setting.
+        multiprocess_dir (str): The directory of the values of every process. Defaults to the
+            one of ``prometheus_client``.
+
+    Returns:
+        str: The path of the written file, or None if nothing was written.
+
+    """
+    directory = directory or METRICS_DIR
+    if prometheus_client is None or not directory:
+        return None
+    multiprocess_dir = multiprocess_dir or os.environ['PROMETHEUS_MULTIPROC_DIR']
+    path = os.path.join(directory, METRICS_NAME)
+    with locked(multiprocess_dir):
+        compact(multiprocess_dir)
+        registry = prometheus_client.CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry, path=multiprocess_dir)
+        prometheus_client.write_to_textfile(path, registry)
+    return path
+
+
+class BackgroundWriter:
+    """
+    Write the metrics from a thread of the process, at most every ``interval`` seconds.
+    """
+
+    def __init__(self, interval=WRITE_INTERVAL):
+        """
+        Write the metrics from a thread of the process, at most every ``interval`` seconds.
+
+        Args:
+            interval (float): The least number of seconds between two writes.
+
+        """
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.pending = None
+        self.pid = None
+
+    def request(self):
+        """
+        Ask for the metrics to be written, starting the thread of the process if need be.
+
+        Threads do not survive a fork, so a process forked after a write starts its own.
+        """
+        if prometheus_client is None or not METRICS_DIR:
+            return
+        with self.lock:
+            if self.pid != os.getpid():
+                self.pid = os.getpid()
+                self.pending = threading.Event()
+                threading.Thread(
+                    target=self.run, args=(self.pending,), name='shelter-metrics', daemon=True
+                ).start()
+        self.pending.set()
+
+    def run(self, pending):
+        """
+        Write the metrics whenever asked to, then wait for the interval.
+
+        Args:
+            pending (threading.Event): Set when the metrics are to be written.
+
+        """
+        while True:
+            pending.wait()
+            pending.clear()
+            try:
+                write_metrics()
+            except Exception:
+                log.exception(_('Writing the shelter metrics failed.'))
+            time.sleep(self.interval)
+
+
+WRITER = BackgroundWriter()
+
+ANIMALS = counter(
+    'pulp_shelter_animals_total',
+    'Animals processed, by task.',
+    ('task',)
+)
+ARTIFACTS_DOWNLOADED = counter(
+    'pulp_shelter_artifacts_downloaded_total',
+    'Files downloaded from shelter remotes.'
+)
+BYTES_DOWNLOADED = counter(
+    'pulp_shelter_downloaded_bytes_total',
+    'Bytes downloaded from shelter remotes.'
+)
+STAGE_DURATION = histogram(
+    'pulp_shelter_stage_duration_seconds',
+    'Time from the start of a pipeline stage until it has passed on all of its content.',
+    ('pipeline', 'stage')
+)
+TASK_DURATION = histogram(
+    'pulp_shelter_task_duration_seconds',
+    'Duration of shelter tasks.',
+    ('task',)
+)
+PUBLISH_SHARD_DURATION = histogram(
+    'pulp_shelter_publish_shard_duration_seconds',
+    'Time to publish the catalog of a shelter, reused when unchanged since the last publication.',
+    ('reused',)
+)
+API_DURATION = histogram(
+    'pulp_shelter_api_request_duration_seconds',
+    'Duration of shelter API requests, by viewset and action.',
+    ('viewset', 'action', 'method', 'status')
+)
+
+
+@contextmanager
+def task_metrics(task):
+    """
+    Time a task and write the metrics once it is over.
+
+    Args:
+        task (str): The name of the task.
+
+    """
+    try:
+        with TASK_DURATION.labels(task=task).time():
+            yield
+    finally:
+        write_metrics()
+
+
+class MetricsMixin:
+    """
+    Observe the duration of every request to a viewset, by action.
+
+    The metrics are written by the :data:`WRITER` thread, outside of the request.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        """
+        Dispatch the request while timing it.
+        """
+        started = time.monotonic()
+        response = super().dispatch(request, *args, **kwargs)
+        API_DURATION.labels(
+            viewset=type(self).__name__,
+            action=getattr(self, 'action', None) or 'unknown',
+            method=request.method,
+            status=response.status_code
+        ).observe(time.monotonic() - started)
+        WRITER.request()
+        return response
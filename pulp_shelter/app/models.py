@@ -5,11 +5,25 @@ Check `Plugin Writer's Guide`_ for more details.
     http://docs.pulpproject.org/en/3.0/nightly/plugins/plugin-writer/index.html
 """
 
+import os
+import uuid
 from logging import getLogger
 
+from django.conf import settings
 from django.db import models
 
-from pulpcore.plugin.models import Content, ContentArtifact, Remote, Publisher
+from pulpcore.plugin.download import DownloaderFactory
+from pulpcore.plugin.models import (
+    Content,
+    Remote,
+    RemoteArtifact,
+    Publisher,
+    Repository
+)
+
+from pulp_shelter.app import geo
+from pulp_shelter.app.downloaders import ShelterHttpDownloader
+from pulp_shelter.app.throttling import Throttle
 
 logger = getLogger(__name__)
 
@@ -51,7 +65,7 @@ class Animal(Content):
     sex = models.TextField(choices=GENDER_CHOICES, default=UNKNOWN)
     weight = models.FloatField()
     bio = models.TextField()
-    shelter = models.CharField(max_length=255)
+    shelter = models.CharField(max_length=255, db_index=True)
     reserved = models.BooleanField(default=False)
     picture = models.CharField(max_length=255, unique=True)
 
@@ -63,17 +77,293 @@ class ShelterPublisher(Publisher):
     """
     A Publisher for Animal.
 
-    Define any additional fields for your new publisher if needed.
+    Fields:
+
+        partitioned (models.BooleanField): Whether to publish every shelter under its own path,
+            with its own catalog and pictures.
     """
 
     TYPE = 'shelter'
 
+    partitioned = models.BooleanField(default=False)
+
 
 class ShelterRemote(Remote):
     """
     A Remote for Animal.
 
-    Define any additional fields for your new importer if needed.
+    Fields:
+
+        storage_concurrency (models.PositiveIntegerField): The number of threads moving
+            downloaded pictures into artifact storage during a sync.
+        rate_limit (models.FloatField): The most requests per second sent to the upstream,
+            unlimited if null. Concurrent requests adapt between one and
+            ``download_concurrency`` to how the upstream copes.
+        warm_lookup (models.BooleanField): Whether to load the animals of the latest version of
+            the synced repository into the lookup cache before a sync.
     """
 
     TYPE = 'shelter'
+
+    storage_concurrency = models.PositiveIntegerField(default=4)
+    rate_limit = models.FloatField(null=True)
+    warm_lookup = models.BooleanField(default=False)
+
+    @property
+    def throttle(self):
+        """
+        The throttle shared by every request sent to the upstream during a sync.
+
+        Returns:
+            pulp_shelter.app.throttling.Throttle: The throttle of this remote.
+
+        """
+        try:
+            return self._throttle
+        except AttributeError:
+            self._throttle = Throttle(rate=self.rate_limit,
+                                      max_concurrency=self.download_concurrency)
+            return self._throttle
+
+    @property
+    def picture_validators(self):
+        """
+        The validators of the responses downloaded during a sync, until they are saved.
+
+        Returns:
+            dict: :class:`PictureValidators` fields keyed by the downloaded URL.
+
+        """
+        try:
+            return self._picture_validators
+        except AttributeError:
+            self._picture_validators = {}
+            return self._picture_validators
+
+    @property
+    def download_factory(self):
+        """
+        Return the DownloaderFactory which throttles HTTP downloads.
+
+        Returns:
+            DownloadFactory: The instantiated DownloaderFactory to be used by
+                get_downloader()
+
+        """
+        try:
+            return self._download_factory
+        except AttributeError:
+            self._download_factory = DownloaderFactory(
+                self,
+                downloader_overrides={
+                    'http': ShelterHttpDownloader,
+                    'https': ShelterHttpDownloader,
+                }
+            )
+            return self._download_factory
+
+    def get_downloader(self, url, **kwargs):
+        """
+        Get a downloader for a URL which shares the throttle of this remote.
+
+        Args:
+            url (str): The URL to download.
+            kwargs (dict): Passed on to the downloader.
+
+        Returns:
+            subclass of :class:`~pulpcore.plugin.download.BaseDownloader`: A downloader that
+                is configured with the remote settings.
+
+        """
+        if url.startswith(('http://', 'https://')):
+            kwargs.setdefault('throttle', self.throttle)
+            kwargs.setdefault('validator_cache', self.picture_validators)
+        return super().get_downloader(url, **kwargs)
+
+
+class PictureValidators(models.Model):
+    """
+    The HTTP validators of the last download of a picture from a shelter remote.
+
+    On a re-sync they allow checking the picture with a conditional request rather than
+    downloading it again.
+
+    Fields:
+
+        etag (models.TextField): The ``ETag`` response header.
+        last_modified (models.TextField): The ``Last-Modified`` response header.
+        size (models.BigIntegerField): The ``Content-Length`` response header.
+
+    Relations:
+
+        remote_artifact (models.OneToOneField): The picture the validators were sent for.
+    """
+
+    etag = models.TextField(null=True)
+    last_modified = models.TextField(null=True)
+    size = models.BigIntegerField(null=True)
+
+    remote_artifact = models.OneToOneField(
+        RemoteArtifact, on_delete=models.CASCADE, related_name='shelter_validators'
+    )
+
+
+class PictureUpload(models.Model):
+    """
+    A picture being uploaded in chunks, before it becomes the Artifact of a new Animal.
+
+    The chunks are written in place into a file of the full size, in any order.
+
+    Fields:
+
+        id (models.UUIDField): The identifier of the upload, hard to guess.
+        size (models.BigIntegerField): The size of the picture.
+        sha256 (models.CharField): The expected SHA-256 digest of the picture, if given.
+        created (models.DateTimeField): When the upload started.
+    """
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    size = models.BigIntegerField()
+    sha256 = models.CharField(max_length=64, null=True)
+    created = models.DateTimeField(auto_now_add=True)
+
+    @property
+    def path(self):
+        """
+        The path of the file the chunks are written into.
+        """
+        return os.path.join(settings.MEDIA_ROOT, 'upload', 'shelter', str(self.id))
+
+
+class PictureUploadChunk(models.Model):
+    """
+    A chunk received for a picture upload.
+
+    Fields:
+
+        offset (models.BigIntegerField): The position of the chunk in the picture.
+        size (models.BigIntegerField): The size of the chunk.
+        sha256 (models.CharField): The SHA-256 digest of the chunk, computed as it arrived.
+
+    Relations:
+
+        upload (models.ForeignKey): The upload the chunk is part of.
+    """
+
+    offset = models.BigIntegerField()
+    size = models.BigIntegerField()
+    sha256 = models.CharField(max_length=64)
+
+    upload = models.ForeignKey(PictureUpload, on_delete=models.CASCADE, related_name='chunks')
+
+    class Meta:
+        unique_together = ('upload', 'offset')
+
+
+class Shelter(models.Model):
+    """
+    A shelter of the registry, which the ``shelter`` of animals is resolved against.
+
+    Shelters are bucketed into the cells of a grid, so that those near a point are found
+    without reading all of them. See :mod:`pulp_shelter.app.geo`.
+
+    Fields:
+
+        name (models.CharField): The name of the shelter, as animals refer to it.
+        latitude (models.FloatField): The latitude of the shelter, in degrees.
+        longitude (models.FloatField): The longitude of the shelter, in degrees.
+        cell_latitude (models.IntegerField): The latitude index of the cell of the shelter.
+        cell_longitude (models.IntegerField): The longitude index of the cell of the shelter.
+    """
+
+    name = models.CharField(max_length=255, unique=True)
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+    cell_latitude = models.IntegerField(editable=False)
+    cell_longitude = models.IntegerField(editable=False)
+
+    class Meta:
+        index_together = ('cell_latitude', 'cell_longitude')
+
+    def save(self, *args, **kwargs):
+        """
+        Bucket the shelter into the cell of its location, and save it.
+        """
+        self.cell_latitude, self.cell_longitude = geo.grid_cell(self.latitude, self.longitude)
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def within(cls, latitude, longitude, radius):
+        """
+        Find the shelters within a distance of a point.
+
+        Args:
+            latitude (float): The latitude of the point, in degrees.
+            longitude (float): The longitude of the point, in degrees.
+            radius (float): The distance, in kilometres.
+
+        Returns:
+            list: Tuples of the distance and the name of every shelter, the nearest first.
+
+        """
+        latitudes, longitude_ranges = geo.cell_ranges(latitude, longitude, radius)
+        found = []
+        for longitudes in longitude_ranges:
+            shelters = cls.objects.filter(
+                cell_latitude__range=latitudes,
+                cell_longitude__range=longitudes
+            ).values_list('name', 'latitude', 'longitude')
+            for name, shelter_latitude, shelter_longitude in shelters:
+                kilometres = geo.distance(latitude, longitude, shelter_latitude, shelter_longitude)
+                if kilometres <= radius:
+                    found.append((kilometres, name))
+        return sorted(found)
+
+    @classmethod
+    def nearest(cls, latitude, longitude, count):
+        """
+        Find the shelters nearest to a point.
+
+        Args:
+            latitude (float): The latitude of the point, in degrees.
+            longitude (float): The longitude of the point, in degrees.
+            count (int): The number of shelters to find.
+
+        Returns:
+            list: Tuples of the distance and the name of at most ``count`` shelters, the
+                nearest first.
+
+        """
+        radius = geo.NEAREST_RADIUS
+        while True:
+            found = cls.within(latitude, longitude, radius)
+            # Any shelter outside of the circle is farther than those in it.
+            if len(found) >= count or radius >= geo.MAX_DISTANCE:
+                return found[:count]
+            radius *= 4
+
+
+class ShelterRetentionPolicy(models.Model):
+    """
+    Which versions of a repository are kept when it is cleaned up.
+
+    A version is kept if it is one of the most recent ``keep_versions``, or if it was created
+    less than ``keep_days`` ago. The latest version, version 0 and published versions are always
+    kept.
+
+    Fields:
+
+        keep_versions (models.PositiveIntegerField): The number of most recent versions to keep.
+        keep_days (models.PositiveIntegerField): The age in days of the oldest versions to keep.
+
+    Relations:
+
+        repository (models.OneToOneField): The repository the policy applies to.
+    """
+
+    keep_versions = models.PositiveIntegerField(null=True)
+    keep_days = models.PositiveIntegerField(null=True)
+
+    repository = models.OneToOneField(
+        Repository, on_delete=models.CASCADE, related_name='shelter_retention_policy'
+    )
@@ -0,0 +1,200 @@
+"""
+Instrumentation of the SQL queries issued by the shelter plugin.
+
+A :class:`QueryRecorder` counts and times every query run on the database connection of the
+current thread, and groups them by shape, the SQL with its parameters and literals left out.
+A shape repeated many times within a single request usually gives away an N+1 query, a query
+issued once per item instead of once for all of them.
+"""
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from gettext import gettext as _
+
+from django.conf import settings
+from django.db import connection
+
+from pulpcore.plugin.models import ProgressBar
+
+
+log = logging.getLogger(__name__)
+
+# How many times the same query shape may run in a request before it is reported as N+1.
+REPEATED_THRESHOLD = 10
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_LISTS = re.compile(r'\bIN\s*\((?:\s*(?:%s|\?)\s*,)*\s*(?:%s|\?)\s*\)', re.IGNORECASE)
+_WHITESPACE = re.compile(r'\s+')
+
+
+def query_shape(sql):
+    """
+    Return the shape of a query, which is the same for every run of it.
+
+    Args:
+        sql (str): The SQL of the query.
+
+    Returns:
+        str: The SQL with literals replaced by ``?`` and ``IN`` lists collapsed.
+
+    """
+    sql = _LITERALS.sub('?', sql)
+    sql = _LISTS.sub('IN (...)', sql)
+    return _WHITESPACE.sub(' ', sql).strip()
+
+
+class QueryRecorder:
+    """
+    Count, time and group by shape the queries run within a block.
+
+    Use it as a context manager::
+
+        with QueryRecorder() as queries:
+            ...
+        queries.count, queries.duration, queries.repeated()
+    """
+
+    def __init__(self):
+        """
+        Count, time and group by shape the queries run within a block.
+        """
+        self.count = 0
+        self.duration = 0.0
+        self.shapes = Counter()
+        self._wrapper = None
+
+    def __enter__(self):
+        """
+        Start recording the queries run on the connection of the current thread.
+        """
+        self._wrapper = connection.execute_wrapper(self)
+        self._wrapper.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        """
+        Stop recording queries.
+        """
+        self._wrapper.__exit__(exc_type, exc, tb)
+
+    def __call__(self, execute, sql, params, many, context):
+        """
+        Run and record a query, as a database execute wrapper.
+        """
+        started = time.monotonic()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.monotonic() - started
+            self.shapes[query_shape(sql)] += 1
+
+    def repeated(self, threshold=REPEATED_THRESHOLD):
+        """
+        Return the shapes of the queries run at least ``threshold`` times.
+
+        Args:
+            threshold (int): The least number of runs to report.
+
+        Returns:
+            list: Tuples of a shape and its number of runs, the most frequent first.
+
+        """
+        return [(shape, count) for shape, count in self.shapes.most_common() if count >= threshold]
+
+
+class QueryCountMixin:
+    """
+    Record the queries of every request to a viewset.
+
+    With ``DEBUG`` enabled, the number of queries, their total duration and the number of
+    repeated query shapes are sent in the ``X-Shelter-Queries``, ``X-Shelter-Query-Time`` and
+    ``X-Shelter-Repeated-Queries`` response headers, and repeated shapes are logged.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        """
+        Dispatch the request while recording its queries.
+        """
+        if not settings.DEBUG:
+            return super().dispatch(request, *args, **kwargs)
+        with QueryRecorder() as queries:
+            response = super().dispatch(request, *args, **kwargs)
+        repeated = queries.repeated()
+        for shape, count in repeated:
+            log.warning(_('{method} {path} ran the same query {count} times: {shape}').format(
+                method=request.method,
+                path=request.path,
+                count=count,
+                shape=shape
+            ))
+        response['X-Shelter-Queries'] = str(queries.count)
+        response['X-Shelter-Query-Time'] = '{:.6f}'.format(queries.duration)
+        response['X-Shelter-Repeated-Queries'] = str(len(repeated))
+        return response
+
+
+@contextmanager
+def query_phase(message):
+    """
+    Record the queries of a phase of a task in a progress report.
+
+    The report counts the queries in its ``done``, while its ``suffix`` holds their total
+    duration and the number of runs of the most frequent shape.
+
+    Args:
+        message (str): The message of the progress report, naming the phase.
+
+    Yields:
+        QueryRecorder: The recorder of the phase.
+
+    """
+    with ProgressBar(message=message) as pb:
+        with QueryRecorder() as queries:
+            yield queries
+        most_common = queries.shapes.most_common(1)
+        pb.done = queries.count
+        pb.suffix = _('{duration:.2f}s, most repeated query ran {count} times').format(
+            duration=queries.duration,
+            count=most_common[0][1] if most_common else 0
+        )
+
+
+@contextmanager
+def query_budget(max_queries, max_repeats=None):
+    """
+    Assert that a block of code stays within a budget of queries, for use in tests.
+
+    Args:
+        max_queries (int): The most queries the block may run.
+        max_repeats (int): The most times the block may run a single query shape. Defaults to
+            :data:`REPEATED_THRESHOLD` minus one.
+
+    Yields:
+        QueryRecorder: The recorder of the block.
+
+    Raises:
+        AssertionError: If the block runs too many queries, or a query shape too many times.
+
+    """
+    if max_repeats is None:
+        max_repeats = REPEATED_THRESHOLD - 1
+    with QueryRecorder() as queries:
+        yield queries
+    if queries.count > max_queries:
+        raise AssertionError(_('{count} queries run, the budget is {budget}:\n{shapes}').format(
+            count=queries.count,
+            budget=max_queries,
+            shapes='\n'.join(
+                '{}x {}'.format(count, shape) for shape, count in queries.shapes.most_common()
+            )
+        ))
+    repeated = queries.repeated(max_repeats + 1)
+    if repeated:
+        raise AssertionError(_('A query ran {count} times, the budget is {budget}: {shape}').format(
+            count=repeated[0][1],
+            budget=max_repeats,
+            shape=repeated[0][0]
+        ))
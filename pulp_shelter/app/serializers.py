@@ -4,11 +4,23 @@ Check `Plugin Writer's Guide`_ for more details.
 .. _Plugin Writer's Guide:
     http://docs.pulpproject.org/en/3.0/nightly/plugins/plugin-writer/index.html
 """
+from gettext import gettext as _
+
+from django.db.models import F
 from rest_framework import serializers
+from rest_framework.validators import UniqueValidator
 
 from pulpcore.plugin import serializers as platform
+from pulpcore.plugin.models import Artifact, Repository, RepositoryVersion
+from pulpcore.plugin.serializers import RepositorySyncURLSerializer
 
 from . import models
+from .columns import CATEGORICAL_FIELDS, NUMERIC_FIELDS
+from .uploads import missing_ranges
+
+
+# The most animals a profile is matched with at once.
+MAX_MATCHES = 1000
 
 
 # FIXME: SingleArtifactContentSerializer might not be the right choice for you.
@@ -95,8 +107,30 @@ class ShelterRemoteSerializer(platform.RemoteSerializer):
         validators = platform.RemoteSerializer.Meta.validators + [myValidator1, myValidator2]
     """
 
+    storage_concurrency = serializers.IntegerField(
+        help_text=_('The number of threads moving downloaded pictures into artifact storage '
+                    'during a sync.'),
+        min_value=1,
+        required=False
+    )
+    rate_limit = serializers.FloatField(
+        help_text=_('The most requests per second sent to the upstream, unlimited if null. '
+                    'Concurrent requests adapt between one and download_concurrency to how '
+                    'the upstream copes.'),
+        min_value=0.01,
+        allow_null=True,
+        required=False
+    )
+    warm_lookup = serializers.BooleanField(
+        help_text=_('Whether to load the animals of the latest version of the synced '
+                    'repository into the lookup cache before a sync.'),
+        required=False
+    )
+
     class Meta:
-        fields = platform.RemoteSerializer.Meta.fields
+        fields = platform.RemoteSerializer.Meta.fields + (
+            'storage_concurrency', 'rate_limit', 'warm_lookup'
+        )
         model = models.ShelterRemote
 
 
@@ -114,6 +148,513 @@ class ShelterPublisherSerializer(platform.PublisherSerializer):
         validators = platform.PublisherSerializer.Meta.validators + [myValidator1, myValidator2]
     """
 
+    partitioned = serializers.BooleanField(
+        help_text=_('Publish every shelter under its own path, with its own catalog and '
+                    'pictures. Shelters which did not change since the previous publication '
+                    'keep their catalog files.'),
+        default=False
+    )
+
     class Meta:
-        fields = platform.PublisherSerializer.Meta.fields
+        fields = platform.PublisherSerializer.Meta.fields + ('partitioned',)
         model = models.ShelterPublisher
+
+
+class AnimalDiffSerializer(serializers.Serializer):
+    """
+    A Serializer for the query parameters of an animal diff between two repository versions.
+    """
+
+    base_version = platform.NestedRelatedField(
+        help_text=_('A URI of the repository version to compare from.'),
+        label=_('Base Repository Version'),
+        queryset=RepositoryVersion.objects.all(),
+        view_name='versions-detail',
+        lookup_field='number',
+        parent_lookup_kwargs={'repository_pk': 'repository__pk'},
+    )
+    version = platform.NestedRelatedField(
+        help_text=_('A URI of the repository version to compare to.'),
+        label=_('Repository Version'),
+        queryset=RepositoryVersion.objects.all(),
+        view_name='versions-detail',
+        lookup_field='number',
+        parent_lookup_kwargs={'repository_pk': 'repository__pk'},
+    )
+
+
+class AnimalExportSerializer(serializers.Serializer):
+    """
+    A Serializer for exporting the animals of a repository version.
+    """
+
+    repository_version = platform.NestedRelatedField(
+        help_text=_('A URI of the repository version to export.'),
+        label=_('Repository Version'),
+        queryset=RepositoryVersion.objects.all(),
+        view_name='versions-detail',
+        lookup_field='number',
+        parent_lookup_kwargs={'repository_pk': 'repository__pk'},
+    )
+    include_pictures = serializers.BooleanField(
+        help_text=_('Bundle the pictures with the manifest into a tarball.'),
+        default=False
+    )
+
+
+class AnimalImportSerializer(serializers.Serializer):
+    """
+    A Serializer for importing animals from an uploaded archive into a repository.
+    """
+
+    artifact = serializers.HyperlinkedRelatedField(
+        help_text=_('A URI of the uploaded tarball holding a manifest and pictures.'),
+        label=_('Artifact'),
+        queryset=Artifact.objects.all(),
+        view_name='artifacts-detail',
+    )
+    repository = serializers.HyperlinkedRelatedField(
+        help_text=_('A URI of the repository to import the animals into.'),
+        label=_('Repository'),
+        queryset=Repository.objects.all(),
+        view_name='repositories-detail',
+    )
+    mirror = serializers.BooleanField(
+        help_text=_('If True, the new repository version holds only the imported animals.'),
+        default=False
+    )
+
+
+class AnimalMatchSerializer(serializers.Serializer):
+    """
+    A Serializer for the profile of an adopter, to rank the animals of a repository version by.
+    """
+
+    repository_version = platform.NestedRelatedField(
+        help_text=_('A URI of the repository version to find animals in.'),
+        label=_('Repository Version'),
+        queryset=RepositoryVersion.objects.filter(complete=True),
+        view_name='versions-detail',
+        lookup_field='number',
+        parent_lookup_kwargs={'repository_pk': 'repository__pk'},
+    )
+    species = serializers.ListField(
+        child=serializers.CharField(),
+        help_text=_('The preferred species.'),
+        required=False
+    )
+    min_age = serializers.IntegerField(
+        help_text=_('The youngest preferred age.'),
+        min_value=0,
+        required=False
+    )
+    max_age = serializers.IntegerField(
+        help_text=_('The oldest preferred age.'),
+        min_value=0,
+        required=False
+    )
+    min_weight = serializers.FloatField(
+        help_text=_('The lowest preferred weight.'),
+        min_value=0,
+        required=False
+    )
+    max_weight = serializers.FloatField(
+        help_text=_('The highest preferred weight.'),
+        min_value=0,
+        required=False
+    )
+    sex = serializers.ChoiceField(
+        choices=models.Animal.GENDER_CHOICES,
+        help_text=_('The preferred sex.'),
+        required=False
+    )
+    keywords = serializers.ListField(
+        child=serializers.CharField(),
+        help_text=_('Words the bio of a preferred animal contains.'),
+        required=False
+    )
+    count = serializers.IntegerField(
+        help_text=_('The number of animals to find.'),
+        min_value=1,
+        max_value=MAX_MATCHES,
+        default=10
+    )
+
+    def validate(self, data):
+        """
+        Check that the lower bounds of the ranges are not above the upper ones.
+
+        Args:
+            data (dict): The profile.
+
+        Returns:
+            dict: The profile.
+
+        Raises:
+            rest_framework.serializers.ValidationError: If a range is empty.
+
+        """
+        for low, high in (('min_age', 'max_age'), ('min_weight', 'max_weight')):
+            if data.get(low) is not None and data.get(high) is not None and \
+                    data[low] > data[high]:
+                raise serializers.ValidationError(
+                    {low: _('Must not be greater than {field}.').format(field=high)}
+                )
+        return data
+
+
+class AnimalStatisticsSerializer(serializers.Serializer):
+    """
+    A Serializer for the query parameters of statistics on the animals of a repository version.
+    """
+
+    repository_version = platform.NestedRelatedField(
+        help_text=_('A URI of the repository version to describe the animals of.'),
+        label=_('Repository Version'),
+        queryset=RepositoryVersion.objects.filter(complete=True),
+        view_name='versions-detail',
+        lookup_field='number',
+        parent_lookup_kwargs={'repository_pk': 'repository__pk'},
+    )
+    field = serializers.ChoiceField(
+        choices=CATEGORICAL_FIELDS + NUMERIC_FIELDS,
+        help_text=_('The field to count the animals by, if it is categorical, or to summarize, '
+                    'if it is numeric.')
+    )
+    group_by = serializers.ChoiceField(
+        choices=CATEGORICAL_FIELDS,
+        help_text=_('A categorical field to describe the animals of every value of separately.'),
+        required=False
+    )
+
+
+class AnimalModifySerializer(serializers.Serializer):
+    """
+    A Serializer for adding and removing many animals of a repository in a single version.
+    """
+
+    repository = serializers.HyperlinkedRelatedField(
+        help_text=_('A URI of the repository to modify.'),
+        label=_('Repository'),
+        queryset=Repository.objects.all(),
+        view_name='repositories-detail',
+    )
+    add_filters = serializers.DictField(
+        help_text=_('Add the animals matching these parameters of the animal list, such as '
+                    '"repository_version" and "species".'),
+        required=False
+    )
+    add_natural_keys = serializers.ListField(
+        child=serializers.DictField(child=serializers.CharField()),
+        help_text=_('Add the animals with these "species", "breed", "name" and "shelter".'),
+        required=False
+    )
+    remove_filters = serializers.DictField(
+        help_text=_('Remove the animals matching these parameters of the animal list.'),
+        required=False
+    )
+    remove_natural_keys = serializers.ListField(
+        child=serializers.DictField(child=serializers.CharField()),
+        help_text=_('Remove the animals with these "species", "breed", "name" and "shelter".'),
+        required=False
+    )
+
+    def validate_natural_keys(self, natural_keys):
+        """
+        Check that natural keys have every field, and turn them into lists of values.
+
+        Args:
+            natural_keys (list): The natural keys, as dicts.
+
+        Returns:
+            list: The natural keys, as lists of values in the order of the natural key fields.
+
+        Raises:
+            rest_framework.serializers.ValidationError: If a natural key lacks a field or has
+                another one.
+
+        """
+        fields = models.Animal._meta.unique_together[0]
+        for natural_key in natural_keys:
+            if set(natural_key) != set(fields):
+                raise serializers.ValidationError(
+                    _('Every natural key has exactly the fields {fields}.').format(
+                        fields=', '.join(fields)
+                    )
+                )
+        return [[natural_key[field] for field in fields] for natural_key in natural_keys]
+
+    validate_add_natural_keys = validate_natural_keys
+    validate_remove_natural_keys = validate_natural_keys
+
+    def validate(self, data):
+        """
+        Check that some animals are added or removed.
+
+        Args:
+            data (dict): The modification.
+
+        Returns:
+            dict: The modification.
+
+        Raises:
+            rest_framework.serializers.ValidationError: If nothing is selected.
+
+        """
+        fields = ('add_filters', 'add_natural_keys', 'remove_filters', 'remove_natural_keys')
+        if not any(data.get(field) for field in fields):
+            raise serializers.ValidationError(
+                _('Provide animals to add or remove, by filters or natural keys.')
+            )
+        return data
+
+
+class MultiRemoteSyncSerializer(serializers.Serializer):
+    """
+    A Serializer for syncing several remotes into a single version of a repository.
+    """
+
+    remotes = platform.DetailRelatedField(
+        help_text=_('URIs of the remotes to sync, from the highest priority to the lowest. An '
+                    'animal offered by several remotes is taken from the first of them.'),
+        label=_('Remotes'),
+        queryset=models.ShelterRemote.objects.all(),
+        many=True,
+    )
+    repository = serializers.HyperlinkedRelatedField(
+        help_text=_('A URI of the repository to be synchronized.'),
+        label=_('Repository'),
+        queryset=Repository.objects.all(),
+        view_name='repositories-detail',
+    )
+    mirror = serializers.BooleanField(
+        help_text=_('If True, synchronization will remove all content that is not present in '
+                    'the remotes. If False, sync will be additive only.'),
+        default=True
+    )
+
+    def validate_remotes(self, remotes):
+        """
+        Check that the remotes are distinct, and at least two of them.
+
+        Args:
+            remotes (list): The remotes to sync.
+
+        Returns:
+            list: The remotes.
+
+        Raises:
+            rest_framework.serializers.ValidationError: If fewer than two distinct remotes are
+                given, or one of them has no URL.
+
+        """
+        if len(remotes) < 2 or len({remote.pk for remote in remotes}) != len(remotes):
+            raise serializers.ValidationError(_('Provide at least two distinct remotes.'))
+        for remote in remotes:
+            if not remote.url:
+                raise serializers.ValidationError(
+                    _('A remote must have a url specified to synchronize.')
+                )
+        if len({remote.policy for remote in remotes}) > 1:
+            raise serializers.ValidationError(
+                _('Remotes synced together must share the same download policy.')
+            )
+        return remotes
+
+
+class ShelterSyncSerializer(RepositorySyncURLSerializer):
+    """
+    A Serializer for syncing a shelter remote, or planning the sync.
+    """
+
+    dry_run = serializers.BooleanField(
+        help_text=_('If True, nothing is synced. The task reports how many animals are new to '
+                    'the repository or would be removed, and how many pictures and bytes would '
+                    'be downloaded.'),
+        default=False
+    )
+
+
+class ShelterPrefetchSerializer(serializers.Serializer):
+    """
+    A Serializer for downloading the pictures of a repository synced without them.
+    """
+
+    repository = serializers.HyperlinkedRelatedField(
+        help_text=_('A URI of the repository whose pictures to download.'),
+        label=_('Repository'),
+        queryset=Repository.objects.all(),
+        view_name='repositories-detail',
+    )
+    count = serializers.IntegerField(
+        help_text=_('The number of pictures to download at most. Adoptable animals come first, '
+                    'then the most recently added.'),
+        min_value=1
+    )
+
+
+class PictureUploadSerializer(serializers.ModelSerializer):
+    """
+    A Serializer for a picture uploaded in chunks.
+    """
+
+    id = serializers.UUIDField(
+        help_text=_('The identifier of the upload, part of the URI chunks are sent to.'),
+        read_only=True
+    )
+    size = serializers.IntegerField(
+        help_text=_('The size of the picture in bytes.'),
+        min_value=1
+    )
+    sha256 = serializers.RegexField(
+        r'^[0-9a-f]{64}$',
+        help_text=_('The SHA-256 digest of the picture, checked on commit.'),
+        required=False,
+        allow_null=True
+    )
+    missing = serializers.SerializerMethodField(
+        help_text=_('The ranges of the picture not received yet, each a start and an '
+                    'exclusive end.')
+    )
+
+    def get_missing(self, upload):
+        """
+        Return the ranges of the picture not received yet.
+
+        Args:
+            upload (pulp_shelter.app.models.PictureUpload): The upload.
+
+        Returns:
+            list: Lists of the start and end of every missing range.
+
+        """
+        return missing_ranges(upload.chunks.values_list('offset', 'size'), upload.size)
+
+    class Meta:
+        fields = ('id', 'size', 'sha256', 'created', 'missing')
+        model = models.PictureUpload
+
+
+class PictureUploadChunkSerializer(serializers.Serializer):
+    """
+    A Serializer for a chunk of a picture upload.
+    """
+
+    file = serializers.FileField(
+        help_text=_('The bytes of the chunk.'),
+        allow_empty_file=False
+    )
+    offset = serializers.IntegerField(
+        help_text=_('The position of the chunk in the picture.'),
+        min_value=0
+    )
+    sha256 = serializers.RegexField(
+        r'^[0-9a-f]{64}$',
+        help_text=_('The SHA-256 digest of the chunk, checked as it is received.'),
+        required=False
+    )
+
+    def validate(self, data):
+        """
+        Check that the chunk fits in the picture, and overlaps no other chunk.
+
+        Args:
+            data (dict): The chunk.
+
+        Returns:
+            dict: The chunk.
+
+        Raises:
+            rest_framework.serializers.ValidationError: If the chunk does not fit.
+
+        """
+        upload = self.context['upload']
+        end = data['offset'] + data['file'].size
+        if end > upload.size:
+            raise serializers.ValidationError(_('The chunk ends past the size of the picture.'))
+        overlapping = upload.chunks.annotate(
+            end=F('offset') + F('size')
+        ).filter(offset__lt=end, end__gt=data['offset']).exclude(offset=data['offset'])
+        if overlapping.exists():
+            raise serializers.ValidationError(_('The chunk overlaps another chunk.'))
+        return data
+
+
+class ShelterSerializer(serializers.ModelSerializer):
+    """
+    A Serializer for a shelter of the registry.
+    """
+
+    _href = serializers.HyperlinkedIdentityField(view_name='shelters-detail')
+    name = serializers.CharField(
+        help_text=_('The name of the shelter, as the shelter of animals refers to it.'),
+        validators=[UniqueValidator(queryset=models.Shelter.objects.all())]
+    )
+    latitude = serializers.FloatField(
+        help_text=_('The latitude of the shelter, in degrees.'),
+        min_value=-90,
+        max_value=90
+    )
+    longitude = serializers.FloatField(
+        help_text=_('The longitude of the shelter, in degrees.'),
+        min_value=-180,
+        max_value=180
+    )
+
+    class Meta:
+        fields = ('_href', 'name', 'latitude', 'longitude')
+        model = models.Shelter
+
+
+class ShelterRetentionPolicySerializer(serializers.ModelSerializer):
+    """
+    A Serializer for the retention policy of a repository.
+    """
+
+    _href = serializers.HyperlinkedIdentityField(view_name='shelter-retention-policies-detail')
+    repository = serializers.HyperlinkedRelatedField(
+        help_text=_('A URI of the repository the policy applies to.'),
+        label=_('Repository'),
+        queryset=Repository.objects.all(),
+        view_name='repositories-detail',
+        validators=[UniqueValidator(queryset=models.ShelterRetentionPolicy.objects.all())]
+    )
+    keep_versions = serializers.IntegerField(
+        help_text=_('Keep this many of the most recent versions.'),
+        min_value=1,
+        required=False,
+        allow_null=True
+    )
+    keep_days = serializers.IntegerField(
+        help_text=_('Keep the versions created less than this many days ago.'),
+        min_value=0,
+        required=False,
+        allow_null=True
+    )
+
+    def validate(self, data):
+        """
+        Check that the policy keeps some versions besides the latest one.
+
+        Args:
+            data (dict): The policy.
+
+        Returns:
+            dict: The policy.
+
+        Raises:
+            rest_framework.serializers.ValidationError: If neither limit is given.
+
+        """
+        fields = ('keep_versions', 'keep_days')
+        current = {field: getattr(self.instance, field, None) for field in fields}
+        current.update(data)
+        if all(current.get(field) is None for field in fields):
+            raise serializers.ValidationError(
+                _('Provide the number of versions or of days to keep.')
+            )
+        return data
+
+    class Meta:
+        fields = ('_href', 'repository', 'keep_versions', 'keep_days')
+        model = models.ShelterRetentionPolicy
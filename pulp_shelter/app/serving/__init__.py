@@ -0,0 +1,46 @@
+"""
+A read-only, asynchronous API serving the animals of repository versions and publications.
+
+It runs in its own aiohttp server, like the Pulp content app, so that a single process keeps
+thousands of requests waiting on the database at little cost::
+
+    gunicorn pulp_shelter.app.serving:server --bind 'localhost:8081' \
+        --worker-class 'aiohttp.GunicornWebWorker' -w 2
+"""
+import os
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'pulpcore.app.settings')
+django.setup()
+
+from aiohttp import web  # noqa: E402
+from django.conf import settings  # noqa: E402
+
+from .handler import AnimalHandler  # noqa: E402
+
+
+PATH_PREFIX = getattr(settings, 'SHELTER_SERVING_PATH_PREFIX', '/pulp/shelter/api/v3/')
+
+
+async def server(*args, **kwargs):
+    """
+    Make the aiohttp application of the animal API.
+
+    Returns:
+        aiohttp.web.Application: The application.
+
+    """
+    handler = AnimalHandler()
+    app = web.Application()
+    app.add_routes([
+        web.get(PATH_PREFIX + 'repositories/{repository_pk}/versions/{number:\\d+}/animals/',
+                handler.version_list),
+        web.get(PATH_PREFIX + 'repositories/{repository_pk}/versions/{number:\\d+}/animals/'
+                '{animal_pk}/', handler.version_detail),
+        web.get(PATH_PREFIX + 'publications/{publication_pk}/animals/', handler.publication_list),
+        web.get(PATH_PREFIX + 'publications/{publication_pk}/animals/{animal_pk}/',
+                handler.publication_detail),
+    ])
+    app.on_cleanup.append(handler.close)
+    return app
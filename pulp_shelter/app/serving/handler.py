@@ -0,0 +1,270 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from gettext import gettext as _
+
+from aiohttp import web
+from django.conf import settings
+from django.core.exceptions import ObjectDoesNotExist, ValidationError
+from django.db import close_old_connections
+from django.http import HttpRequest, QueryDict
+from rest_framework import exceptions
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from pulpcore.plugin.models import Publication, RepositoryVersion
+
+from pulp_shelter.app.models import Animal
+from pulp_shelter.app.serializers import AnimalSerializer
+from pulp_shelter.app.viewsets import ORDERING, AnimalFilter
+
+
+# The number of database connections of a process, each held by a thread of its pool.
+CONNECTIONS = getattr(settings, 'SHELTER_SERVING_CONNECTIONS', 10)
+
+
+class ForwardedRequest(HttpRequest):
+    """
+    A Django request standing in for an aiohttp one, so that serializers build the same URLs.
+    """
+
+    def __init__(self, request):
+        """
+        A Django request standing in for an aiohttp one.
+
+        Args:
+            request (aiohttp.web.Request): The request being served.
+
+        """
+        super().__init__()
+        self.method = 'GET'
+        self.path = self.path_info = request.path
+        self.GET = QueryDict(mutable=True)
+        for key, value in request.query.items():
+            self.GET.appendlist(key, value)
+        self.META['HTTP_HOST'] = request.host
+        self.META['QUERY_STRING'] = request.query_string
+        self.forwarded_scheme = request.scheme
+
+    def _get_scheme(self):
+        """
+        Return the scheme of the aiohttp request.
+        """
+        return self.forwarded_scheme
+
+
+class AnimalHandler:
+    """
+    Serve the animals of repository versions and publications, as the REST API does.
+
+    Requests are awaited on the event loop, while their queries run in a bounded pool of
+    threads. Every thread keeps its database connection open across requests, as long as
+    ``CONN_MAX_AGE`` allows, so the pool doubles as a pool of connections.
+    """
+
+    def __init__(self, connections=CONNECTIONS):
+        """
+        Serve the animals of repository versions and publications, as the REST API does.
+
+        Args:
+            connections (int): The number of threads querying the database.
+
+        """
+        self.executor = ThreadPoolExecutor(max_workers=connections)
+
+    async def close(self, app):
+        """
+        Stop the threads, once the application is shut down.
+
+        Args:
+            app (aiohttp.web.Application): The application.
+
+        """
+        self.executor.shutdown()
+
+    async def version_list(self, request):
+        """
+        List the animals of a repository version.
+
+        Args:
+            request (aiohttp.web.Request): The request.
+
+        Returns:
+            aiohttp.web.Response: A page of serialized animals.
+
+        """
+        return await self.respond(request, self.list_animals, self.version_content)
+
+    async def version_detail(self, request):
+        """
+        Show an animal of a repository version.
+
+        Args:
+            request (aiohttp.web.Request): The request.
+
+        Returns:
+            aiohttp.web.Response: The serialized animal.
+
+        """
+        return await self.respond(request, self.show_animal, self.version_content)
+
+    async def publication_list(self, request):
+        """
+        List the animals of the repository version of a publication.
+
+        Args:
+            request (aiohttp.web.Request): The request.
+
+        Returns:
+            aiohttp.web.Response: A page of serialized animals.
+
+        """
+        return await self.respond(request, self.list_animals, self.publication_content)
+
+    async def publication_detail(self, request):
+        """
+        Show an animal of the repository version of a publication.
+
+        Args:
+            request (aiohttp.web.Request): The request.
+
+        Returns:
+            aiohttp.web.Response: The serialized animal.
+
+        """
+        return await self.respond(request, self.show_animal, self.publication_content)
+
+    async def respond(self, request, view, content):
+        """
+        Run a view in the pool of threads and render its data as the REST API does.
+
+        Args:
+            request (aiohttp.web.Request): The request.
+            view (callable): Returns the status and data of the response.
+            content (callable): Returns the content the animals are served from.
+
+        Returns:
+            aiohttp.web.Response: The JSON response.
+
+        """
+        loop = asyncio.get_event_loop()
+        status, data = await loop.run_in_executor(
+            self.executor, self.query, view, request, content
+        )
+        return web.Response(
+            body=JSONRenderer().render(data),
+            status=status,
+            content_type='application/json'
+        )
+
+    @staticmethod
+    def query(view, request, content):
+        """
+        Run a view, in a thread of the pool.
+
+        Args:
+            view (callable): Returns the status and data of the response.
+            request (aiohttp.web.Request): The request.
+            content (callable): Returns the content the animals are served from.
+
+        Returns:
+            tuple: The status and data of the response.
+
+        """
+        close_old_connections()
+        try:
+            animals = Animal.objects.filter(pk__in=content(request.match_info))
+            return view(animals.prefetch_related('_artifacts'), request)
+        except (ObjectDoesNotExist, ValidationError):
+            return 404, {'detail': _('Not found.')}
+
+    @staticmethod
+    def version_content(match_info):
+        """
+        Return the content of the repository version named by the path of a request.
+
+        Args:
+            match_info (dict): The variables of the path.
+
+        Returns:
+            django.db.models.QuerySet: The content of the repository version.
+
+        Raises:
+            django.core.exceptions.ObjectDoesNotExist: If there is no such complete version.
+
+        """
+        return RepositoryVersion.objects.get(
+            repository__pk=match_info['repository_pk'],
+            number=match_info['number'],
+            complete=True
+        ).content
+
+    @staticmethod
+    def publication_content(match_info):
+        """
+        Return the content of the repository version of the publication named by a path.
+
+        Args:
+            match_info (dict): The variables of the path.
+
+        Returns:
+            django.db.models.QuerySet: The content of the published repository version.
+
+        Raises:
+            django.core.exceptions.ObjectDoesNotExist: If there is no such complete publication.
+
+        """
+        return Publication.objects.select_related('repository_version').get(
+            pk=match_info['publication_pk'],
+            complete=True
+        ).repository_version.content
+
+    @staticmethod
+    def list_animals(animals, request):
+        """
+        Filter and paginate animals as the animal list of the REST API does.
+
+        Args:
+            animals (django.db.models.QuerySet): The animals being served.
+            request (aiohttp.web.Request): The request.
+
+        Returns:
+            tuple: The status and data of the response.
+
+        """
+        drf_request = Request(ForwardedRequest(request))
+        filterset = AnimalFilter(drf_request.query_params, queryset=animals.order_by(*ORDERING))
+        if not filterset.is_valid():
+            return 400, filterset.errors
+        try:
+            animals = filterset.qs
+        except exceptions.ValidationError as error:
+            return 400, error.detail
+        context = {'request': drf_request}
+        pagination_class = api_settings.DEFAULT_PAGINATION_CLASS
+        if pagination_class is None:
+            return 200, AnimalSerializer(animals, many=True, context=context).data
+        paginator = pagination_class()
+        page = paginator.paginate_queryset(animals, drf_request)
+        data = AnimalSerializer(page, many=True, context=context).data
+        return 200, paginator.get_paginated_response(data).data
+
+    @staticmethod
+    def show_animal(animals, request):
+        """
+        Serialize an animal as the animal detail of the REST API does.
+
+        Args:
+            animals (django.db.models.QuerySet): The animals being served.
+            request (aiohttp.web.Request): The request.
+
+        Returns:
+            tuple: The status and data of the response.
+
+        Raises:
+            django.core.exceptions.ObjectDoesNotExist: If the animal is not served.
+
+        """
+        animal = animals.get(pk=request.match_info['animal_pk'])
+        context = {'request': Request(ForwardedRequest(request))}
+        return 200, AnimalSerializer(animal, context=context).data
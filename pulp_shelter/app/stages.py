@@ -0,0 +1,699 @@
+from gettext import gettext as _
+import asyncio
+import json
+import logging
+import multiprocessing
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+
+from pulpcore.plugin.models import Artifact, ProgressBar, RemoteArtifact
+from pulpcore.plugin.stages import (
+    ArtifactDownloader,
+    ContentUnitSaver,
+    DeclarativeVersion,
+    QueryExistingArtifacts,
+    QueryExistingContentUnits,
+    Stage
+)
+
+from pulp_shelter.app.lookup import NATURAL_KEY, key_digest
+from pulp_shelter.app.manifest import RECORD_SCHEMA, InvalidLine
+from pulp_shelter.app.metrics import STAGE_DURATION
+from pulp_shelter.app.models import Animal, PictureValidators
+from pulp_shelter.app.tasks.publishing import publish_file
+from pulp_shelter.app.validation import validate_batch
+
+
+log = logging.getLogger(__name__)
+
+# The number of processes validating the records of a sync.
+VALIDATION_WORKERS = getattr(settings, 'SHELTER_VALIDATION_WORKERS', 2)
+
+QUARANTINE_NAME = 'quarantine.ndjson'
+
+# The publisher of the quarantine reports, which distributions serve like any other publication.
+QUARANTINE_PUBLISHER = 'shelter-quarantine'
+
+
+class ShelterDeclarativeVersion(DeclarativeVersion):
+    """
+    A DeclarativeVersion which saves downloaded Artifacts in a pool of threads.
+
+    Its first stage emits compact records rather than `DeclarativeContent`. They are checked by
+    the :class:`RecordValidator` stage which follows it, using its ``remote_record`` method to
+    tell the remote and record of every item. The valid ones are turned into
+    `DeclarativeContent` with its ``declarative_content`` method, called by the
+    :class:`DeclarativeContentBuilder` stage.
+
+    The duration of every stage is observed in the metrics, under the :attr:`pipeline` name.
+    """
+
+    pipeline = 'sync'
+
+    def __init__(self, first_stage, repository, storage_concurrency, mirror=True,
+                 download_artifacts=True, remotes=(), lookup=None):
+        """
+        A DeclarativeVersion which saves downloaded Artifacts in a pool of threads.
+
+        Args:
+            first_stage (pulpcore.plugin.stages.Stage): The first stage of the pipeline.
+            repository (pulpcore.plugin.models.Repository): The repository receiving content.
+            storage_concurrency (int): The number of threads saving Artifacts.
+            mirror (bool): True for mirror mode, False for additive.
+            download_artifacts (bool): Whether to download Artifacts.
+            remotes (list): Pictures downloaded before from any of these
+                :class:`~pulp_shelter.app.models.ShelterRemote` are revalidated rather than
+                downloaded again.
+            lookup (pulp_shelter.app.lookup.ContentLookup): If given, existing animals are
+                looked up in this warmed cache of the sync before being queried.
+
+        """
+        super().__init__(
+            first_stage, repository, mirror=mirror, download_artifacts=download_artifacts
+        )
+        self.storage_concurrency = storage_concurrency
+        self.remotes = remotes
+        self.lookup = lookup
+
+    def pipeline_stages(self, new_version):
+        """
+        Build the list of pipeline stages feeding into the ContentUnitAssociation stage.
+
+        Args:
+            new_version (pulpcore.plugin.models.RepositoryVersion): The new repository version
+                that is going to be built.
+
+        Returns:
+            list: List of :class:`~pulpcore.plugin.stages.Stage` instances
+
+        """
+        pipeline = [
+            self.first_stage,
+            RecordValidator(self.first_stage.remote_record, new_version),
+            DeclarativeContentBuilder(self.first_stage.declarative_content),
+            QueryExistingArtifacts()
+        ]
+        revalidate = self.download_artifacts and bool(self.remotes)
+        if revalidate:
+            pipeline.append(PictureRevalidator(self.remotes))
+        if self.download_artifacts:
+            pipeline.extend([
+                ArtifactDownloader(),
+                ShelterArtifactSaver(self.storage_concurrency)
+            ])
+        if self.lookup is not None:
+            pipeline.append(ExistingContentLookup(self.lookup))
+        pipeline.extend([QueryExistingContentUnits(), ContentUnitSaver()])
+        if revalidate:
+            pipeline.append(PictureValidatorSaver(self.remotes))
+        return self.timed(pipeline)
+
+    def timed(self, stages):
+        """
+        Wrap stages so that their duration is observed.
+
+        Args:
+            stages (list): List of :class:`~pulpcore.plugin.stages.Stage` instances.
+
+        Returns:
+            list: The stages, each wrapped in a :class:`TimedStage`.
+
+        """
+        return [TimedStage(stage, self.pipeline) for stage in stages]
+
+
+class TimedStage(Stage):
+    """
+    Run a stage, observing the time until it has passed on all of its content.
+    """
+
+    def __init__(self, stage, pipeline):
+        """
+        Run a stage, observing the time until it has passed on all of its content.
+
+        Args:
+            stage (pulpcore.plugin.stages.Stage): The stage to run.
+            pipeline (str): The name of the pipeline, labelling the observed duration.
+
+        """
+        self.stage = stage
+        self.pipeline = pipeline
+
+    async def __call__(self, in_q, out_q):
+        """
+        Run the stage.
+
+        Args:
+            in_q (asyncio.Queue): The queue to receive `DeclarativeContent` objects from.
+            out_q (asyncio.Queue): The queue to send `DeclarativeContent` objects to.
+
+        """
+        started = time.monotonic()
+        await self.stage(in_q, out_q)
+        STAGE_DURATION.labels(
+            pipeline=self.pipeline,
+            stage=type(self.stage).__name__
+        ).observe(time.monotonic() - started)
+
+
+class RecordValidator(Stage):
+    """
+    Quarantine the invalid records of a first stage, and pass the valid ones on.
+
+    Checking records is CPU bound, so batches of records are validated in a pool of ``workers``
+    processes, and passed on in the order they came in. The lines of a manifest which are not
+    entries are quarantined as they are. A valid record with the natural key or the picture of
+    a record passed on before would violate a uniqueness constraint: it is quarantined if both
+    come from the same remote, and skipped if the earlier one comes from a remote listed
+    before, which wins the conflict. So would a record with the picture of a saved animal of
+    another natural key, which is quarantined.
+
+    Quarantined and skipped records are counted in progress reports, and the quarantined ones
+    written along with their errors into a report. The report is published on its own by the
+    :data:`QUARANTINE_PUBLISHER`, so a distribution serves it, and the publication is a resource
+    created by the task.
+    """
+
+    def __init__(self, remote_record, new_version, workers=VALIDATION_WORKERS):
+        """
+        Quarantine the invalid records of a first stage, and pass the valid ones on.
+
+        Args:
+            remote_record (callable): Returns the remote and the record of an item emitted by
+                the first stage.
+            new_version (pulpcore.plugin.models.RepositoryVersion): The repository version being
+                built, which the report is published from.
+            workers (int): The number of processes validating records.
+
+        """
+        self.remote_record = remote_record
+        self.new_version = new_version
+        self.workers = workers
+        self.report = None
+        self.quarantined = None
+        self.skipped = None
+        # The remote PK of the natural key and picture digests passed on so far, see
+        # key_digest().
+        self.keys = {}
+        self.pictures = {}
+
+    async def __call__(self, in_q, out_q):
+        """
+        Validate every record and pass the valid ones on.
+
+        Args:
+            in_q (asyncio.Queue): The queue to receive the items of the first stage from.
+            out_q (asyncio.Queue): The queue to send the valid items to.
+
+        """
+        pending = deque()
+        # Workers are spawned rather than forked, which is not safe alongside the threads of
+        # other stages; they only import the validation module.
+        context = multiprocessing.get_context('spawn')
+        with ProgressBar(message=_('Quarantined Animals')) as self.quarantined, \
+                ProgressBar(message=_('Skipping Conflicting Animals')) as self.skipped, \
+                context.Pool(self.workers) as pool:
+            async for batch in self.batches(in_q):
+                records = [self.remote_record(item)[1] for item in batch]
+                values = [
+                    None if isinstance(record, InvalidLine) else tuple(record)
+                    for record in records
+                ]
+                pending.append((batch, self.submit(pool, values)))
+                if len(pending) > self.workers:
+                    batch, future = pending.popleft()
+                    await self.put_valid(batch, await future, out_q)
+            while pending:
+                batch, future = pending.popleft()
+                await self.put_valid(batch, await future, out_q)
+        self.attach_report(self.quarantined.done)
+        await out_q.put(None)
+
+    @staticmethod
+    def submit(pool, values):
+        """
+        Validate a batch of records in a worker process.
+
+        Args:
+            pool (multiprocessing.pool.Pool): The worker processes.
+            values (list): The records, as plain tuples, None for invalid lines.
+
+        Returns:
+            asyncio.Future: Resulting in what :func:`~pulp_shelter.app.validation.validate_batch`
+                returns.
+
+        """
+        loop = asyncio.get_event_loop()
+        future = loop.create_future()
+        pool.apply_async(
+            validate_batch, (values, RECORD_SCHEMA),
+            callback=lambda result: loop.call_soon_threadsafe(future.set_result, result),
+            error_callback=lambda error: loop.call_soon_threadsafe(future.set_exception, error)
+        )
+        return future
+
+    async def put_valid(self, batch, invalid, out_q):
+        """
+        Pass on the valid items of a validated batch, and quarantine or skip the others.
+
+        Args:
+            batch (list): The items emitted by the first stage.
+            invalid (list): Tuples of the index and the errors of every invalid record.
+            out_q (asyncio.Queue): The queue to send the valid items to.
+
+        """
+        errors = dict(invalid)
+        items = [self.remote_record(item) for item in batch]
+        saved = self.saved_pictures([
+            record for index, (remote, record) in enumerate(items)
+            if index not in errors and not isinstance(record, InvalidLine)
+        ])
+        for index, (item, (remote, record)) in enumerate(zip(batch, items)):
+            if isinstance(record, InvalidLine):
+                record_errors = {'line': record.error}
+            elif index in errors:
+                record_errors = errors[index]
+            else:
+                record_errors = self.saved_picture_errors(record, saved) or \
+                    self.duplicate_errors(remote, record)
+            if record_errors is None:
+                self.skipped.done += 1
+            elif record_errors:
+                self.quarantine(remote, record, record_errors)
+                self.quarantined.done += 1
+            else:
+                await out_q.put(item)
+
+    @staticmethod
+    def saved_pictures(records):
+        """
+        Find the saved animals with the pictures of records.
+
+        Args:
+            records (list): Valid :class:`~pulp_shelter.app.manifest.AnimalRecord` objects.
+
+        Returns:
+            dict: The natural key of the saved animal of every picture, as a tuple.
+
+        """
+        if not records:
+            return {}
+        rows = Animal.objects.filter(
+            picture__in={record.picture for record in records}
+        ).values_list('picture', *NATURAL_KEY)
+        return {picture: tuple(key) for picture, *key in rows}
+
+    @staticmethod
+    def saved_picture_errors(record, saved):
+        """
+        Find whether a valid record has the picture of a saved animal with another natural key.
+
+        Args:
+            record (pulp_shelter.app.manifest.AnimalRecord): A valid record.
+            saved (dict): The natural keys of saved animals by picture, see
+                :meth:`saved_pictures`.
+
+        Returns:
+            dict: The error of the picture, empty if it is free or the picture of this animal.
+
+        """
+        key = saved.get(record.picture)
+        if key is None or key == tuple(getattr(record, field) for field in NATURAL_KEY):
+            return {}
+        return {'picture': _('The picture of another saved animal.')}
+
+    def duplicate_errors(self, remote, record):
+        """
+        Find whether a valid record repeats the natural key or picture of a previous one.
+
+        Args:
+            remote (pulp_shelter.app.models.ShelterRemote): The remote of the record.
+            record (pulp_shelter.app.manifest.AnimalRecord): A valid record.
+
+        Returns:
+            dict: The error of every repeated field, empty if the record is passed on, None if
+                it repeats a record of another remote and is skipped.
+
+        """
+        key = key_digest(getattr(record, field) for field in NATURAL_KEY)
+        picture = key_digest((record.picture,))
+        if key in self.keys:
+            fields, owner = NATURAL_KEY, self.keys[key]
+        elif picture in self.pictures:
+            fields, owner = ('picture',), self.pictures[picture]
+        else:
+            self.keys[key] = self.pictures[picture] = remote.pk
+            return {}
+        if owner != remote.pk:
+            return None
+        return {field: _('Repeats an earlier animal.') for field in fields}
+
+    def quarantine(self, remote, record, errors):
+        """
+        Write a quarantined record into the report.
+
+        Args:
+            remote (pulp_shelter.app.models.ShelterRemote): The remote of the record.
+            record (pulp_shelter.app.manifest.AnimalRecord): The record, or the
+                :class:`~pulp_shelter.app.manifest.InvalidLine` of the manifest.
+            errors (dict): The error of every invalid field.
+
+        """
+        if self.report is None:
+            self.report = open(QUARANTINE_NAME, 'w')
+        quarantined = {'remote': remote.name, 'errors': errors}
+        if isinstance(record, InvalidLine):
+            quarantined.update(line=record.number, text=record.text)
+        else:
+            quarantined['entry'] = {
+                field: value for field, value in record._asdict().items() if value is not None
+            }
+        self.report.write(json.dumps(quarantined, sort_keys=True))
+        self.report.write('\n')
+
+    def attach_report(self, quarantined):
+        """
+        Publish the report of the quarantined records.
+
+        Args:
+            quarantined (int): The number of quarantined records.
+
+        """
+        if self.report is None:
+            return
+        self.report.close()
+        publication = publish_file(self.new_version, QUARANTINE_NAME, QUARANTINE_PUBLISHER)
+        log.warning(_('Quarantined {count} animals, see publication {publication}').format(
+            count=quarantined,
+            publication=publication.pk
+        ))
+
+
+class DeclarativeContentBuilder(Stage):
+    """
+    Turn the compact records of a first stage into `DeclarativeContent`, a batch at a time.
+
+    Model instances are only made for the batches leaving this stage, instead of for every
+    record waiting in the queue of the first stage.
+    """
+
+    def __init__(self, build):
+        """
+        Turn the compact records of a first stage into `DeclarativeContent`.
+
+        Args:
+            build (callable): Makes the `DeclarativeContent` of a record.
+
+        """
+        self.build = build
+
+    async def __call__(self, in_q, out_q):
+        """
+        Build and emit the `DeclarativeContent` of every record.
+
+        Args:
+            in_q (asyncio.Queue): The queue to receive records from.
+            out_q (asyncio.Queue): The queue to send `DeclarativeContent` objects to.
+
+        """
+        async for batch in self.batches(in_q):
+            for record in batch:
+                await out_q.put(self.build(record))
+        await out_q.put(None)
+
+
+class ShelterArtifactSaver(Stage):
+    """
+    Save new Artifacts in a bounded pool of threads.
+
+    Moving a file into artifact storage and inserting its Artifact blocks, which would stall the
+    event loop and with it every download. Instead, each batch of content is handed to one of
+    ``workers`` threads. When all of them are busy the stage stops reading its input queue, and
+    the queues filling up upstream hold the downloads back.
+    """
+
+    def __init__(self, workers):
+        """
+        Save new Artifacts in a bounded pool of threads.
+
+        Args:
+            workers (int): The number of threads saving Artifacts.
+
+        """
+        self.workers = workers
+
+    async def __call__(self, in_q, out_q):
+        """
+        Save the new Artifacts of `DeclarativeContent` and pass the content on.
+
+        Args:
+            in_q (asyncio.Queue): The queue to receive `DeclarativeContent` objects from.
+            out_q (asyncio.Queue): The queue to send `DeclarativeContent` objects to.
+
+        """
+        loop = asyncio.get_event_loop()
+        pending = set()
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            async for batch in self.batches(in_q):
+                pending.add(loop.run_in_executor(executor, self.save_artifacts, batch))
+                if len(pending) >= self.workers:
+                    done, pending = await asyncio.wait(
+                        pending, return_when=asyncio.FIRST_COMPLETED
+                    )
+                    await self.put_done(done, out_q)
+            if pending:
+                done, pending = await asyncio.wait(pending)
+                await self.put_done(done, out_q)
+        await out_q.put(None)
+
+    @staticmethod
+    async def put_done(futures, out_q):
+        """
+        Pass on the content of completed batches.
+
+        Args:
+            futures (set): Completed futures, each resulting in a batch of content.
+            out_q (asyncio.Queue): The queue to send `DeclarativeContent` objects to.
+
+        """
+        for future in futures:
+            for declarative_content in future.result():
+                await out_q.put(declarative_content)
+
+    @staticmethod
+    def save_artifacts(batch):
+        """
+        Save the new Artifacts of a batch of content, running in a worker thread.
+
+        An Artifact saved meanwhile by another batch or task is replaced by the existing one.
+
+        Args:
+            batch (list): A list of `DeclarativeContent`.
+
+        Returns:
+            list: The same batch, with every Artifact saved.
+
+        """
+        try:
+            for declarative_content in batch:
+                for declarative_artifact in declarative_content.d_artifacts:
+                    artifact = declarative_artifact.artifact
+                    if not artifact._state.adding or not artifact.file:
+                        continue
+                    try:
+                        with transaction.atomic():
+                            artifact.save()
+                    except IntegrityError:
+                        declarative_artifact.artifact = Artifact.objects.get(
+                            sha256=artifact.sha256
+                        )
+        finally:
+            # Every thread has its own connection, which would otherwise outlive the thread.
+            connection.close()
+        return batch
+
+
+class ExistingContentLookup(Stage):
+    """
+    Resolve animals which already exist from a cache, sparing their query.
+
+    Animals found are replaced by saved ones, which QueryExistingContentUnits then skips.
+    """
+
+    def __init__(self, lookup):
+        """
+        Resolve animals which already exist from a cache.
+
+        Args:
+            lookup (pulp_shelter.app.lookup.ContentLookup): The cache.
+
+        """
+        self.lookup = lookup
+
+    async def __call__(self, in_q, out_q):
+        """
+        Replace the unsaved animals of `DeclarativeContent` found in the cache.
+
+        Args:
+            in_q (asyncio.Queue): The queue to receive `DeclarativeContent` objects from.
+            out_q (asyncio.Queue): The queue to send `DeclarativeContent` objects to.
+
+        """
+        async for batch in self.batches(in_q):
+            for declarative_content in batch:
+                animal = declarative_content.content
+                if animal._state.adding:
+                    pk = self.lookup.get(animal)
+                    if pk is not None:
+                        animal.pk = pk
+                        animal._state.adding = False
+                        animal._state.db = 'default'
+                await out_q.put(declarative_content)
+        await out_q.put(None)
+
+
+class PictureRevalidator(Stage):
+    """
+    Reuse pictures which are unchanged since they were last downloaded from their remote.
+
+    Pictures whose digest is not known from the manifest would otherwise be downloaded again
+    on every sync. Those downloaded before are checked with a conditional request, and those
+    the upstream reports as unchanged are replaced by the Artifact saved back then, which the
+    ArtifactDownloader skips.
+    """
+
+    def __init__(self, remotes):
+        """
+        Reuse pictures which are unchanged since they were last downloaded from their remote.
+
+        Args:
+            remotes (list): The :class:`~pulp_shelter.app.models.ShelterRemote` being synced.
+
+        """
+        self.remotes = {remote.pk: remote for remote in remotes}
+
+    async def __call__(self, in_q, out_q):
+        """
+        Replace the unsaved Artifacts of unchanged pictures by the saved ones.
+
+        Args:
+            in_q (asyncio.Queue): The queue to receive `DeclarativeContent` objects from.
+            out_q (asyncio.Queue): The queue to send `DeclarativeContent` objects to.
+
+        """
+        async for batch in self.batches(in_q):
+            unsaved = {}
+            for declarative_content in batch:
+                for declarative_artifact in declarative_content.d_artifacts:
+                    remote = declarative_artifact.remote
+                    if remote is None or remote.pk not in self.remotes:
+                        continue
+                    if declarative_artifact.artifact._state.adding:
+                        unsaved[(remote.pk, declarative_artifact.url)] = declarative_artifact
+            if unsaved:
+                remote_artifacts = [
+                    remote_artifact for remote_artifact in RemoteArtifact.objects.filter(
+                        remote__in=list(self.remotes),
+                        url__in={url for remote_pk, url in unsaved},
+                        shelter_validators__isnull=False,
+                        content_artifact__artifact__isnull=False
+                    ).select_related('shelter_validators', 'content_artifact__artifact')
+                    if (remote_artifact.remote_id, remote_artifact.url) in unsaved
+                ]
+                unchanged = await asyncio.gather(*(
+                    self.not_modified(remote_artifact) for remote_artifact in remote_artifacts
+                ))
+                for remote_artifact, not_modified in zip(remote_artifacts, unchanged):
+                    if not_modified:
+                        unsaved[(remote_artifact.remote_id, remote_artifact.url)].artifact = \
+                            remote_artifact.content_artifact.artifact
+            for declarative_content in batch:
+                await out_q.put(declarative_content)
+        await out_q.put(None)
+
+    async def not_modified(self, remote_artifact):
+        """
+        Tell whether a picture is unchanged since it was last downloaded.
+
+        Args:
+            remote_artifact (pulpcore.plugin.models.RemoteArtifact): The picture to check.
+
+        Returns:
+            bool: True if the picture is unchanged.
+
+        """
+        validators = remote_artifact.shelter_validators
+        remote = self.remotes[remote_artifact.remote_id]
+        downloader = remote.get_downloader(url=remote_artifact.url)
+        return await downloader.not_modified(
+            etag=validators.etag,
+            last_modified=validators.last_modified,
+            size=validators.size
+        )
+
+
+class PictureValidatorSaver(Stage):
+    """
+    Save the HTTP validators of the pictures downloaded from the remotes being synced.
+    """
+
+    def __init__(self, remotes):
+        """
+        Save the HTTP validators of the pictures downloaded from the remotes being synced.
+
+        Args:
+            remotes (list): The :class:`~pulp_shelter.app.models.ShelterRemote` being synced,
+                whose downloaders collect the validators.
+
+        """
+        self.remotes = remotes
+
+    async def __call__(self, in_q, out_q):
+        """
+        Save the validators of the pictures of `DeclarativeContent` and pass the content on.
+
+        The validators are saved once the RemoteArtifacts exist, and are then dropped from
+        their remote so they do not pile up in memory.
+
+        Args:
+            in_q (asyncio.Queue): The queue to receive `DeclarativeContent` objects from.
+            out_q (asyncio.Queue): The queue to send `DeclarativeContent` objects to.
+
+        """
+        async for batch in self.batches(in_q):
+            for remote in self.remotes:
+                self.save_validators(remote, batch)
+            for declarative_content in batch:
+                await out_q.put(declarative_content)
+        await out_q.put(None)
+
+    @staticmethod
+    def save_validators(remote, batch):
+        """
+        Save the validators collected for the pictures of a batch downloaded from a remote.
+
+        Args:
+            remote (pulp_shelter.app.models.ShelterRemote): The remote.
+            batch (list): A list of `DeclarativeContent`.
+
+        """
+        cache = remote.picture_validators
+        validators = {}
+        for declarative_content in batch:
+            for declarative_artifact in declarative_content.d_artifacts:
+                if declarative_artifact.remote is remote and declarative_artifact.url in cache:
+                    validators[declarative_artifact.url] = cache.pop(declarative_artifact.url)
+        if not validators:
+            return
+        remote_artifacts = RemoteArtifact.objects.filter(remote=remote, url__in=validators)
+        with transaction.atomic():
+            PictureValidators.objects.filter(remote_artifact__in=remote_artifacts).delete()
+            PictureValidators.objects.bulk_create(
+                PictureValidators(remote_artifact=remote_artifact,
+                                  **validators[remote_artifact.url])
+                for remote_artifact in remote_artifacts
+            )
@@ -1,2 +1,59 @@
-from .publishing import publish  # noqa
-from .synchronizing import synchronize  # noqa
+"""
+The tasks of the plugin, each imported from its module on first access.
+
+Task modules pull in the stages API and the code of every workflow. API workers only need a
+task when enqueueing it, and task workers import the module of the task they run, so neither
+imports them all when the plugin is loaded.
+"""
+import importlib
+import sys
+import types
+
+
+# The module defining every task.
+TASK_MODULES = {
+    'clean_up': 'retention',
+    'export': 'exporting',
+    'import_archive': 'importing',
+    'modify': 'modifying',
+    'plan_sync': 'planning',
+    'prefetch': 'prefetching',
+    'publish': 'publishing',
+    'synchronize': 'synchronizing',
+    'synchronize_remotes': 'synchronizing',
+}
+
+__all__ = sorted(TASK_MODULES)
+
+
+class TasksModule(types.ModuleType):
+    """
+    A package importing the module of a task when the task is first accessed.
+    """
+
+    def __getattr__(self, name):
+        """
+        Return a task, importing its module.
+
+        Only called for the attributes the package does not have yet.
+
+        Args:
+            name (str): The name of the task.
+
+        Returns:
+            function: The task.
+
+        Raises:
+            AttributeError: If there is no such task.
+
+        """
+        if name not in TASK_MODULES:
+            raise AttributeError(
+                'module {module!r} has no attribute {name!r}'.format(module=__name__, name=name)
+            )
+        module = importlib.import_module('.' + TASK_MODULES[name], __name__)
+        return getattr(module, name)
+
+
+# The module-level __getattr__ of Python 3.7 and later, for Python 3.6 as well.
+sys.modules[__name__].__class__ = TasksModule
@@ -0,0 +1,93 @@
+import logging
+import tarfile
+from gettext import gettext as _
+
+from pulpcore.plugin.models import ContentArtifact, ProgressBar, RepositoryVersion
+from pulpcore.plugin.tasking import WorkingDirectory
+
+from pulp_shelter.app.manifest import MANIFEST_FIELDS, MANIFEST_NAME, dump_entry
+from pulp_shelter.app.metrics import ANIMALS, task_metrics
+from pulp_shelter.app.models import Animal
+from pulp_shelter.app.queries import query_phase
+from pulp_shelter.app.tasks.publishing import publish_file
+from pulp_shelter.app.utils import batched
+
+
+log = logging.getLogger(__name__)
+
+ARCHIVE_NAME = 'animals.tar.gz'
+
+# The publisher of the exports, which distributions serve like any other publication.
+EXPORT_PUBLISHER = 'shelter-export'
+
+CHUNK_SIZE = 2000
+
+
+def export(repository_version_pk, include_pictures=False):
+    """
+    Export the animals of a repository version into a file published for download.
+
+    The animals are written as a manifest. With pictures included, the manifest and the
+    pictures are bundled into a gzipped tarball, which is the format accepted by an import.
+    Animals are read from a server-side cursor and written in chunks, so memory stays bounded
+    however large the repository version is. The file is the only metadata of a publication
+    of the version by the :data:`EXPORT_PUBLISHER`, so a distribution serves it.
+
+    Args:
+        repository_version_pk (str): Export the animals of this repository version.
+        include_pictures (bool): Bundle the picture of each animal with the manifest.
+
+    """
+    repository_version = RepositoryVersion.objects.get(pk=repository_version_pk)
+    animals = Animal.objects.filter(pk__in=repository_version.content).order_by('pk')
+
+    log.info(_('Exporting: repository={repo}, version={ver}').format(
+        repo=repository_version.repository.name,
+        ver=repository_version.number
+    ))
+    with task_metrics('export'), WorkingDirectory(), \
+            query_phase(_('Database Queries: Export')):
+        with ProgressBar(message=_('Exporting Animals'), total=animals.count()) as bar:
+            if include_pictures:
+                with tarfile.open(ARCHIVE_NAME, 'w:gz') as archive:
+                    write_manifest(animals, bar, archive)
+                    archive.add(MANIFEST_NAME)
+                path = ARCHIVE_NAME
+            else:
+                write_manifest(animals, bar)
+                path = MANIFEST_NAME
+        publication = publish_file(repository_version, path, EXPORT_PUBLISHER)
+
+    log.info(_('Export: {publication} created').format(publication=publication.pk))
+
+
+def write_manifest(animals, progress_bar, archive=None):
+    """
+    Write animals into a manifest in the working directory.
+
+    Args:
+        animals (django.db.models.QuerySet): The animals to write.
+        progress_bar (pulpcore.plugin.models.ProgressBar): Advanced after every chunk.
+        archive (tarfile.TarFile): If given, the pictures are added to it and their size and
+            digest are recorded in the manifest.
+
+    """
+    rows = animals.values('pk', *MANIFEST_FIELDS).iterator(chunk_size=CHUNK_SIZE)
+    with open(MANIFEST_NAME, 'w') as manifest:
+        for batch in batched(rows, CHUNK_SIZE):
+            artifacts = {}
+            if archive is not None:
+                content_artifacts = ContentArtifact.objects.filter(
+                    content__in=[row['pk'] for row in batch],
+                    artifact__isnull=False
+                ).select_related('artifact')
+                artifacts = {ca.content_id: ca.artifact for ca in content_artifacts}
+            for row in batch:
+                artifact = artifacts.get(row.pop('pk'))
+                if artifact is not None:
+                    archive.add(artifact.file.path, arcname=row['picture'])
+                    row.update(size=artifact.size, sha256=artifact.sha256)
+                dump_entry(row, manifest)
+            ANIMALS.labels(task='export').inc(len(batch))
+            progress_bar.done += len(batch)
+            progress_bar.save()
@@ -0,0 +1,232 @@
+import asyncio
+import logging
+import os
+import tarfile
+from concurrent.futures import ThreadPoolExecutor
+from gettext import gettext as _
+
+from pulpcore.plugin.models import Artifact, ProgressBar, Repository
+from pulpcore.plugin.stages import (
+    ContentUnitSaver,
+    DeclarativeArtifact,
+    DeclarativeContent,
+    QueryExistingArtifacts,
+    QueryExistingContentUnits,
+    Stage
+)
+from pulpcore.plugin.tasking import WorkingDirectory
+
+from pulp_shelter.app.manifest import MANIFEST_NAME, animal_from_entry, read_manifest
+from pulp_shelter.app.metrics import ANIMALS, task_metrics
+from pulp_shelter.app.queries import query_phase
+from pulp_shelter.app.stages import ShelterArtifactSaver, ShelterDeclarativeVersion
+from pulp_shelter.app.utils import batched, file_digests
+
+
+log = logging.getLogger(__name__)
+
+WORKERS = os.cpu_count() or 1
+
+BATCH_SIZE = 500
+
+
+def import_archive(artifact_pk, repository_pk, mirror=False):
+    """
+    Import animals and their pictures from an uploaded archive.
+
+    The archive is a tarball of a manifest and the pictures it references, as written by an
+    export. It goes through the same stage pipeline as a sync, creating a single new version of
+    the repository.
+
+    Args:
+        artifact_pk (str): The PK of the Artifact holding the archive.
+        repository_pk (str): The repository PK.
+        mirror (bool): True for mirror mode, False for additive.
+
+    Raises:
+        ValueError: If the archive holds no manifest or a member outside of the archive root.
+
+    """
+    archive = Artifact.objects.get(pk=artifact_pk)
+    repository = Repository.objects.get(pk=repository_pk)
+
+    log.info(_('Importing: repository={repo}, archive={archive}').format(
+        repo=repository.name,
+        archive=archive.pk
+    ))
+    with task_metrics('import'), WorkingDirectory():
+        path = os.getcwd()
+        with ProgressBar(message=_('Extracting Archive')) as pb:
+            with tarfile.open(archive.file.path) as tarball:
+                tarball.extractall(path=path, members=safe_members(tarball))
+            pb.increment()
+
+        first_stage = ShelterArchiveFirstStage(path)
+        with query_phase(_('Database Queries: Import')):
+            ShelterImportVersion(first_stage, repository, WORKERS, mirror=mirror).create()
+
+
+def safe_members(tarball):
+    """
+    Yield the regular files and directories of a tarball.
+
+    Args:
+        tarball (tarfile.TarFile): The archive to be extracted.
+
+    Yields:
+        tarfile.TarInfo: The next member safe to extract.
+
+    Raises:
+        ValueError: If a member would be extracted outside of the destination directory.
+
+    """
+    for member in tarball:
+        if not is_relative(member.name):
+            raise ValueError(_('Archive member {name} is not a relative path').format(
+                name=member.name
+            ))
+        if member.isfile() or member.isdir():
+            yield member
+
+
+def is_relative(path):
+    """
+    Tell whether a path stays within the directory it is relative to.
+
+    Args:
+        path (str): The path to check.
+
+    Returns:
+        bool: False for absolute paths and paths escaping through parent directories.
+
+    """
+    path = os.path.normpath(path)
+    return not (os.path.isabs(path) or path == os.pardir or path.startswith(os.pardir + os.sep))
+
+
+class ShelterImportVersion(ShelterDeclarativeVersion):
+    """
+    A DeclarativeVersion whose Artifacts are local files, so they are saved without a download.
+    """
+
+    pipeline = 'import'
+
+    def pipeline_stages(self, new_version):
+        """
+        Build the list of pipeline stages feeding into the ContentUnitAssociation stage.
+
+        Args:
+            new_version (pulpcore.plugin.models.RepositoryVersion): The new repository version
+                that is going to be built.
+
+        Returns:
+            list: List of :class:`~pulpcore.plugin.stages.Stage` instances
+
+        """
+        return self.timed([
+            self.first_stage,
+            QueryExistingArtifacts(),
+            ShelterArtifactSaver(self.storage_concurrency),
+            QueryExistingContentUnits(),
+            ContentUnitSaver(),
+        ])
+
+
+class ShelterArchiveFirstStage(Stage):
+    """
+    The first stage of a pulp_shelter import pipeline.
+    """
+
+    def __init__(self, path, workers=WORKERS):
+        """
+        The first stage of a pulp_shelter import pipeline.
+
+        Args:
+            path (str): The directory the archive was extracted into.
+            workers (int): The number of threads hashing pictures in parallel.
+
+        """
+        self.path = path
+        self.workers = workers
+
+    async def __call__(self, in_q, out_q):
+        """
+        Build and emit `DeclarativeContent` from the Manifest data and the extracted pictures.
+
+        Pictures are hashed in batches by a pool of threads while the event loop keeps feeding
+        the following stages.
+
+        Args:
+            in_q (asyncio.Queue): Unused because the first stage doesn't read from an input queue.
+            out_q (asyncio.Queue): The out_q to send `DeclarativeContent` objects to
+
+        Raises:
+            ValueError: If the archive holds no manifest, or a picture does not match the
+                digest recorded in the manifest.
+
+        """
+        manifest_path = os.path.join(self.path, MANIFEST_NAME)
+        if not os.path.isfile(manifest_path):
+            raise ValueError(_('The archive does not contain {name}').format(name=MANIFEST_NAME))
+
+        loop = asyncio.get_event_loop()
+        with ProgressBar(message=_('Parsing Manifest')) as pb:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                with open(manifest_path) as manifest:
+                    for batch in batched(read_manifest(manifest), BATCH_SIZE):
+                        paths = [self.picture_path(entry) for entry in batch]
+                        digests = await asyncio.gather(*(
+                            loop.run_in_executor(executor, file_digests, path) for path in paths
+                        ))
+                        for entry, path, attributes in zip(batch, paths, digests):
+                            await out_q.put(self.declarative_content(entry, path, attributes))
+                        ANIMALS.labels(task='import').inc(len(batch))
+                        pb.done += len(batch)
+                        pb.save()
+        await out_q.put(None)
+
+    def picture_path(self, entry):
+        """
+        Return the absolute path of the picture of a manifest entry.
+
+        Args:
+            entry (dict): A manifest entry.
+
+        Returns:
+            str: The path of the extracted picture.
+
+        Raises:
+            ValueError: If the picture path is not relative to the archive root.
+
+        """
+        if not is_relative(entry['picture']):
+            raise ValueError(_('Picture {picture} is not a relative path').format(
+                picture=entry['picture']
+            ))
+        return os.path.join(self.path, os.path.normpath(entry['picture']))
+
+    def declarative_content(self, entry, path, attributes):
+        """
+        Make the in-memory Animal and picture Artifact out of a manifest entry.
+
+        Args:
+            entry (dict): A manifest entry.
+            path (str): The path of the extracted picture.
+            attributes (dict): The size and digests of the picture.
+
+        Returns:
+            pulpcore.plugin.stages.DeclarativeContent: The content to be saved.
+
+        Raises:
+            ValueError: If the picture does not match the digest recorded in the manifest.
+
+        """
+        for field in ('size', 'sha256'):
+            if field in entry and entry[field] != attributes[field]:
+                raise ValueError(_('Picture {picture} does not match its {field}').format(
+                    picture=entry['picture'],
+                    field=field
+                ))
+        artifact = Artifact(file=path, **attributes)
+        da = DeclarativeArtifact(artifact, 'file://' + path, entry['picture'], None)
+        return DeclarativeContent(content=animal_from_entry(entry), d_artifacts=[da])
@@ -0,0 +1,87 @@
+import logging
+from gettext import gettext as _
+
+from pulpcore.plugin.models import Content, ProgressBar, Repository, RepositoryVersion
+
+from pulp_shelter.app.lookup import NATURAL_KEY
+from pulp_shelter.app.metrics import task_metrics
+from pulp_shelter.app.models import Animal
+from pulp_shelter.app.queries import query_phase
+from pulp_shelter.app.utils import batched
+from pulp_shelter.app.viewsets import filter_animals
+
+
+log = logging.getLogger(__name__)
+
+BATCH_SIZE = 2000
+
+
+def modify(repository_pk, add_filters=None, add_natural_keys=(), remove_filters=None,
+           remove_natural_keys=()):
+    """
+    Add and remove animals of a repository, creating a single new version.
+
+    Animals are selected by the parameters of the animal list filters, or by natural key.
+    Selected animals are resolved and added in batches, and removed with a single statement.
+    Animals selected both to be added and removed end up removed.
+
+    Args:
+        repository_pk (str): The repository PK.
+        add_filters (dict): Add the animals matching these filters.
+        add_natural_keys (list): Add the animals with these natural keys.
+        remove_filters (dict): Remove the animals matching these filters.
+        remove_natural_keys (list): Remove the animals with these natural keys.
+
+    Raises:
+        ValueError: If the filters are not valid.
+
+    """
+    repository = Repository.objects.get(pk=repository_pk)
+
+    log.info(_('Modifying: repository={repo}').format(repo=repository.name))
+    with task_metrics('modify'), query_phase(_('Database Queries: Modify')):
+        with RepositoryVersion.create(repository) as new_version:
+            to_add = select(add_filters, add_natural_keys, _('Animals To Add Not Found'))
+            for batch in batched(to_add, BATCH_SIZE):
+                new_version.add_content(Content.objects.filter(pk__in=batch))
+
+            if remove_filters:
+                new_version.remove_content(filter_animals(remove_filters).values('pk'))
+            to_remove = select(None, remove_natural_keys, _('Animals To Remove Not Found'))
+            for batch in batched(to_remove, BATCH_SIZE):
+                new_version.remove_content(Content.objects.filter(pk__in=batch))
+
+
+def select(filters, natural_keys, message):
+    """
+    Yield the primary keys of the animals matching filters or natural keys.
+
+    Natural keys which match no animal are counted in a progress report.
+
+    Args:
+        filters (dict): The filter parameters, None to match no animal by filter.
+        natural_keys (iterable): The natural keys, as lists of values.
+        message (str): The message of the progress report of missing natural keys.
+
+    Yields:
+        The primary key of every matching animal, once per filter or natural key it matches.
+
+    """
+    if filters:
+        yield from filter_animals(filters).values_list('pk', flat=True).iterator()
+    if not natural_keys:
+        return
+    with ProgressBar(message=message) as missing:
+        for batch in batched(natural_keys, BATCH_SIZE):
+            keys = {tuple(key) for key in batch}
+            animals = Animal.objects.filter(
+                name__in={key[NATURAL_KEY.index('name')] for key in keys},
+                shelter__in={key[NATURAL_KEY.index('shelter')] for key in keys}
+            ).values_list('pk', *NATURAL_KEY)
+            found = set()
+            for pk, *values in animals.iterator():
+                if tuple(values) in keys:
+                    found.add(tuple(values))
+                    yield pk
+            missing.done += len(keys) - len(found)
+            missing.save()
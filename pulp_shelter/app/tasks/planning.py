@@ -0,0 +1,244 @@
+import asyncio
+import logging
+import math
+from gettext import gettext as _
+from urllib.parse import urljoin
+
+from pulpcore.plugin.models import Artifact, ProgressBar, Remote, Repository
+
+from pulp_shelter.app.lookup import NATURAL_KEY, key_digest
+from pulp_shelter.app.manifest import RECORD_SCHEMA, InvalidLine, read_records
+from pulp_shelter.app.models import Animal, ShelterRemote
+from pulp_shelter.app.stages import RecordValidator
+from pulp_shelter.app.utils import batched
+from pulp_shelter.app.validation import validate_record
+
+
+log = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+
+MEGABYTE = 1024 * 1024
+
+
+def plan_sync(remote_pk, repository_pk, mirror):
+    """
+    Estimate what a sync of a remote into a repository would do, without doing it.
+
+    The manifest is downloaded and compared with the latest version of the repository, and
+    the outcome is reported as progress reports of the task. Nothing is saved but them.
+
+    Args:
+        remote_pk (str): The remote PK.
+        repository_pk (str): The repository PK.
+        mirror (bool): True for mirror mode, False for additive.
+
+    Raises:
+        ValueError: If the remote does not specify a URL to sync
+
+    """
+    remote = ShelterRemote.objects.get(pk=remote_pk)
+    repository = Repository.objects.get(pk=repository_pk)
+
+    if not remote.url:
+        raise ValueError(_('A remote must have a url specified to synchronize.'))
+
+    log.info(_('Planning sync: repository={repo}, remote={remote}').format(
+        repo=repository.name,
+        remote=remote.name
+    ))
+    loop = asyncio.get_event_loop()
+    plan = loop.run_until_complete(SyncPlanner(remote, repository, mirror).plan())
+    for message, value, suffix in (
+        (_('Animals In Manifest'), plan['animals'], ''),
+        (_('Animals To Quarantine'), plan['quarantined'], ''),
+        (_('Animals New To Repository'), plan['new'], ''),
+        (_('Animals Removed From Repository'), plan['removed'], ''),
+        (_('Pictures To Download'), plan['downloads'], ''),
+        (_('Pictures Of Unknown Size'), plan['unknown_sizes'], ''),
+        # Progress reports count in 32 bit integers, too small for bytes.
+        (_('Megabytes To Download'), math.ceil(plan['bytes'] / MEGABYTE),
+         _('{bytes} bytes').format(bytes=plan['bytes'])),
+    ):
+        with ProgressBar(message=message, total=value, done=value, suffix=suffix):
+            pass
+    log.info(_('Sync plan: {plan}').format(plan=plan))
+
+
+class SyncPlanner:
+    """
+    Compare the manifest of a remote with the latest version of a repository.
+    """
+
+    def __init__(self, remote, repository, mirror):
+        """
+        Compare the manifest of a remote with the latest version of a repository.
+
+        Args:
+            remote (pulp_shelter.app.models.ShelterRemote): The remote to sync from.
+            repository (pulpcore.plugin.models.Repository): The repository to sync into.
+            mirror (bool): True for mirror mode, False for additive.
+
+        """
+        self.remote = remote
+        self.repository = repository
+        self.mirror = mirror
+        self.version = repository.latest_version()
+        # The natural key and picture digests of the records passed on so far, see
+        # key_digest().
+        self.keys = set()
+        self.pictures = set()
+
+    async def plan(self):
+        """
+        Download and parse the manifest, and count what the sync would change.
+
+        Returns:
+            dict: The number of ``animals`` of the manifest the sync would pass on, of the
+                entries it would quarantine (``quarantined``), of animals ``new`` to the
+                repository and ``removed`` from it, of pictures to download (``downloads``), of
+                those whose size is not known (``unknown_sizes``), and of the ``bytes`` of those
+                whose size is known.
+
+        """
+        plan = dict.fromkeys(('animals', 'quarantined', 'new', 'removed', 'downloads',
+                              'unknown_sizes', 'bytes'), 0)
+        kept = 0
+        downloader = self.remote.get_downloader(url=self.remote.url)
+        result = await downloader.run()
+        with open(result.path) as manifest:
+            for batch in batched(read_records(manifest), BATCH_SIZE):
+                valid = self.valid_records(batch)
+                plan['quarantined'] += len(batch) - len(valid)
+                batch = valid
+                plan['animals'] += len(batch)
+                in_version, existing = self.existing_keys(batch)
+                kept += len(in_version)
+                new = [record for record in batch if self.key(record) not in in_version]
+                plan['new'] += len(new)
+                if self.remote.policy == Remote.IMMEDIATE:
+                    downloads = await self.downloads(
+                        [record for record in new if self.key(record) not in existing]
+                    )
+                    plan['downloads'] += len(downloads)
+                    for size in downloads:
+                        if size is None:
+                            plan['unknown_sizes'] += 1
+                        else:
+                            plan['bytes'] += size
+        if self.mirror and self.version is not None:
+            count = Animal.objects.filter(pk__in=self.version.content).count()
+            plan['removed'] = count - kept
+        return plan
+
+    def valid_records(self, batch):
+        """
+        Find the records of a batch which the sync would pass on.
+
+        As :class:`~pulp_shelter.app.stages.RecordValidator` does, the lines which are not
+        entries, the invalid records, those with the picture of a saved animal of another
+        natural key and those repeating the natural key or picture of an earlier record of the
+        manifest are left out, being quarantined by the sync.
+
+        Args:
+            batch (list): Records of the manifest, and its lines which are not entries.
+
+        Returns:
+            list: The records passed on.
+
+        """
+        records = [record for record in batch if not isinstance(record, InvalidLine)]
+        records = [
+            record for record in records if not validate_record(tuple(record), RECORD_SCHEMA)
+        ]
+        saved = RecordValidator.saved_pictures(records)
+        valid = []
+        for record in records:
+            if RecordValidator.saved_picture_errors(record, saved):
+                continue
+            key = key_digest(self.key(record))
+            picture = key_digest((record.picture,))
+            if key in self.keys or picture in self.pictures:
+                continue
+            self.keys.add(key)
+            self.pictures.add(picture)
+            valid.append(record)
+        return valid
+
+    @staticmethod
+    def key(record):
+        """
+        Return the natural key of a record.
+
+        Args:
+            record (pulp_shelter.app.manifest.AnimalRecord): A record of the manifest.
+
+        Returns:
+            tuple: The values of the natural key fields.
+
+        """
+        return tuple(getattr(record, field) for field in NATURAL_KEY)
+
+    def existing_keys(self, batch):
+        """
+        Find which animals of a batch are saved, and which are in the repository.
+
+        Args:
+            batch (list): Records of the manifest.
+
+        Returns:
+            tuple: The set of natural keys in the latest version of the repository, and the set
+                of natural keys saved in Pulp.
+
+        """
+        keys = {self.key(record) for record in batch}
+        animals = Animal.objects.filter(
+            name__in={record.name for record in batch},
+            shelter__in={record.shelter for record in batch}
+        )
+        existing = set(animals.values_list(*NATURAL_KEY)) & keys
+        in_version = set()
+        if self.version is not None and existing:
+            in_version = set(
+                animals.filter(pk__in=self.version.content).values_list(*NATURAL_KEY)
+            ) & keys
+        return in_version, existing
+
+    async def downloads(self, records):
+        """
+        Find the pictures of new animals which are not saved yet, and their size.
+
+        Sizes missing from the manifest are asked from the upstream with a ``HEAD`` request.
+
+        Args:
+            records (list): Records of animals not saved in Pulp.
+
+        Returns:
+            list: The size of every picture to download, None if it is not known.
+
+        """
+        digests = {record.sha256 for record in records if record.sha256}
+        saved = set(
+            Artifact.objects.filter(sha256__in=digests).values_list('sha256', flat=True)
+        ) if digests else set()
+        records = [record for record in records if record.sha256 not in saved]
+        return await asyncio.gather(*(self.size(record) for record in records))
+
+    async def size(self, record):
+        """
+        Return the size of the picture of a record.
+
+        Args:
+            record (pulp_shelter.app.manifest.AnimalRecord): A record of the manifest.
+
+        Returns:
+            int: The size from the manifest or the upstream, None if neither tells.
+
+        """
+        if record.size is not None:
+            return record.size
+        url = urljoin(self.remote.url, record.picture)
+        downloader = self.remote.get_downloader(url=url)
+        if not hasattr(downloader, 'content_length'):
+            return None
+        return await downloader.content_length()
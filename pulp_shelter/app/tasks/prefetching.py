@@ -0,0 +1,176 @@
+from gettext import gettext as _
+import asyncio
+import logging
+
+from django.db import transaction
+
+from pulpcore.plugin.models import (
+    Artifact,
+    ContentArtifact,
+    ProgressBar,
+    RemoteArtifact,
+    Repository
+)
+from pulpcore.plugin.stages import (
+    ArtifactDownloader,
+    DeclarativeArtifact,
+    DeclarativeContent,
+    EndStage,
+    QueryExistingArtifacts,
+    Stage,
+    create_pipeline
+)
+
+from pulp_shelter.app.metrics import task_metrics
+from pulp_shelter.app.models import ShelterRemote
+from pulp_shelter.app.queries import query_phase
+from pulp_shelter.app.stages import ShelterArtifactSaver, TimedStage
+from pulp_shelter.app.utils import batched
+
+
+log = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+
+# The order pictures are prefetched in: adoptable animals first, then the newest.
+PRIORITY = ('content__animal__reserved', '-content___created', 'pk')
+
+
+def prefetch(remote_pk, repository_pk, count):
+    """
+    Download the pictures of the animals of a repository most likely to be viewed.
+
+    The latest version of the repository is looked for animals whose picture was not
+    downloaded yet, and the pictures of the first ``count`` of them in :data:`PRIORITY` order
+    are downloaded from the remote and saved, as a sync with the ``immediate`` policy would.
+    No repository version is created.
+
+    Args:
+        remote_pk (str): The remote PK.
+        repository_pk (str): The repository PK.
+        count (int): The number of pictures to download at most.
+
+    """
+    remote = ShelterRemote.objects.get(pk=remote_pk)
+    repository = Repository.objects.get(pk=repository_pk)
+    repository_version = repository.latest_version()
+    if repository_version is None:
+        return
+
+    log.info(_('Prefetching: repository={repo}, remote={remote}').format(
+        repo=repository.name,
+        remote=remote.name
+    ))
+    stages = [
+        PrefetchFirstStage(remote, repository_version, count),
+        QueryExistingArtifacts(),
+        ArtifactDownloader(),
+        ShelterArtifactSaver(remote.storage_concurrency),
+        ContentArtifactLinker()
+    ]
+    stages = [TimedStage(stage, 'prefetch') for stage in stages]
+    stages.append(EndStage())
+    with task_metrics('prefetch'), query_phase(_('Database Queries: Prefetch')):
+        asyncio.get_event_loop().run_until_complete(create_pipeline(stages))
+
+
+class PrefetchFirstStage(Stage):
+    """
+    Emit the pictures not downloaded yet of the animals of a repository version, by priority.
+
+    The downloads are bounded by the ``download_concurrency`` of the remote, and the queues of
+    the pipeline hold the next pictures back until there is room for them.
+    """
+
+    def __init__(self, remote, repository_version, count):
+        """
+        Emit the pictures not downloaded yet of the animals of a repository version.
+
+        Args:
+            remote (pulp_shelter.app.models.ShelterRemote): The remote to download from.
+            repository_version (pulpcore.plugin.models.RepositoryVersion): The version.
+            count (int): The number of pictures to emit at most.
+
+        """
+        self.remote = remote
+        self.repository_version = repository_version
+        self.count = count
+
+    async def __call__(self, in_q, out_q):
+        """
+        Emit `DeclarativeContent` whose only `DeclarativeArtifact` is a picture to download.
+
+        Args:
+            in_q (asyncio.Queue): Unused because the first stage doesn't read from an input queue.
+            out_q (asyncio.Queue): The out_q to send `DeclarativeContent` objects to.
+
+        """
+        content_artifacts = ContentArtifact.objects.filter(
+            content__in=self.repository_version.content,
+            artifact__isnull=True,
+            remoteartifact__remote=self.remote
+        ).order_by(*PRIORITY).values_list('pk', flat=True)[:self.count]
+        for batch in batched(content_artifacts.iterator(), BATCH_SIZE):
+            remote_artifacts = RemoteArtifact.objects.filter(
+                content_artifact__in=batch,
+                remote=self.remote
+            ).select_related('content_artifact__content')
+            by_content_artifact = {
+                remote_artifact.content_artifact_id: remote_artifact
+                for remote_artifact in remote_artifacts
+            }
+            for pk in batch:
+                await out_q.put(self.declarative_content(by_content_artifact[pk]))
+        await out_q.put(None)
+
+    def declarative_content(self, remote_artifact):
+        """
+        Make the `DeclarativeContent` downloading a picture.
+
+        Args:
+            remote_artifact (pulpcore.plugin.models.RemoteArtifact): Where to find the picture.
+
+        Returns:
+            pulpcore.plugin.stages.DeclarativeContent: The saved animal and its picture.
+
+        """
+        content_artifact = remote_artifact.content_artifact
+        artifact = Artifact(size=remote_artifact.size, sha256=remote_artifact.sha256)
+        da = DeclarativeArtifact(
+            artifact,
+            remote_artifact.url,
+            content_artifact.relative_path,
+            self.remote
+        )
+        return DeclarativeContent(content=content_artifact.content, d_artifacts=[da])
+
+
+class ContentArtifactLinker(Stage):
+    """
+    Point the content of prefetched pictures at their saved Artifacts.
+    """
+
+    async def __call__(self, in_q, out_q):
+        """
+        Set the Artifact of the `ContentArtifact` of every prefetched picture.
+
+        Args:
+            in_q (asyncio.Queue): The queue to receive `DeclarativeContent` objects from.
+            out_q (asyncio.Queue): The queue to send `DeclarativeContent` objects to.
+
+        """
+        with ProgressBar(message=_('Prefetched Pictures')) as pb:
+            async for batch in self.batches(in_q):
+                with transaction.atomic():
+                    for declarative_content in batch:
+                        for declarative_artifact in declarative_content.d_artifacts:
+                            ContentArtifact.objects.filter(
+                                content=declarative_content.content,
+                                relative_path=declarative_artifact.relative_path,
+                                artifact__isnull=True
+                            ).update(artifact=declarative_artifact.artifact)
+                for declarative_content in batch:
+                    await out_q.put(declarative_content)
+                pb.done += len(batch)
+                pb.save()
+        await out_q.put(None)
@@ -1,20 +1,36 @@
+import hashlib
+import json
 import logging
+import time
 from gettext import gettext as _
+from itertools import groupby
+
+from django.core.files import File
+from django.db.models import F
+from django.utils.text import slugify
 
 from pulpcore.plugin.models import (
+    ContentArtifact,
     RepositoryVersion,
     Publication,
     PublishedArtifact,
-    PublishedMetadata,
-    RemoteArtifact
+    PublishedMetadata
 )
 from pulpcore.plugin.tasking import WorkingDirectory
 
-from pulp_shelter.app.models import ShelterPublisher
+from pulp_shelter.app.catalog import INDEX_NAME, CatalogWriter
+from pulp_shelter.app.diff import changed_shelters
+from pulp_shelter.app.manifest import MANIFEST_FIELDS
+from pulp_shelter.app.metrics import ANIMALS, PUBLISH_SHARD_DURATION, task_metrics
+from pulp_shelter.app.models import Animal, ShelterPublisher
+from pulp_shelter.app.queries import query_phase
+from pulp_shelter.app.utils import batched
 
 
 log = logging.getLogger(__name__)
 
+CHUNK_SIZE = 2000
+
 
 def publish(publisher_pk, repository_version_pk):
     """
@@ -32,25 +48,241 @@ def publish(publisher_pk, repository_version_pk):
         ver=repository_version.number,
         pub=publisher.name
     ))
-    with WorkingDirectory():
+    with task_metrics('publish'), WorkingDirectory():
         with Publication.create(repository_version, publisher) as publication:
-            # Write any Artifacts (files) to the file system, and the database.
-            #
-            # artifact = YourArtifactWriter.write(relative_path)
-            # published_artifact = PublishedArtifact(
-            #     relative_path=artifact.relative_path,
-            #     publication=publication,
-            #     content_artifact=artifact)
-            # published_artifact.save()
-
-            # Write any metadata files to the file system, and the database.
-            #
-            # metadata = YourMetadataWriter.write(relative_path)
-            # metadata = PublishedMetadata(
-            #     relative_path=os.path.basename(manifest.relative_path),
-            #     publication=publication,
-            #     file=File(open(manifest.relative_path, 'rb')))
-            # metadata.save()
-            pass
+            if publisher.partitioned:
+                with query_phase(_('Database Queries: Publish Partitions')):
+                    publish_partitions(publication, publisher, repository_version)
+            else:
+                with query_phase(_('Database Queries: Publish Pictures')):
+                    publish_pictures(publication, repository_version)
+                with query_phase(_('Database Queries: Publish Catalog')):
+                    with CatalogWriter() as catalog:
+                        for shelter, entries in catalog_entries(repository_version):
+                            catalog.write_shelter(shelter, entries)
+                    publish_metadata(publication, catalog.paths)
+                ANIMALS.labels(task='publish').inc(
+                    sum(shelter['count'] for shelter in catalog.shelters.values())
+                )
 
     log.info(_('Publication: {publication} created').format(publication=publication.pk))
+
+
+def publish_partitions(publication, publisher, repository_version):
+    """
+    Publish every shelter under its own path, with its own catalog and pictures.
+
+    The catalog of a shelter whose animals did not change since the previous publication of
+    the publisher is not written again; the new publication shares the files of the previous
+    one, so caches in front of the content app stay warm.
+
+    Args:
+        publication (pulpcore.plugin.models.Publication): The publication being created.
+        publisher (pulp_shelter.app.models.ShelterPublisher): The publisher in use.
+        repository_version (pulpcore.plugin.models.RepositoryVersion): The published version.
+
+    """
+    previous = Publication.objects.filter(
+        publisher=publisher,
+        repository_version__repository=repository_version.repository,
+        complete=True
+    ).exclude(pk=publication.pk).order_by('-_created').first()
+    changed = None
+    previous_paths = {}
+    if previous is not None:
+        changed = changed_shelters(previous.repository_version, repository_version)
+        previous_paths = published_paths(previous)
+
+    partitions = {}
+    paths = set()
+    for shelter, entries in catalog_entries(repository_version):
+        path = partition_path(shelter, paths)
+        paths.add(path)
+
+        started = time.monotonic()
+        # A shelter may take over the path of a removed one sharing its slug.
+        reused = changed is not None and shelter not in changed and \
+            previous_paths.get(shelter) == path + '/' and \
+            reuse_metadata(previous, publication, path)
+        if reused:
+            count = sum(1 for entry in entries)
+        else:
+            with CatalogWriter(directory=path) as catalog:
+                catalog.write_shelter(shelter, entries)
+            publish_metadata(publication, catalog.paths)
+            count = catalog.shelters[shelter]['count']
+        PUBLISH_SHARD_DURATION.labels(reused='true' if reused else 'false').observe(
+            time.monotonic() - started
+        )
+        ANIMALS.labels(task='publish').inc(count)
+        partitions[shelter] = {'path': path + '/', 'count': count}
+
+    publish_pictures(publication, repository_version, partitions)
+    with open(INDEX_NAME, 'w') as fp:
+        json.dump({'shelters': partitions}, fp, indent=2, sort_keys=True)
+    publish_metadata(publication, [INDEX_NAME])
+
+
+def partition_path(shelter, taken=()):
+    """
+    Return the path a shelter is published under in a partitioned publication.
+
+    Names that differ only in case or punctuation have the same slug. The shelters are
+    published in the order of their names, and those whose slug is taken already by a previous
+    one get a short digest of their name appended, so every shelter keeps its path from one
+    publication to the next as long as the shelters sharing its slug do not change.
+
+    Args:
+        shelter (str): The name of the shelter.
+        taken (set): The paths of the shelters published already.
+
+    Returns:
+        str: A slug of the name, unique among the ``taken`` paths.
+
+    """
+    path = slugify(shelter, allow_unicode=True) or '_'
+    if path in taken:
+        digest = hashlib.sha256(shelter.encode()).hexdigest()[:8]
+        path = '{path}-{digest}'.format(path=path, digest=digest)
+    return path
+
+
+def published_paths(publication):
+    """
+    Read the paths the shelters of a partitioned publication are published under.
+
+    Args:
+        publication (pulpcore.plugin.models.Publication): The publication.
+
+    Returns:
+        dict: The path of every shelter, None for those of a publication not partitioned.
+
+    """
+    index = PublishedMetadata.objects.filter(
+        publication=publication,
+        relative_path=INDEX_NAME
+    ).first()
+    if index is None:
+        return {}
+    with index.file.open('rb') as fp:
+        partitions = json.loads(fp.read().decode())['shelters']
+    return {shelter: partition.get('path') for shelter, partition in partitions.items()}
+
+
+def reuse_metadata(previous, publication, path):
+    """
+    Publish the metadata files of a partition of the previous publication again.
+
+    Args:
+        previous (pulpcore.plugin.models.Publication): The previous publication.
+        publication (pulpcore.plugin.models.Publication): The publication being created.
+        path (str): The path of the partition.
+
+    Returns:
+        bool: False if the previous publication has no such partition.
+
+    """
+    metadata = list(PublishedMetadata.objects.filter(
+        publication=previous,
+        relative_path__startswith=path + '/'
+    ))
+    PublishedMetadata.objects.bulk_create(
+        PublishedMetadata(
+            relative_path=published.relative_path,
+            publication=publication,
+            file=published.file.name
+        )
+        for published in metadata
+    )
+    return bool(metadata)
+
+
+def publish_metadata(publication, paths):
+    """
+    Publish files of the working directory at their relative path.
+
+    Args:
+        publication (pulpcore.plugin.models.Publication): The publication being created.
+        paths (list): The paths of the files.
+
+    """
+    for path in paths:
+        metadata = PublishedMetadata(
+            relative_path=path,
+            publication=publication,
+            file=File(open(path, 'rb')))
+        metadata.save()
+
+
+def publish_file(repository_version, path, publisher_name):
+    """
+    Publish a file of the working directory on its own, for a distribution to serve it.
+
+    The publication belongs to a publisher set aside for such files, created on first use, so
+    that distributions of the other publishers never serve it.
+
+    Args:
+        repository_version (pulpcore.plugin.models.RepositoryVersion): The version the file
+            was made from.
+        path (str): The path of the file, published at the same relative path.
+        publisher_name (str): The name of the publisher set aside for the file.
+
+    Returns:
+        pulpcore.plugin.models.Publication: The publication, a resource created by the task.
+
+    """
+    publisher, created = ShelterPublisher.objects.get_or_create(name=publisher_name)
+    with Publication.create(repository_version, publisher) as publication:
+        publish_metadata(publication, [path])
+    return publication
+
+
+def publish_pictures(publication, repository_version, partitions=None):
+    """
+    Publish the picture of every animal in a repository version at its relative path.
+
+    Args:
+        publication (pulpcore.plugin.models.Publication): The publication being created.
+        repository_version (pulpcore.plugin.models.RepositoryVersion): The published version.
+        partitions (dict): If given, the picture of an animal is published under the ``path``
+            of the partition of its shelter.
+
+    """
+    content_artifacts = ContentArtifact.objects.filter(
+        content__in=repository_version.content
+    ).order_by('pk').values('pk', 'relative_path', shelter=F('content__animal__shelter'))
+    for batch in batched(content_artifacts.iterator(chunk_size=CHUNK_SIZE), CHUNK_SIZE):
+        PublishedArtifact.objects.bulk_create(
+            PublishedArtifact(
+                relative_path=(
+                    partitions[row['shelter']]['path'] if partitions else ''
+                ) + row['relative_path'],
+                publication=publication,
+                content_artifact_id=row['pk']
+            )
+            for row in batch
+        )
+
+
+def catalog_entries(repository_version):
+    """
+    Read the animals of a repository version as manifest entries, grouped by shelter.
+
+    Args:
+        repository_version (pulpcore.plugin.models.RepositoryVersion): The published version.
+
+    Yields:
+        tuple: The name of a shelter and an iterator of the entries of its animals.
+
+    """
+    rows = Animal.objects.filter(
+        pk__in=repository_version.content
+    ).order_by(
+        'shelter', 'species', 'breed', 'name'
+    ).values(
+        *MANIFEST_FIELDS,
+        size=F('contentartifact__artifact__size'),
+        sha256=F('contentartifact__artifact__sha256')
+    ).iterator(chunk_size=CHUNK_SIZE)
+    entries = ({k: v for k, v in row.items() if v is not None} for row in rows)
+    yield from groupby(entries, key=lambda entry: entry['shelter'])
@@ -0,0 +1,205 @@
+import logging
+import math
+from datetime import timedelta
+from gettext import gettext as _
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from pulpcore.plugin.models import (
+    Artifact,
+    ContentArtifact,
+    ProgressBar,
+    Publication,
+    Repository,
+    RepositoryContent,
+    RepositoryVersion
+)
+
+from pulp_shelter.app.metrics import task_metrics
+from pulp_shelter.app.models import Animal, ShelterRetentionPolicy
+from pulp_shelter.app.queries import query_phase
+from pulp_shelter.app.tasks.planning import MEGABYTE
+from pulp_shelter.app.utils import batched
+
+
+log = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+
+
+def clean_up(repository_pk):
+    """
+    Squash the versions a retention policy does not keep, and delete what only they held.
+
+    The changes of the squashed versions are merged into the next kept version, so that every
+    kept version holds the same animals as before. Only the animals which the squashed versions
+    alone referenced are deleted, a batch at a time, along with the pictures no other animal
+    has. What was deleted is reported as progress reports of the task.
+
+    The task only reserves the repository. An animal which a task of another repository is
+    adding to a version while it is deleted is skipped, see :func:`delete_orphans`.
+
+    Args:
+        repository_pk (str): The repository PK.
+
+    Raises:
+        ValueError: If the repository has no retention policy.
+
+    """
+    repository = Repository.objects.get(pk=repository_pk)
+    try:
+        policy = ShelterRetentionPolicy.objects.get(repository=repository)
+    except ShelterRetentionPolicy.DoesNotExist:
+        raise ValueError(_('The repository has no retention policy.'))
+
+    log.info(_('Cleaning up: repository={repo}').format(repo=repository.name))
+    with task_metrics('clean_up'), query_phase(_('Database Queries: Clean Up')):
+        with ProgressBar(message=_('Squashed Repository Versions')) as bar:
+            candidates = set()
+            for gap, successor in squashed_versions(repository, policy):
+                candidates.update(squash(repository, gap, successor))
+                bar.done += len(gap)
+                bar.save()
+
+        animals, pictures, size = delete_orphans(candidates)
+    for message, value, suffix in (
+        (_('Deleted Animals'), animals, ''),
+        (_('Deleted Pictures'), pictures, ''),
+        # Progress reports count in 32 bit integers, too small for bytes.
+        (_('Megabytes Reclaimed'), math.ceil(size / MEGABYTE),
+         _('{bytes} bytes').format(bytes=size)),
+    ):
+        with ProgressBar(message=message, total=value, done=value, suffix=suffix):
+            pass
+
+
+def squashed_versions(repository, policy):
+    """
+    Find the versions of a repository its retention policy does not keep.
+
+    Args:
+        repository (pulpcore.plugin.models.Repository): The repository.
+        policy (pulp_shelter.app.models.ShelterRetentionPolicy): Its retention policy.
+
+    Returns:
+        list: Tuples of a list of the PKs of consecutive versions not kept, and the PK of the
+            kept version following them.
+
+    """
+    versions = list(RepositoryVersion.objects.filter(
+        repository=repository,
+        complete=True
+    ).order_by('number').values_list('pk', 'number', '_created'))
+    published = set(Publication.objects.filter(
+        repository_version__repository=repository
+    ).values_list('repository_version_id', flat=True))
+    newest = None
+    if policy.keep_days is not None:
+        newest = timezone.now() - timedelta(days=policy.keep_days)
+    return version_gaps(versions, published, policy.keep_versions, newest)
+
+
+def version_gaps(versions, published, keep_versions, newest):
+    """
+    Group the versions not kept by the kept version following them.
+
+    Version 0, published versions and the latest version are always kept.
+
+    Args:
+        versions (list): Tuples of the PK, number and creation time of every version, in order.
+        published (set): The PKs of the published versions.
+        keep_versions (int): The number of most recent versions to keep, None for no limit.
+        newest (datetime.datetime): Keep the versions created since, None for no limit.
+
+    Returns:
+        list: Tuples of a list of the PKs of consecutive versions not kept, and the PK of the
+            kept version following them.
+
+    """
+    gaps = []
+    gap = []
+    for index, (pk, number, created) in enumerate(versions):
+        latest = index == len(versions) - 1
+        recent = keep_versions is not None and index >= len(versions) - keep_versions
+        new = newest is not None and created >= newest
+        if not (number == 0 or pk in published or latest or recent or new):
+            gap.append(pk)
+        elif gap:
+            gaps.append((gap, pk))
+            gap = []
+    return gaps
+
+
+@transaction.atomic
+def squash(repository, gap, successor):
+    """
+    Merge the changes of consecutive versions into the version following them, and delete them.
+
+    Args:
+        repository (pulpcore.plugin.models.Repository): The repository.
+        gap (list): The PKs of the consecutive versions.
+        successor: The PK of the version following them.
+
+    Returns:
+        list: The PKs of the content added and removed again within the versions, which no
+            version of the repository references any more.
+
+    """
+    relations = RepositoryContent.objects.filter(repository=repository)
+    transient = relations.filter(version_added__in=gap).filter(
+        Q(version_removed__in=gap) | Q(version_removed=successor)
+    )
+    dropped = list(transient.values_list('content_id', flat=True))
+    transient.delete()
+    relations.filter(version_removed__in=gap).update(version_removed=successor)
+    relations.filter(version_added__in=gap).update(version_added=successor)
+    RepositoryVersion.objects.filter(pk__in=gap).delete()
+    return dropped
+
+
+def delete_orphans(candidates):
+    """
+    Delete the animals no repository version references, and the pictures only they had.
+
+    Tasks of other repositories may add any animal to a new version meanwhile. Adding an animal
+    to a version locks it until the other task commits, and the locked animals are skipped
+    rather than waited for, so they stay for the other task to reference. A task which looked
+    an animal up but did not add it yet fails on adding it once it is deleted, and can be run
+    again.
+
+    Args:
+        candidates (iterable): The PKs of the animals which might be orphans.
+
+    Returns:
+        tuple: The number of deleted animals and pictures, and the size of the pictures.
+
+    """
+    animals = pictures = size = 0
+    for batch in batched(candidates, BATCH_SIZE):
+        with transaction.atomic():
+            unlocked = Animal.objects.select_for_update(skip_locked=True).filter(pk__in=batch)
+            orphans = Animal.objects.filter(
+                pk__in=list(unlocked.values_list('pk', flat=True))
+            ).exclude(
+                pk__in=RepositoryContent.objects.filter(content_id__in=batch).values('content_id')
+            )
+            artifact_pks = set(ContentArtifact.objects.filter(
+                content__in=orphans,
+                artifact__isnull=False
+            ).values_list('artifact_id', flat=True))
+            animals += orphans.delete()[1].get(Animal._meta.label, 0)
+
+            artifacts = list(Artifact.objects.filter(pk__in=artifact_pks).exclude(
+                pk__in=ContentArtifact.objects.filter(
+                    artifact_id__in=artifact_pks
+                ).values('artifact_id')
+            ))
+            Artifact.objects.filter(pk__in=[artifact.pk for artifact in artifacts]).delete()
+        # Files are only removed once nothing refers to them any more.
+        for artifact in artifacts:
+            size += artifact.size or 0
+            artifact.file.delete(save=False)
+        pictures += len(artifacts)
+    return animals, pictures, size
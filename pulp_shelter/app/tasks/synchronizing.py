@@ -1,15 +1,17 @@
 from gettext import gettext as _
+import asyncio
 import logging
+from urllib.parse import urljoin
 
 from pulpcore.plugin.models import Artifact, ProgressBar, Remote, Repository
-from pulpcore.plugin.stages import (
-    DeclarativeArtifact,
-    DeclarativeContent,
-    DeclarativeVersion,
-    Stage
-)
+from pulpcore.plugin.stages import DeclarativeArtifact, DeclarativeContent, Stage
 
-from pulp_shelter.app.models import Animal, ShelterRemote
+from pulp_shelter.app.lookup import ContentLookup
+from pulp_shelter.app.manifest import AnimalRecord, read_records
+from pulp_shelter.app.metrics import ANIMALS, task_metrics
+from pulp_shelter.app.models import ShelterRemote
+from pulp_shelter.app.queries import query_phase
+from pulp_shelter.app.stages import ShelterDeclarativeVersion
 
 
 log = logging.getLogger(__name__)
@@ -39,10 +41,94 @@ def synchronize(remote_pk, repository_pk, mirror):
     # Interpret policy to download Artifacts or not
     download_artifacts = (remote.policy == Remote.IMMEDIATE)
     first_stage = ShelterFirstStage(remote)
-    DeclarativeVersion(
-        first_stage, repository,
-        mirror=mirror, download_artifacts=download_artifacts
-    ).create()
+    with task_metrics('sync'), query_phase(_('Database Queries: Sync')):
+        ShelterDeclarativeVersion(
+            first_stage, repository, remote.storage_concurrency,
+            mirror=mirror, download_artifacts=download_artifacts, remotes=[remote],
+            lookup=warm_lookup(repository, remote.warm_lookup)
+        ).create()
+
+
+def synchronize_remotes(remote_pks, repository_pk, mirror):
+    """
+    Sync content from several remotes into a single new version of a repository.
+
+    The manifests of the remotes are downloaded concurrently and merged. An animal offered by
+    several remotes is taken from the one listed first.
+
+    Args:
+        remote_pks (list): The remote PKs, from the highest priority to the lowest.
+        repository_pk (str): The repository PK.
+        mirror (bool): True for mirror mode, False for additive.
+
+    Raises:
+        ValueError: If a remote does not specify a URL to sync, or the remotes do not share
+            the same download policy.
+
+    """
+    remotes = [ShelterRemote.objects.get(pk=remote_pk) for remote_pk in remote_pks]
+    repository = Repository.objects.get(pk=repository_pk)
+
+    for remote in remotes:
+        if not remote.url:
+            raise ValueError(_('A remote must have a url specified to synchronize.'))
+    if len({remote.policy for remote in remotes}) > 1:
+        raise ValueError(_('Remotes synced together must share the same download policy.'))
+
+    log.info(_('Synchronizing: repository={repo}, remotes={remotes}').format(
+        repo=repository.name,
+        remotes=', '.join(remote.name for remote in remotes)
+    ))
+    download_artifacts = (remotes[0].policy == Remote.IMMEDIATE)
+    first_stage = ShelterMultiRemoteFirstStage(remotes)
+    with task_metrics('sync'), query_phase(_('Database Queries: Sync')):
+        ShelterDeclarativeVersion(
+            first_stage, repository, max(remote.storage_concurrency for remote in remotes),
+            mirror=mirror, download_artifacts=download_artifacts, remotes=remotes,
+            lookup=warm_lookup(repository, any(remote.warm_lookup for remote in remotes))
+        ).create()
+
+
+def warm_lookup(repository, warm):
+    """
+    Make the lookup cache of existing animals of a sync.
+
+    Args:
+        repository (pulpcore.plugin.models.Repository): The repository being synced.
+        warm (bool): Whether to load the animals of its latest version into a cache.
+
+    Returns:
+        pulp_shelter.app.lookup.ContentLookup: The warmed cache, or None if there is none.
+
+    """
+    latest_version = repository.latest_version()
+    if not warm or latest_version is None:
+        return None
+    lookup = ContentLookup()
+    lookup.warm(latest_version)
+    return lookup
+
+
+def declarative_content(remote, record):
+    """
+    Make the in-memory Animal and picture Artifact out of a record of a remote manifest.
+
+    Args:
+        remote (pulp_shelter.app.models.ShelterRemote): The remote the record comes from.
+        record (pulp_shelter.app.manifest.AnimalRecord): A record of its manifest.
+
+    Returns:
+        pulpcore.plugin.stages.DeclarativeContent: The content to be saved.
+
+    """
+    artifact = Artifact(size=record.size, sha256=record.sha256)
+    da = DeclarativeArtifact(
+        artifact,
+        urljoin(remote.url, record.picture),
+        record.picture,
+        remote
+    )
+    return DeclarativeContent(content=record.animal(), d_artifacts=[da])
 
 
 class ShelterFirstStage(Stage):
@@ -62,29 +148,145 @@ class ShelterFirstStage(Stage):
 
     async def __call__(self, in_q, out_q):
         """
-        Build and emit `DeclarativeContent` from the Manifest data.
+        Emit an :class:`~pulp_shelter.app.manifest.AnimalRecord` for every manifest entry.
+
+        The records are turned into `DeclarativeContent` by :meth:`declarative_content` in the
+        next stage, so that the queue in between holds compact records only. Lines which are
+        not entries are emitted as an :class:`~pulp_shelter.app.manifest.InvalidLine`, to be
+        quarantined.
 
         Args:
             in_q (asyncio.Queue): Unused because the first stage doesn't read from an input queue.
-            out_q (asyncio.Queue): The out_q to send `DeclarativeContent` objects to
+            out_q (asyncio.Queue): The out_q to send `AnimalRecord` objects to
 
         """
-        downloader = self.remote.get_downloader(url=self.remote.url)
-        result = await downloader.run()
-        # Use ProgressBar to report progress
-        for entry in self.read_my_metadata_file_somehow(result.path):
-            unit = ShelterContent(entry)  # make the content unit in memory-only
-            artifact = Artifact(entry)  # make Artifact in memory-only
-            da = DeclarativeArtifact(artifact, entry.url, entry.relative_path, self.remote)
-            dc = DeclarativeContent(content=unit, d_artifacts=[da])
-            await out_q.put(dc)
+        with ProgressBar(message=_('Downloading Manifest')) as pb:
+            downloader = self.remote.get_downloader(url=self.remote.url)
+            result = await downloader.run()
+            pb.increment()
+
+        with ProgressBar(message=_('Parsing Manifest')) as pb:
+            with open(result.path) as manifest:
+                for record in read_records(manifest):
+                    await out_q.put(record)
+                    if isinstance(record, AnimalRecord):
+                        ANIMALS.labels(task='sync').inc()
+                    pb.done += 1
+        await out_q.put(None)
+
+    def declarative_content(self, record):
+        """
+        Make the in-memory Animal and picture Artifact out of a record.
+
+        Args:
+            record (pulp_shelter.app.manifest.AnimalRecord): A record emitted by this stage.
+
+        Returns:
+            pulpcore.plugin.stages.DeclarativeContent: The content to be saved.
+
+        """
+        return declarative_content(self.remote, record)
+
+    def remote_record(self, record):
+        """
+        Tell the remote and the record of an item emitted by this stage.
+
+        Args:
+            record (pulp_shelter.app.manifest.AnimalRecord): A record emitted by this stage.
+
+        Returns:
+            tuple: The remote and the record.
+
+        """
+        return self.remote, record
+
+
+class ShelterMultiRemoteFirstStage(Stage):
+    """
+    The first stage of a sync of several remotes into one repository.
+
+    The manifests of all remotes are downloaded concurrently, then emitted in the order of the
+    remotes. The :class:`~pulp_shelter.app.stages.RecordValidator` stage skips a valid animal
+    whose natural key or picture was passed on before from another remote, so the remote listed
+    first wins every conflict, whatever order the downloads finish in.
+    """
+
+    def __init__(self, remotes):
+        """
+        The first stage of a sync of several remotes into one repository.
+
+        Args:
+            remotes (list): The :class:`~pulp_shelter.app.models.ShelterRemote` to sync, from
+                the highest priority to the lowest.
+
+        """
+        self.remotes = remotes
+
+    async def __call__(self, in_q, out_q):
+        """
+        Emit a remote and an :class:`~pulp_shelter.app.manifest.AnimalRecord` for every animal.
+
+        Args:
+            in_q (asyncio.Queue): Unused because the first stage doesn't read from an input queue.
+            out_q (asyncio.Queue): The out_q to send tuples of a remote and a record to
+
+        """
+        with ProgressBar(message=_('Downloading Manifests'), total=len(self.remotes)) as pb:
+            results = await asyncio.gather(*(
+                self.download_manifest(remote, pb) for remote in self.remotes
+            ))
+
+        with ProgressBar(message=_('Parsing Manifests')) as pb:
+            for remote, result in zip(self.remotes, results):
+                with open(result.path) as manifest:
+                    for record in read_records(manifest):
+                        await out_q.put((remote, record))
+                        if isinstance(record, AnimalRecord):
+                            ANIMALS.labels(task='sync').inc()
+                        pb.done += 1
         await out_q.put(None)
 
-    def read_my_metadata_file_somehow(path):
+    @staticmethod
+    async def download_manifest(remote, progress_bar):
         """
-        Parse the metadata for shelter Content type.
+        Download the manifest of a remote.
 
         Args:
-            path: Path to the metadata file
+            remote (pulp_shelter.app.models.ShelterRemote): The remote.
+            progress_bar (pulpcore.plugin.models.ProgressBar): Incremented once downloaded.
+
+        Returns:
+            pulpcore.plugin.download.DownloadResult: The result of the download.
+
+        """
+        downloader = remote.get_downloader(url=remote.url)
+        result = await downloader.run()
+        progress_bar.increment()
+        return result
+
+    def declarative_content(self, item):
+        """
+        Make the in-memory Animal and picture Artifact out of a remote and a record.
+
+        Args:
+            item (tuple): A remote and a record, as emitted by this stage.
+
+        Returns:
+            pulpcore.plugin.stages.DeclarativeContent: The content to be saved.
+
+        """
+        return declarative_content(*item)
+
+    @staticmethod
+    def remote_record(item):
+        """
+        Tell the remote and the record of an item emitted by this stage.
+
+        Args:
+            item (tuple): A remote and a record, as emitted by this stage.
+
+        Returns:
+            tuple: The remote and the record.
+
         """
-        pass
+        return item
@@ -0,0 +1,274 @@
+"""
+Adaptive throttling of the requests sent to an upstream shelter.
+
+A :class:`Throttle` combines a token bucket, which caps the rate of requests, with an AIMD
+(additive increase, multiplicative decrease) limit on concurrent requests. The limit grows by one
+request per window of successful responses and halves whenever the upstream answers slowly or
+asks us to back off.
+"""
+import asyncio
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+
+THROTTLED_STATUSES = (429, 503)
+
+MAX_BACKOFF = 300
+
+# A response slower than the fastest one observed by this factor counts as congestion.
+LATENCY_TOLERANCE = 4
+
+# Weight of the latest response in the moving average of latencies.
+LATENCY_SMOOTHING = 0.2
+
+
+class TokenBucket:
+    """
+    Allow on average ``rate`` acquisitions per second, with bursts of up to ``capacity``.
+    """
+
+    def __init__(self, rate, capacity=None, clock=time.monotonic):
+        """
+        Allow on average ``rate`` acquisitions per second, with bursts of up to ``capacity``.
+
+        Args:
+            rate (float): Tokens added per second. None leaves the rate unlimited.
+            capacity (float): The most tokens the bucket holds, ``rate`` by default.
+            clock (callable): Returns the current time in seconds.
+
+        """
+        self.rate = rate
+        self.capacity = max(capacity or rate or 1, 1)
+        self.clock = clock
+        self.tokens = self.capacity
+        self.updated = clock()
+        self.paused_until = 0
+
+    def pause(self, seconds):
+        """
+        Hand out no token for the given number of seconds.
+
+        Args:
+            seconds (float): How long to pause for.
+
+        """
+        self.paused_until = max(self.paused_until, self.clock() + seconds)
+
+    def delay(self):
+        """
+        Take a token if one is available.
+
+        Returns:
+            float: Zero if a token was taken, otherwise the seconds to wait before trying again.
+
+        """
+        now = self.clock()
+        if now < self.paused_until:
+            return self.paused_until - now
+        if self.rate is None:
+            return 0
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    async def acquire(self):
+        """
+        Wait until a token is available and take it.
+        """
+        delay = self.delay()
+        while delay:
+            await asyncio.sleep(delay)
+            delay = self.delay()
+
+
+class AdaptiveConcurrency:
+    """
+    An AIMD limit on the number of concurrent requests.
+    """
+
+    def __init__(self, maximum, minimum=1, clock=time.monotonic):
+        """
+        An AIMD limit on the number of concurrent requests.
+
+        The limit starts at ``minimum`` and is probed upwards, like a TCP congestion window.
+
+        Args:
+            maximum (int): The highest the limit may grow.
+            minimum (int): The lowest the limit may shrink.
+            clock (callable): Returns the current time in seconds.
+
+        """
+        self.maximum = max(maximum, minimum)
+        self.minimum = minimum
+        self.clock = clock
+        self.limit = minimum
+        self.in_flight = 0
+        self.successes = 0
+        self.fastest = None
+        self.average = None
+        self.decreased = 0
+        self._condition = None
+
+    @property
+    def condition(self):
+        """
+        The condition requests wait on for the limit to allow them.
+        """
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    async def acquire(self):
+        """
+        Wait until there is room for one more concurrent request.
+        """
+        async with self.condition:
+            await self.condition.wait_for(lambda: self.in_flight < self.limit)
+            self.in_flight += 1
+
+    async def release(self):
+        """
+        Mark a request as finished.
+        """
+        async with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
+
+    def succeeded(self, latency):
+        """
+        Record a successful response, growing the limit unless it was slow.
+
+        Args:
+            latency (float): Seconds it took the upstream to respond.
+
+        """
+        self.fastest = latency if self.fastest is None else min(self.fastest, latency)
+        if self.average is None:
+            self.average = latency
+        else:
+            self.average += LATENCY_SMOOTHING * (latency - self.average)
+
+        if self.average > self.fastest * LATENCY_TOLERANCE:
+            self.decrease()
+            return
+        self.successes += 1
+        if self.successes >= self.limit:
+            self.successes = 0
+            self.limit = min(self.maximum, self.limit + 1)
+
+    def decrease(self):
+        """
+        Halve the limit, at most once per average response time.
+
+        Requests already in flight when the upstream started to struggle report back one after
+        another; only the first of them shrinks the limit.
+        """
+        now = self.clock()
+        if self.average is not None and now - self.decreased < self.average:
+            return
+        self.decreased = now
+        self.successes = 0
+        self.limit = max(self.minimum, self.limit // 2)
+
+
+class Throttle:
+    """
+    Throttle the requests sent to a single upstream.
+
+    Use it as an asynchronous context manager around each request, and report every outcome
+    with :meth:`succeeded` or :meth:`throttled`.
+    """
+
+    def __init__(self, rate=None, max_concurrency=1, clock=time.monotonic):
+        """
+        Throttle the requests sent to a single upstream.
+
+        Args:
+            rate (float): The most requests per second. None leaves the rate unlimited.
+            max_concurrency (int): The most requests in flight at once.
+            clock (callable): Returns the current time in seconds.
+
+        """
+        self.bucket = TokenBucket(rate, clock=clock)
+        self.concurrency = AdaptiveConcurrency(max_concurrency, clock=clock)
+
+    async def __aenter__(self):
+        """
+        Wait for room for one more concurrent request and a token to send it.
+        """
+        await self.concurrency.acquire()
+        try:
+            await self.bucket.acquire()
+        except BaseException:
+            await self.concurrency.release()
+            raise
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        """
+        Make room for the next request.
+        """
+        await self.concurrency.release()
+
+    def succeeded(self, latency):
+        """
+        Record a successful response.
+
+        Args:
+            latency (float): Seconds it took the upstream to respond.
+
+        """
+        self.concurrency.succeeded(latency)
+
+    def throttled(self, attempt, retry_after=None):
+        """
+        Record that the upstream asked to back off, and pause every request.
+
+        Args:
+            attempt (int): The number of times the request was throttled in a row, from 1.
+            retry_after (float): Seconds the upstream asked to wait for, if it said.
+
+        Returns:
+            float: Seconds to wait before retrying the request.
+
+        """
+        self.concurrency.decrease()
+        if retry_after is None:
+            retry_after = 2 ** attempt
+        delay = min(MAX_BACKOFF, retry_after)
+        self.bucket.pause(delay)
+        return delay
+
+
+def parse_retry_after(value, now=None):
+    """
+    Parse the value of a ``Retry-After`` header.
+
+    Args:
+        value (str): Either a number of seconds or an HTTP date.
+        now (datetime.datetime): The current time, to compare an HTTP date with.
+
+    Returns:
+        float: Seconds to wait, or None if the value is missing or invalid.
+
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if date is None:
+        return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    now = now or datetime.now(timezone.utc)
+    return max(0.0, (date - now).total_seconds())
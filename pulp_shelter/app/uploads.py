@@ -0,0 +1,89 @@
+"""
+Chunked, resumable uploads of animal pictures.
+
+A client starts an upload with the size of the picture, then sends chunks in any order, each
+with its offset. A chunk is hashed while it is read from the request into a temporary file, and
+only copied into place once it matches its digest, so a picture is never held in memory and a
+corrupted chunk never overwrites the bytes received before. A client whose connection dropped
+resends only the :func:`missing_ranges`. Once no range is missing, the upload is committed: the
+picture becomes an Artifact and the Animal is created with it.
+"""
+from gettext import gettext as _
+import hashlib
+import os
+import shutil
+import tempfile
+
+
+def create_file(path, size):
+    """
+    Create the file an upload is written into, at its full size.
+
+    Args:
+        path (str): The path of the file.
+        size (int): The size of the picture.
+
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as fp:
+        fp.truncate(size)
+
+
+def write_chunk(path, offset, chunks, sha256=None):
+    """
+    Write a chunk into the file of an upload, once its digest is checked.
+
+    The chunk is hashed as it is written into a temporary file next to the upload, which is
+    copied into place only if the digest matches.
+
+    Args:
+        path (str): The path of the file.
+        offset (int): The position of the chunk in the picture.
+        chunks (iterable): The bytes of the chunk, in pieces.
+        sha256 (str): The expected SHA-256 hex digest of the chunk, None to accept any.
+
+    Returns:
+        tuple: The size and the SHA-256 hex digest of the chunk.
+
+    Raises:
+        ValueError: If the chunk does not match ``sha256``. The file is left untouched.
+
+    """
+    hasher = hashlib.sha256()
+    size = 0
+    with tempfile.TemporaryFile(dir=os.path.dirname(path)) as staged:
+        for piece in chunks:
+            staged.write(piece)
+            hasher.update(piece)
+            size += len(piece)
+        digest = hasher.hexdigest()
+        if sha256 is not None and sha256 != digest:
+            raise ValueError(_('The chunk does not match its digest.'))
+        staged.seek(0)
+        with open(path, 'r+b') as fp:
+            fp.seek(offset)
+            shutil.copyfileobj(staged, fp)
+    return size, digest
+
+
+def missing_ranges(chunks, size):
+    """
+    Return the ranges of a picture which no chunk covers yet.
+
+    Args:
+        chunks (iterable): Tuples of the offset and size of every received chunk.
+        size (int): The size of the picture.
+
+    Returns:
+        list: Lists of the start and end, exclusive, of every missing range.
+
+    """
+    missing = []
+    position = 0
+    for offset, length in sorted(chunks):
+        if offset > position:
+            missing.append([position, offset])
+        position = max(position, offset + length)
+    if position < size:
+        missing.append([position, size])
+    return missing
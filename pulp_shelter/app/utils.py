@@ -0,0 +1,136 @@
+import hashlib
+import importlib
+import importlib.util
+import os
+from functools import partial
+from itertools import islice
+
+from django.db import IntegrityError, transaction
+
+from pulpcore.plugin.models import Artifact
+
+
+BLOCK_SIZE = 1024 * 1024
+
+DIGEST_FIELDS = Artifact.DIGEST_FIELDS
+
+
+def batched(iterable, size):
+    """
+    Split an iterable into lists of at most ``size`` items.
+
+    Only a single batch is held in memory at a time.
+
+    Args:
+        iterable (iterable): The items to split.
+        size (int): The maximum number of items in a batch.
+
+    Yields:
+        list: The next batch of items.
+
+    """
+    iterator = iter(iterable)
+    batch = list(islice(iterator, size))
+    while batch:
+        yield batch
+        batch = list(islice(iterator, size))
+
+
+def file_digests(path, algorithms=DIGEST_FIELDS):
+    """
+    Compute the size and the digests of a file, reading it in blocks.
+
+    Args:
+        path (str): The file to read.
+        algorithms (tuple): Names of the ``hashlib`` algorithms to compute.
+
+    Returns:
+        dict: The ``size`` and a hex digest keyed by each of the algorithms, ready to be
+            passed to :class:`~pulpcore.plugin.models.Artifact`.
+
+    """
+    hashers = {algorithm: hashlib.new(algorithm) for algorithm in algorithms}
+    size = 0
+    with open(path, 'rb') as fp:
+        for block in iter(partial(fp.read, BLOCK_SIZE), b''):
+            size += len(block)
+            for hasher in hashers.values():
+                hasher.update(block)
+    digests = {algorithm: hasher.hexdigest() for algorithm, hasher in hashers.items()}
+    digests['size'] = size
+    return digests
+
+
+def save_artifact(path):
+    """
+    Save a file as an Artifact, unless an Artifact with the same content exists already.
+
+    Args:
+        path (str): The file.
+
+    Returns:
+        pulpcore.plugin.models.Artifact: The new or the existing Artifact.
+
+    """
+    digests = file_digests(path)
+    artifact = Artifact.objects.filter(sha256=digests['sha256']).first()
+    if artifact is not None:
+        return artifact
+    try:
+        with transaction.atomic():
+            artifact = Artifact(file=os.path.abspath(path), **digests)
+            artifact.save()
+    except IntegrityError:
+        # Saved meanwhile by another task.
+        artifact = Artifact.objects.get(sha256=digests['sha256'])
+    return artifact
+
+
+class LazyModule:
+    """
+    Stand for a module, which is only imported once one of its attributes is used.
+    """
+
+    def __init__(self, name):
+        """
+        Stand for a module, which is only imported once one of its attributes is used.
+
+        Args:
+            name (str): The absolute name of the module.
+
+        """
+        self.name = name
+        self.module = None
+
+    def __getattr__(self, attribute):
+        """
+        Return an attribute of the module, importing it first if need be.
+
+        Only called for the attributes this object does not have itself.
+
+        Args:
+            attribute (str): The name of the attribute.
+
+        Returns:
+            The attribute of the module.
+
+        """
+        if self.module is None:
+            self.module = importlib.import_module(self.name)
+        return getattr(self.module, attribute)
+
+
+def optional_module(name):
+    """
+    Find an optional module without importing it.
+
+    Args:
+        name (str): The absolute name of the module.
+
+    Returns:
+        LazyModule: The module, imported on first use, or None if it is not installed.
+
+    """
+    if importlib.util.find_spec(name) is None:
+        return None
+    return LazyModule(name)
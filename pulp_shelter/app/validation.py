@@ -0,0 +1,148 @@
+"""
+Validate the records of a manifest before they reach the database.
+
+Records are validated in worker processes, which import this module alone. It must therefore
+not import any model: records reach it as plain tuples of
+:data:`~pulp_shelter.app.manifest.RECORD_FIELDS`, along with the constraints of the ``Animal``
+model gathered in :data:`~pulp_shelter.app.manifest.RECORD_SCHEMA`.
+"""
+import math
+import re
+from gettext import gettext as _
+from urllib.parse import urlsplit
+
+
+SHA256 = re.compile('[0-9a-f]{64}')
+
+# The largest value of an integer column of the database.
+MAX_INTEGER = 2 ** 31 - 1
+
+
+def validate_batch(batch, schema):
+    """
+    Validate a batch of records.
+
+    Args:
+        batch (list): Records, as tuples of the values of ``schema['fields']``, or None for
+            the lines of a manifest which are not records, and are skipped.
+        schema (dict): The constraints of the fields, see :func:`validate_record`.
+
+    Returns:
+        list: Tuples of the index in the batch and the errors of every invalid record.
+
+    """
+    invalid = []
+    for index, values in enumerate(batch):
+        if values is None:
+            continue
+        errors = validate_record(values, schema)
+        if errors:
+            invalid.append((index, errors))
+    return invalid
+
+
+def validate_record(values, schema):
+    """
+    Validate a record.
+
+    Args:
+        values (tuple): The values of ``schema['fields']``, None for those missing.
+        schema (dict): The constraints of the fields: their ``fields`` in order, their
+            ``types``, the ``required`` ones, the ``not_blank`` strings, and the
+            ``max_lengths`` and ``choices`` of strings.
+
+    Returns:
+        dict: The error of every invalid field, empty if the record is valid.
+
+    """
+    errors = {}
+    for field, value in zip(schema['fields'], values):
+        error = field_error(field, value, schema)
+        if error is not None:
+            errors[field] = error
+    return errors
+
+
+def field_error(field, value, schema):
+    """
+    Validate a value of a record.
+
+    Args:
+        field (str): The name of the field.
+        value: The value, None if missing.
+        schema (dict): The constraints of the fields, see :func:`validate_record`.
+
+    Returns:
+        str: Why the value is not valid, None if it is.
+
+    """
+    if value is None:
+        return _('This field is required.') if field in schema['required'] else None
+    kind = schema['types'][field]
+    if kind == 'string':
+        return string_error(field, value, schema)
+    if kind == 'integer':
+        if isinstance(value, bool) or not isinstance(value, int):
+            return _('Not an integer.')
+        if not 0 <= value <= MAX_INTEGER:
+            return _('Not between 0 and {maximum}.').format(maximum=MAX_INTEGER)
+    elif kind == 'number':
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            return _('Not a number.')
+        if not math.isfinite(value) or value < 0:
+            return _('Not a finite, positive number.')
+    elif kind == 'boolean':
+        if not isinstance(value, bool):
+            return _('Not a boolean.')
+    elif kind == 'sha256':
+        if not isinstance(value, str) or not SHA256.fullmatch(value):
+            return _('Not a hexadecimal SHA-256 digest.')
+    return None
+
+
+def string_error(field, value, schema):
+    """
+    Validate a string value of a record.
+
+    Args:
+        field (str): The name of the field.
+        value: The value.
+        schema (dict): The constraints of the fields, see :func:`validate_record`.
+
+    Returns:
+        str: Why the value is not valid, None if it is.
+
+    """
+    if not isinstance(value, str):
+        return _('Not a string.')
+    if field in schema['not_blank'] and not value.strip():
+        return _('This field may not be blank.')
+    max_length = schema['max_lengths'].get(field)
+    if max_length is not None and len(value) > max_length:
+        return _('Longer than {max_length} characters.').format(max_length=max_length)
+    choices = schema['choices'].get(field)
+    if choices is not None and value not in choices:
+        return _('Not one of: {choices}.').format(choices=', '.join(choices))
+    if field == 'picture' and not is_relative_path(value):
+        return _('Not a path relative to the manifest.')
+    return None
+
+
+def is_relative_path(path):
+    """
+    Tell whether a path stays within the directory it is relative to.
+
+    A picture is downloaded from its path joined to the URL of the manifest, so a URL, an
+    absolute path or a parent directory would download it from elsewhere.
+
+    Args:
+        path (str): The path.
+
+    Returns:
+        bool: Whether the path is relative and has no parent directory in it.
+
+    """
+    parts = urlsplit(path)
+    if parts.scheme or parts.netloc or path.startswith('/'):
+        return False
+    return '..' not in path.split('/')
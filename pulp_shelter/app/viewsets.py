@@ -5,29 +5,153 @@ Check `Plugin Writer's Guide`_ for more details.
     http://docs.pulpproject.org/en/3.0/nightly/plugins/plugin-writer/index.html
 """
 
-from django.db import transaction
+import json
+import os
+from gettext import gettext as _
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import Case, FloatField, Q, Value, When
+from django.http import StreamingHttpResponse
+from django_filters import rest_framework as filters
 from drf_yasg.utils import swagger_auto_schema
-from rest_framework import status
-from rest_framework.decorators import detail_route
+from rest_framework import mixins, status
+from rest_framework.decorators import detail_route, list_route
+from rest_framework.exceptions import ValidationError
+from rest_framework.generics import get_object_or_404
 from rest_framework.response import Response
 
 from pulpcore.plugin import viewsets as core
 from pulpcore.plugin.serializers import (
     AsyncOperationResponseSerializer,
     RepositoryPublishURLSerializer,
-    RepositorySyncURLSerializer,
 )
 from pulpcore.plugin.tasking import enqueue_with_reservation
-from pulpcore.plugin.models import ContentArtifact
+from pulpcore.plugin.models import Artifact, ContentArtifact
 
-from . import models, serializers, tasks
+from . import columns, matching, models, serializers, tasks
+from .diff import diff_versions
+from .metrics import MetricsMixin
+from .queries import QueryCountMixin
+from .uploads import create_file, missing_ranges, write_chunk
+from .utils import file_digests
+
+
+# The order animals are listed in, which pages of the list follow.
+ORDERING = ('species', 'breed', 'name', 'shelter')
 
 
 class AnimalFilter(core.ContentFilter):
     """
     FilterSet for Animal.
+
+    Animals are found near a point by the location of their shelter in the registry, either
+    within a ``radius`` of it or at the ``nearest_shelters`` to it, and are ordered by the
+    distance of their shelter. The ``search`` parameter matches animals whose name or bio
+    contain it.
     """
 
+    near = filters.CharFilter(
+        method='filter_near',
+        help_text=_('A point, as "latitude,longitude" in degrees, to find animals near.')
+    )
+    radius = filters.NumberFilter(
+        method='filter_nothing',
+        help_text=_('Only animals of shelters within this many kilometres of the point.')
+    )
+    nearest_shelters = filters.NumberFilter(
+        method='filter_nothing',
+        help_text=_('Only animals of this many shelters nearest to the point.')
+    )
+    search = filters.CharFilter(
+        method='filter_search',
+        help_text=_('Only animals whose name or bio contain this text, in any case.')
+    )
+
+    def filter_near(self, queryset, name, value):
+        """
+        Filter animals by the distance of their shelter to a point, and order them by it.
+
+        Args:
+            queryset (django.db.models.QuerySet): The animals.
+            name (str): The name of the filter.
+            value (str): The point, as "latitude,longitude".
+
+        Returns:
+            django.db.models.QuerySet: The animals of the shelters near the point.
+
+        Raises:
+            rest_framework.exceptions.ValidationError: If the point is not valid, or neither
+                a radius nor a number of shelters is given.
+
+        """
+        try:
+            latitude, longitude = (float(part) for part in value.split(','))
+        except ValueError:
+            raise ValidationError({name: _('Enter a point as "latitude,longitude".')})
+        if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            raise ValidationError({name: _('The point is out of range.')})
+
+        radius = self.form.cleaned_data.get('radius')
+        count = self.form.cleaned_data.get('nearest_shelters')
+        radius = None if radius is None else float(radius)
+        if radius is None and count is None:
+            raise ValidationError(
+                {name: _('Either "radius" or "nearest_shelters" has to be provided.')}
+            )
+        if (radius is not None and radius < 0) or (count is not None and count < 1):
+            raise ValidationError(
+                {name: _('"radius" may not be negative, nor "nearest_shelters" less than 1.')}
+            )
+
+        if count is None:
+            shelters = models.Shelter.within(latitude, longitude, radius)
+        else:
+            shelters = models.Shelter.nearest(latitude, longitude, int(count))
+            if radius is not None:
+                shelters = [shelter for shelter in shelters if shelter[0] <= radius]
+        if not shelters:
+            return queryset.none()
+        distance = Case(
+            *(When(shelter=shelter, then=Value(kilometres))
+              for kilometres, shelter in shelters),
+            output_field=FloatField()
+        )
+        return queryset.filter(
+            shelter__in=[shelter for kilometres, shelter in shelters]
+        ).annotate(shelter_distance=distance).order_by('shelter_distance',
+                                                       *queryset.query.order_by)
+
+    def filter_search(self, queryset, name, value):
+        """
+        Filter animals by a text their name or bio contain.
+
+        Args:
+            queryset (django.db.models.QuerySet): The animals.
+            name (str): The name of the filter.
+            value (str): The text.
+
+        Returns:
+            django.db.models.QuerySet: The matching animals.
+
+        """
+        return queryset.filter(Q(name__icontains=value) | Q(bio__icontains=value))
+
+    def filter_nothing(self, queryset, name, value):
+        """
+        Leave the animals as they are, for parameters read by another filter.
+
+        Args:
+            queryset (django.db.models.QuerySet): The animals.
+            name (str): The name of the filter.
+            value: The value of the parameter.
+
+        Returns:
+            django.db.models.QuerySet: The same animals.
+
+        """
+        return queryset
+
     class Meta:
         model = models.Animal
         fields = [
@@ -35,7 +159,33 @@ class AnimalFilter(core.ContentFilter):
         ]
 
 
-class AnimalViewSet(core.ContentViewSet):
+def filter_animals(filters):
+    """
+    Return the animals matching the parameters of the animal list filters.
+
+    Args:
+        filters (dict): The filter parameters.
+
+    Returns:
+        django.db.models.QuerySet: The matching animals, in no particular order.
+
+    Raises:
+        ValueError: If a filter is unknown or its value is not valid.
+
+    """
+    # A misspelled parameter would otherwise be ignored, selecting every animal.
+    unknown = set(filters) - set(AnimalFilter.base_filters)
+    if unknown:
+        raise ValueError(_('Unknown filters: {filters}').format(
+            filters=', '.join(sorted(unknown))
+        ))
+    filterset = AnimalFilter(filters, queryset=models.Animal.objects.all())
+    if not filterset.is_valid():
+        raise ValueError(_('Invalid filters: {errors}').format(errors=filterset.errors))
+    return filterset.qs.order_by()
+
+
+class AnimalViewSet(MetricsMixin, QueryCountMixin, core.ContentViewSet):
     """
     A ViewSet for Animal.
 
@@ -47,7 +197,7 @@ class AnimalViewSet(core.ContentViewSet):
     """
 
     endpoint_name = 'animal'
-    queryset = models.Animal.objects.all()
+    queryset = models.Animal.objects.prefetch_related('_artifacts').order_by(*ORDERING)
     serializer_class = serializers.AnimalSerializer
     filterset_class = AnimalFilter
 
@@ -62,19 +212,379 @@ class AnimalViewSet(core.ContentViewSet):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
-        _artifact = serializer.validated_data.pop('_artifact')
+        artifact = serializer.validated_data.pop('_artifact')
         content = serializer.save()
 
         if content.pk:
             ContentArtifact.objects.create(
                 artifact=artifact,
                 content=content,
-                relative_path=content.relative_path
+                relative_path=content.picture
             )
 
         headers = self.get_success_headers(serializer.data)
         return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
 
+    @swagger_auto_schema(
+        operation_description="Start uploading an animal picture in chunks",
+        responses={201: serializers.PictureUploadSerializer}
+    )
+    @list_route(methods=('post',), url_path='uploads',
+                serializer_class=serializers.PictureUploadSerializer)
+    def create_upload(self, request):
+        """
+        Start a chunked upload of a picture. The ``size`` field has to be provided.
+        """
+        serializer = serializers.PictureUploadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        upload = serializer.save()
+        create_file(upload.path, upload.size)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    @swagger_auto_schema(
+        methods=('put',),
+        operation_description="Upload a chunk of an animal picture, in any order",
+        request_body=serializers.PictureUploadChunkSerializer,
+        responses={200: serializers.PictureUploadSerializer}
+    )
+    @list_route(methods=('get', 'put', 'delete'), url_path='uploads/(?P<upload_pk>[^/.]+)',
+                url_name='upload', serializer_class=serializers.PictureUploadChunkSerializer)
+    def upload(self, request, upload_pk):
+        """
+        Show which ranges of a picture upload are missing, upload a chunk, or abort the upload.
+
+        A chunk sent again for the same ``offset`` replaces the previous one.
+        """
+        upload = get_object_or_404(models.PictureUpload, pk=upload_pk)
+        if request.method == 'DELETE':
+            upload.delete()
+            if os.path.exists(upload.path):
+                os.remove(upload.path)
+            return Response(status=status.HTTP_204_NO_CONTENT)
+
+        if request.method == 'PUT':
+            serializer = serializers.PictureUploadChunkSerializer(
+                data=request.data,
+                context={'upload': upload}
+            )
+            serializer.is_valid(raise_exception=True)
+            offset = serializer.validated_data['offset']
+            try:
+                size, sha256 = write_chunk(
+                    upload.path, offset, serializer.validated_data['file'].chunks(),
+                    sha256=serializer.validated_data.get('sha256')
+                )
+            except ValueError as exc:
+                raise ValidationError({'sha256': str(exc)})
+            models.PictureUploadChunk.objects.update_or_create(
+                upload=upload,
+                offset=offset,
+                defaults={'size': size, 'sha256': sha256}
+            )
+        return Response(serializers.PictureUploadSerializer(upload).data)
+
+    @swagger_auto_schema(
+        operation_description="Create an animal with a completely uploaded picture",
+        responses={201: serializers.AnimalSerializer}
+    )
+    @list_route(methods=('post',), url_path='uploads/(?P<upload_pk>[^/.]+)/commit',
+                url_name='upload-commit', serializer_class=serializers.AnimalSerializer)
+    def commit_upload(self, request, upload_pk):
+        """
+        Create the Artifact of a picture upload and an Animal with it, in one step.
+
+        The fields of the animal are those of a create, except ``_artifact``.
+        """
+        upload = get_object_or_404(models.PictureUpload, pk=upload_pk)
+        missing = missing_ranges(upload.chunks.values_list('offset', 'size'), upload.size)
+        if missing:
+            raise ValidationError(_('Ranges {ranges} of the picture are missing.').format(
+                ranges=missing
+            ))
+
+        serializer = self.get_serializer(data=request.data, partial=True)
+        serializer.is_valid(raise_exception=True)
+        serializer.validated_data.pop('_artifact', None)
+        content = models.Animal(**serializer.validated_data)
+        try:
+            content.full_clean(exclude=[
+                field.name for field in models.Animal._meta.fields
+                if field.model is not models.Animal or field.primary_key
+            ])
+        except DjangoValidationError as exc:
+            raise ValidationError(exc.message_dict)
+
+        digests = file_digests(upload.path)
+        if upload.sha256 and upload.sha256 != digests['sha256']:
+            raise ValidationError({'sha256': _('The picture does not match its digest.')})
+        with transaction.atomic():
+            # Saving the Artifact moves the file of the upload, so the animal is saved first:
+            # an animal saved meanwhile with the same natural key or picture leaves the upload
+            # whole, to commit again with other fields.
+            try:
+                with transaction.atomic():
+                    content.save()
+            except IntegrityError:
+                raise ValidationError(
+                    _('An animal with the same natural key or picture exists already.')
+                )
+            artifact = Artifact.objects.filter(sha256=digests['sha256']).first()
+            if artifact is None:
+                artifact = Artifact(file=upload.path, **digests)
+                artifact.save()
+            ContentArtifact.objects.create(
+                artifact=artifact,
+                content=content,
+                relative_path=content.picture
+            )
+            upload.delete()
+        if os.path.exists(upload.path):
+            os.remove(upload.path)
+
+        serializer = self.get_serializer(content)
+        headers = self.get_success_headers(serializer.data)
+        return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
+
+    @swagger_auto_schema(
+        operation_description="Rank the animals of a repository version against the profile "
+                              "of an adopter",
+        request_body=serializers.AnimalMatchSerializer
+    )
+    @list_route(methods=('post',), serializer_class=serializers.AnimalMatchSerializer)
+    def match(self, request):
+        """
+        Find the animals of a repository version matching the profile of an adopter best.
+
+        The ``repository_version`` field has to be provided. Every other criterion of the
+        profile raises the score of the animals meeting it. Reserved animals are left out.
+        """
+        if columns.numpy is None:
+            raise ValidationError(_('Matching animals requires the numpy package.'))
+        serializer = serializers.AnimalMatchSerializer(
+            data=request.data,
+            context={'request': request}
+        )
+        serializer.is_valid(raise_exception=True)
+        profile = dict(serializer.validated_data)
+        repository_version = profile.pop('repository_version')
+        count = profile.pop('count')
+
+        ranked = matching.match(repository_version, profile, count)
+        animals = self.get_queryset().in_bulk([pk for pk, score in ranked])
+        context = self.get_serializer_context()
+        return Response([
+            {
+                'score': score,
+                'animal': serializers.AnimalSerializer(animals[pk], context=context).data
+            }
+            for pk, score in ranked if pk in animals
+        ])
+
+    @swagger_auto_schema(
+        operation_description="Trigger an asynchronous task to add and remove many animals of "
+                              "a repository in a single version",
+        responses={202: AsyncOperationResponseSerializer}
+    )
+    @list_route(methods=('post',), serializer_class=serializers.AnimalModifySerializer)
+    def modify(self, request):
+        """
+        Adds and removes animals of a repository, selected by filters or by natural key.
+
+        The ``repository`` field has to be provided. A single repository version is created.
+        """
+        serializer = serializers.AnimalModifySerializer(
+            data=request.data,
+            context={'request': request}
+        )
+        serializer.is_valid(raise_exception=True)
+        for field in ('add_filters', 'remove_filters'):
+            if serializer.validated_data.get(field):
+                try:
+                    filter_animals(serializer.validated_data[field])
+                except ValueError as exc:
+                    raise ValidationError({field: str(exc)})
+        repository = serializer.validated_data['repository']
+
+        result = enqueue_with_reservation(
+            tasks.modify,
+            [repository],
+            kwargs={
+                'repository_pk': repository.pk,
+                'add_filters': serializer.validated_data.get('add_filters'),
+                'add_natural_keys': serializer.validated_data.get('add_natural_keys', []),
+                'remove_filters': serializer.validated_data.get('remove_filters'),
+                'remove_natural_keys': serializer.validated_data.get('remove_natural_keys', [])
+            }
+        )
+        return core.OperationPostponedResponse(result, request)
+
+    @swagger_auto_schema(
+        operation_description="Count or summarize the animals of a repository version by a "
+                              "field",
+        query_serializer=serializers.AnimalStatisticsSerializer,
+    )
+    @list_route(methods=('get',))
+    def statistics(self, request):
+        """
+        Count the animals of a repository version by a field, or summarize a numeric field.
+
+        Statistics are computed from the columnar snapshot of the version, not the database.
+
+        Both ``repository_version`` and ``field`` query parameters have to be provided.
+        """
+        if columns.numpy is None:
+            raise ValidationError(_('Statistics on animals require the numpy package.'))
+        serializer = serializers.AnimalStatisticsSerializer(
+            data=request.query_params,
+            context={'request': request}
+        )
+        serializer.is_valid(raise_exception=True)
+        snapshot = columns.SNAPSHOTS.get(serializer.validated_data['repository_version'])
+        field = serializer.validated_data['field']
+        group_by = serializer.validated_data.get('group_by')
+        if field in columns.CATEGORICAL_FIELDS:
+            return Response({'counts': snapshot.counts(field, group_by=group_by)})
+        return Response({'summary': snapshot.describe(field, group_by=group_by)})
+
+    @swagger_auto_schema(
+        operation_description="Stream the animals added, removed or changed between two "
+                              "repository versions as newline-delimited JSON",
+        query_serializer=serializers.AnimalDiffSerializer,
+    )
+    @list_route(methods=('get',))
+    def diff(self, request):
+        """
+        Compare the animals of two repository versions.
+
+        Both ``base_version`` and ``version`` query parameters have to be provided.
+        """
+        serializer = serializers.AnimalDiffSerializer(
+            data=request.query_params,
+            context={'request': request}
+        )
+        serializer.is_valid(raise_exception=True)
+        records = diff_versions(
+            serializer.validated_data['base_version'],
+            serializer.validated_data['version']
+        )
+        return StreamingHttpResponse(
+            (json.dumps(record) + '\n' for record in records),
+            content_type='application/x-ndjson'
+        )
+
+    @swagger_auto_schema(
+        operation_description="Trigger an asynchronous task to export the animals of a "
+                              "repository version",
+        responses={202: AsyncOperationResponseSerializer}
+    )
+    @list_route(methods=('post',), serializer_class=serializers.AnimalExportSerializer)
+    def export(self, request):
+        """
+        Exports the animals of a repository version into an artifact.
+
+        The ``repository_version`` field has to be provided.
+        """
+        serializer = serializers.AnimalExportSerializer(
+            data=request.data,
+            context={'request': request}
+        )
+        serializer.is_valid(raise_exception=True)
+        repository_version = serializer.validated_data.get('repository_version')
+
+        result = enqueue_with_reservation(
+            tasks.export,
+            [repository_version.repository],
+            kwargs={
+                'repository_version_pk': str(repository_version.pk),
+                'include_pictures': serializer.validated_data.get('include_pictures')
+            }
+        )
+        return core.OperationPostponedResponse(result, request)
+
+    @swagger_auto_schema(
+        operation_description="Trigger an asynchronous task to import animals from an "
+                              "uploaded archive",
+        responses={202: AsyncOperationResponseSerializer}
+    )
+    @list_route(methods=('post',), url_path='import',
+                serializer_class=serializers.AnimalImportSerializer)
+    def import_archive(self, request):
+        """
+        Imports animals and their pictures from an uploaded tarball into a repository.
+
+        The ``artifact`` and ``repository`` fields have to be provided.
+        """
+        serializer = serializers.AnimalImportSerializer(
+            data=request.data,
+            context={'request': request}
+        )
+        serializer.is_valid(raise_exception=True)
+        repository = serializer.validated_data.get('repository')
+
+        result = enqueue_with_reservation(
+            tasks.import_archive,
+            [repository],
+            kwargs={
+                'artifact_pk': serializer.validated_data.get('artifact').pk,
+                'repository_pk': repository.pk,
+                'mirror': serializer.validated_data.get('mirror')
+            }
+        )
+        return core.OperationPostponedResponse(result, request)
+
+
+class ShelterRegistryViewSet(MetricsMixin, QueryCountMixin, core.NamedModelViewSet,
+                             mixins.CreateModelMixin,
+                             mixins.RetrieveModelMixin,
+                             mixins.ListModelMixin,
+                             mixins.UpdateModelMixin,
+                             mixins.DestroyModelMixin):
+    """
+    A ViewSet for the registry of shelters, which animals are found near a point by.
+    """
+
+    endpoint_name = 'shelters'
+    queryset = models.Shelter.objects.order_by('name')
+    serializer_class = serializers.ShelterSerializer
+    filterset_fields = ('name',)
+
+
+class ShelterRetentionPolicyViewSet(MetricsMixin, QueryCountMixin, core.NamedModelViewSet,
+                                    mixins.CreateModelMixin,
+                                    mixins.RetrieveModelMixin,
+                                    mixins.ListModelMixin,
+                                    mixins.UpdateModelMixin,
+                                    mixins.DestroyModelMixin):
+    """
+    A ViewSet for the retention policies of repositories.
+    """
+
+    endpoint_name = 'shelter-retention-policies'
+    queryset = models.ShelterRetentionPolicy.objects.select_related('repository')
+    serializer_class = serializers.ShelterRetentionPolicySerializer
+
+    @swagger_auto_schema(
+        operation_description="Trigger an asynchronous task to squash the repository versions "
+                              "the policy does not keep",
+        responses={202: AsyncOperationResponseSerializer}
+    )
+    @detail_route(methods=('post',))
+    def clean_up(self, request, pk):
+        """
+        Squashes the versions of the repository the policy does not keep.
+
+        Animals and pictures left without a repository version are deleted.
+        """
+        policy = self.get_object()
+        result = enqueue_with_reservation(
+            tasks.clean_up,
+            [policy.repository],
+            kwargs={
+                'repository_pk': policy.repository.pk
+            }
+        )
+        return core.OperationPostponedResponse(result, request)
+
 
 class ShelterRemoteFilter(core.RemoteFilter):
     """
@@ -88,7 +598,7 @@ class ShelterRemoteFilter(core.RemoteFilter):
         ]
 
 
-class ShelterRemoteViewSet(core.RemoteViewSet):
+class ShelterRemoteViewSet(MetricsMixin, QueryCountMixin, core.RemoteViewSet):
     """
     A ViewSet for ShelterRemote.
 
@@ -106,21 +616,27 @@ class ShelterRemoteViewSet(core.RemoteViewSet):
         operation_description="Trigger an asynchronous task to sync content",
         responses={202: AsyncOperationResponseSerializer}
     )
-    @detail_route(methods=('post',), serializer_class=RepositorySyncURLSerializer)
+    @detail_route(methods=('post',), serializer_class=serializers.ShelterSyncSerializer)
     def sync(self, request, pk):
         """
         Synchronizes a repository. The ``repository`` field has to be provided.
+
+        With ``dry_run``, the sync is only planned, without reserving the repository.
         """
         remote = self.get_object()
-        serializer = RepositorySyncURLSerializer(data=request.data, context={'request': request})
+        serializer = serializers.ShelterSyncSerializer(
+            data=request.data,
+            context={'request': request}
+        )
 
         # Validate synchronously to return 400 errors.
         serializer.is_valid(raise_exception=True)
         repository = serializer.validated_data.get('repository')
         mirror = serializer.validated_data.get('mirror', True)
+        dry_run = serializer.validated_data.get('dry_run')
         result = enqueue_with_reservation(
-            tasks.synchronize,
-            [repository, remote],
+            tasks.plan_sync if dry_run else tasks.synchronize,
+            [remote] if dry_run else [repository, remote],
             kwargs={
                 'remote_pk': remote.pk,
                 'repository_pk': repository.pk,
@@ -129,8 +645,65 @@ class ShelterRemoteViewSet(core.RemoteViewSet):
         )
         return core.OperationPostponedResponse(result, request)
 
+    @swagger_auto_schema(
+        operation_description="Trigger an asynchronous task to sync content from several "
+                              "remotes into a single repository version",
+        responses={202: AsyncOperationResponseSerializer}
+    )
+    @list_route(methods=('post',), serializer_class=serializers.MultiRemoteSyncSerializer,
+                url_path='sync')
+    def sync_remotes(self, request):
+        """
+        Synchronizes a repository from several remotes at once, creating a single version.
+        """
+        serializer = serializers.MultiRemoteSyncSerializer(
+            data=request.data,
+            context={'request': request}
+        )
+        serializer.is_valid(raise_exception=True)
+        remotes = serializer.validated_data.get('remotes')
+        repository = serializer.validated_data.get('repository')
+        result = enqueue_with_reservation(
+            tasks.synchronize_remotes,
+            [repository] + remotes,
+            kwargs={
+                'remote_pks': [remote.pk for remote in remotes],
+                'repository_pk': repository.pk,
+                'mirror': serializer.validated_data.get('mirror')
+            }
+        )
+        return core.OperationPostponedResponse(result, request)
+
+    @swagger_auto_schema(
+        operation_description="Trigger an asynchronous task to download the pictures of the "
+                              "animals of a repository most likely to be viewed",
+        responses={202: AsyncOperationResponseSerializer}
+    )
+    @detail_route(methods=('post',), serializer_class=serializers.ShelterPrefetchSerializer)
+    def prefetch(self, request, pk):
+        """
+        Downloads the pictures of a repository synced with a policy other than ``immediate``.
+        """
+        remote = self.get_object()
+        serializer = serializers.ShelterPrefetchSerializer(
+            data=request.data,
+            context={'request': request}
+        )
+        serializer.is_valid(raise_exception=True)
+        repository = serializer.validated_data.get('repository')
+        result = enqueue_with_reservation(
+            tasks.prefetch,
+            [remote],
+            kwargs={
+                'remote_pk': remote.pk,
+                'repository_pk': repository.pk,
+                'count': serializer.validated_data.get('count')
+            }
+        )
+        return core.OperationPostponedResponse(result, request)
+
 
-class ShelterPublisherViewSet(core.PublisherViewSet):
+class ShelterPublisherViewSet(MetricsMixin, QueryCountMixin, core.PublisherViewSet):
     """
     A ViewSet for ShelterPublisher.
 
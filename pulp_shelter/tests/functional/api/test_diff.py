@@ -0,0 +1,80 @@
+# coding=utf-8
+"""Tests that compare the animals of shelter repository versions."""
+import json
+import unittest
+from random import choice
+
+from requests.exceptions import HTTPError
+
+from pulp_smash import api, config
+from pulp_smash.pulp3.constants import REPO_PATH
+from pulp_smash.pulp3.utils import gen_repo, get_content, sync
+
+from pulp_shelter.tests.functional.constants import (
+    SHELTER_CONTENT_DIFF_PATH,
+    SHELTER_CONTENT_NAME,
+    SHELTER_REMOTE_PATH,
+)
+from pulp_shelter.tests.functional.utils import gen_shelter_remote
+from pulp_shelter.tests.functional.utils import set_up_module as setUpModule  # noqa:F401
+
+
+class DiffTestCase(unittest.TestCase):
+    """Compare the animals of two repository versions."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Create class-wide variables."""
+        cls.cfg = config.get_config()
+        cls.client = api.Client(cls.cfg, api.json_handler)
+
+    def test_missing_versions(self):
+        """Assert that both repository versions have to be provided."""
+        with self.assertRaises(HTTPError) as exc:
+            self.client.get(SHELTER_CONTENT_DIFF_PATH)
+        self.assertEqual(exc.exception.response.status_code, 400)
+
+    # Implement sync support before enabling this test.
+    @unittest.skip("FIXME: plugin writer action required")
+    def test_removed(self):
+        """Assert that animals removed from a repository are reported.
+
+        Do the following:
+
+        1. Create a repository and a remote, and sync the remote.
+        2. Diff the version against itself, assert nothing changed.
+        3. Remove one animal from the repository.
+        4. Diff the two versions, assert only that animal was removed.
+        5. Diff the versions the other way round, assert only that animal was added.
+        """
+        repo = self.client.post(REPO_PATH, gen_repo())
+        self.addCleanup(self.client.delete, repo['_href'])
+
+        remote = self.client.post(SHELTER_REMOTE_PATH, gen_shelter_remote())
+        self.addCleanup(self.client.delete, remote['_href'])
+
+        sync(self.cfg, remote, repo)
+        repo = self.client.get(repo['_href'])
+        first = repo['_latest_version_href']
+        self.assertEqual(self.get_diff(first, first), [])
+
+        animal = choice(get_content(repo)[SHELTER_CONTENT_NAME])
+        self.client.post(repo['_versions_href'], {'remove_content_units': [animal['_href']]})
+        repo = self.client.get(repo['_href'])
+        second = repo['_latest_version_href']
+
+        for base, version, change in ((first, second, 'removed'), (second, first, 'added')):
+            with self.subTest(change=change):
+                records = self.get_diff(base, version)
+                self.assertEqual(len(records), 1, records)
+                self.assertEqual(records[0]['change'], change)
+                self.assertEqual(records[0]['animal']['name'], animal['name'])
+
+    def get_diff(self, base_version, version):
+        """Return the parsed records of a diff between two repository versions."""
+        response = api.Client(self.cfg, api.echo_handler).get(
+            SHELTER_CONTENT_DIFF_PATH,
+            params={'base_version': base_version, 'version': version}
+        )
+        response.raise_for_status()
+        return [json.loads(line) for line in response.text.splitlines()]
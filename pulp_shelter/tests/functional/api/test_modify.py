@@ -0,0 +1,86 @@
+# coding=utf-8
+"""Tests that add and remove many animals of a shelter repository at once."""
+import unittest
+
+from requests.exceptions import HTTPError
+
+from pulp_smash import api, config
+from pulp_smash.pulp3.constants import REPO_PATH
+from pulp_smash.pulp3.utils import gen_repo, get_content, sync
+
+from pulp_shelter.tests.functional.constants import (
+    SHELTER_CONTENT_MODIFY_PATH,
+    SHELTER_CONTENT_NAME,
+    SHELTER_REMOTE_PATH,
+)
+from pulp_shelter.tests.functional.utils import gen_shelter_remote
+from pulp_shelter.tests.functional.utils import set_up_module as setUpModule  # noqa:F401
+
+
+class ModifyTestCase(unittest.TestCase):
+    """Add and remove many animals of a repository in a single version."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Create class-wide variables."""
+        cls.cfg = config.get_config()
+        cls.client = api.Client(cls.cfg, api.json_handler)
+
+    def test_invalid(self):
+        """Assert that nothing is enqueued without animals, or with unknown filters."""
+        repo = self.client.post(REPO_PATH, gen_repo())
+        self.addCleanup(self.client.delete, repo['_href'])
+
+        for body in (
+            {'repository': repo['_href']},
+            {'repository': repo['_href'], 'add_filters': {'specie': 'cat'}},
+            {'repository': repo['_href'], 'remove_natural_keys': [{'name': 'Kitty'}]},
+        ):
+            with self.subTest(body=body):
+                with self.assertRaises(HTTPError) as exc:
+                    self.client.post(SHELTER_CONTENT_MODIFY_PATH, body)
+                self.assertEqual(exc.exception.response.status_code, 400)
+
+    # Implement sync support before enabling this test.
+    @unittest.skip("FIXME: plugin writer action required")
+    def test_move(self):
+        """Assert that animals are moved between repositories with one version each.
+
+        Do the following:
+
+        1. Create two repositories and a remote, and sync the remote into the first one.
+        2. Add every animal of the first repository to the second one by filter.
+        3. Remove one animal from the first repository by natural key.
+        4. Assert each modification created a single version with the expected animals.
+        """
+        source = self.client.post(REPO_PATH, gen_repo())
+        self.addCleanup(self.client.delete, source['_href'])
+        target = self.client.post(REPO_PATH, gen_repo())
+        self.addCleanup(self.client.delete, target['_href'])
+
+        remote = self.client.post(SHELTER_REMOTE_PATH, gen_shelter_remote())
+        self.addCleanup(self.client.delete, remote['_href'])
+
+        sync(self.cfg, remote, source)
+        source = self.client.get(source['_href'])
+        animals = get_content(source)[SHELTER_CONTENT_NAME]
+
+        self.client.post(SHELTER_CONTENT_MODIFY_PATH, {
+            'repository': target['_href'],
+            'add_filters': {'repository_version': source['_latest_version_href']},
+        })
+        target = self.client.get(target['_href'])
+        self.assertTrue(target['_latest_version_href'].endswith('/versions/1/'))
+        self.assertEqual(len(get_content(target)[SHELTER_CONTENT_NAME]), len(animals))
+
+        animal = animals[0]
+        self.client.post(SHELTER_CONTENT_MODIFY_PATH, {
+            'repository': source['_href'],
+            'remove_natural_keys': [{
+                field: animal[field] for field in ('species', 'breed', 'name', 'shelter')
+            }],
+        })
+        source = self.client.get(source['_href'])
+        self.assertTrue(source['_latest_version_href'].endswith('/versions/2/'))
+        names = {unit['name'] for unit in get_content(source)[SHELTER_CONTENT_NAME]}
+        self.assertNotIn(animal['name'], names)
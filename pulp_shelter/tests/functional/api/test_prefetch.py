@@ -0,0 +1,61 @@
+# coding=utf-8
+"""Tests that download the pictures of a shelter repository synced without them."""
+import unittest
+from urllib.parse import urljoin
+
+from requests.exceptions import HTTPError
+
+from pulp_smash import api, config
+from pulp_smash.pulp3.constants import ARTIFACTS_PATH, REPO_PATH
+from pulp_smash.pulp3.utils import gen_repo, sync
+
+from pulp_shelter.tests.functional.constants import SHELTER_REMOTE_PATH
+from pulp_shelter.tests.functional.utils import gen_shelter_remote
+from pulp_shelter.tests.functional.utils import set_up_module as setUpModule  # noqa:F401
+
+
+class PrefetchTestCase(unittest.TestCase):
+    """Download the pictures of the animals most likely to be viewed."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Create class-wide variables."""
+        cls.cfg = config.get_config()
+        cls.client = api.Client(cls.cfg, api.json_handler)
+
+    def test_invalid_count(self):
+        """Assert that nothing is enqueued without a positive count."""
+        repo = self.client.post(REPO_PATH, gen_repo())
+        self.addCleanup(self.client.delete, repo['_href'])
+        remote = self.client.post(SHELTER_REMOTE_PATH, gen_shelter_remote())
+        self.addCleanup(self.client.delete, remote['_href'])
+
+        for body in ({'repository': repo['_href']}, {'repository': repo['_href'], 'count': 0}):
+            with self.subTest(body=body):
+                with self.assertRaises(HTTPError) as exc:
+                    self.client.post(urljoin(remote['_href'], 'prefetch/'), body)
+                self.assertEqual(exc.exception.response.status_code, 400)
+
+    # Implement sync support before enabling this test.
+    @unittest.skip("FIXME: plugin writer action required")
+    def test_prefetch(self):
+        """Assert that only the requested number of pictures is downloaded.
+
+        Do the following:
+
+        1. Create a repository and an ``on_demand`` remote, and sync them.
+        2. Prefetch a single picture.
+        3. Assert a single artifact was added.
+        """
+        repo = self.client.post(REPO_PATH, gen_repo())
+        self.addCleanup(self.client.delete, repo['_href'])
+        remote = self.client.post(SHELTER_REMOTE_PATH, gen_shelter_remote(policy='on_demand'))
+        self.addCleanup(self.client.delete, remote['_href'])
+        sync(self.cfg, remote, repo)
+
+        artifacts = self.client.get(ARTIFACTS_PATH)['count']
+        self.client.post(urljoin(remote['_href'], 'prefetch/'), {
+            'repository': repo['_href'],
+            'count': 1,
+        })
+        self.assertEqual(self.client.get(ARTIFACTS_PATH)['count'], artifacts + 1)
@@ -0,0 +1,108 @@
+# coding=utf-8
+"""Tests that sync shelter repositories from a mock upstream, at scale and under failures."""
+import unittest
+
+from pulp_smash import api, config
+from pulp_smash.pulp3.constants import REPO_PATH
+from pulp_smash.pulp3.utils import gen_repo, get_content_summary, sync
+
+from pulp_shelter.tests.functional.constants import (
+    SHELTER_CONTENT_NAME,
+    SHELTER_LOAD_ANIMALS,
+    SHELTER_REMOTE_PATH,
+    SHELTER_REMOTES_SYNC_PATH,
+    SHELTER_UPSTREAM_HOST,
+)
+from pulp_shelter.tests.functional.upstream import MockShelterUpstream, ShelterGenerator
+from pulp_shelter.tests.functional.utils import gen_shelter_remote
+from pulp_shelter.tests.functional.utils import set_up_module as setUpModule  # noqa:F401
+
+
+# Implement sync support before enabling this test.
+@unittest.skip("FIXME: plugin writer action required")
+class MockUpstreamSyncTestCase(unittest.TestCase):
+    """Sync repositories from a mock upstream generating its animals."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Create class-wide variables."""
+        cls.cfg = config.get_config()
+        cls.client = api.Client(cls.cfg, api.json_handler)
+
+    def upstream(self, generator, **kwargs):
+        """Start a mock upstream reachable by Pulp, stopped when the test ends."""
+        host = '127.0.0.1' if SHELTER_UPSTREAM_HOST == '127.0.0.1' else '0.0.0.0'
+        upstream = MockShelterUpstream(
+            generator, host=host, public_host=SHELTER_UPSTREAM_HOST, **kwargs
+        )
+        upstream.start()
+        self.addCleanup(upstream.stop)
+        return upstream
+
+    def repo_and_remotes(self, upstream, **kwargs):
+        """Create a repository and a remote for every shard of an upstream."""
+        repo = self.client.post(REPO_PATH, gen_repo())
+        self.addCleanup(self.client.delete, repo['_href'])
+        remotes = []
+        for url in upstream.manifest_urls():
+            remote = self.client.post(SHELTER_REMOTE_PATH, gen_shelter_remote(url=url, **kwargs))
+            self.addCleanup(self.client.delete, remote['_href'])
+            remotes.append(remote)
+        return repo, remotes
+
+    def assert_animals(self, repo, count):
+        """Assert the latest version of a repository holds a number of animals."""
+        repo = self.client.get(repo['_href'])
+        self.assertDictEqual(get_content_summary(repo), {SHELTER_CONTENT_NAME: count})
+
+    def test_load(self):
+        """Sync ``SHELTER_LOAD_ANIMALS`` animals, without their pictures."""
+        upstream = self.upstream(ShelterGenerator(animals=SHELTER_LOAD_ANIMALS))
+        repo, (remote,) = self.repo_and_remotes(upstream, policy='on_demand')
+        sync(self.cfg, remote, repo)
+        self.assert_animals(repo, SHELTER_LOAD_ANIMALS)
+
+    def test_errors(self):
+        """Assert that a sync completes although the upstream fails some requests."""
+        upstream = self.upstream(ShelterGenerator(animals=100), error_rate=0.2)
+        repo, (remote,) = self.repo_and_remotes(upstream)
+        sync(self.cfg, remote, repo)
+        self.assert_animals(repo, 100)
+        self.assertGreater(upstream.requests['GET', 'picture', 503], 0)
+
+    def test_shards(self):
+        """Assert that the shards of an upstream are synced into a single version."""
+        upstream = self.upstream(ShelterGenerator(animals=100, shards=4))
+        repo, remotes = self.repo_and_remotes(upstream)
+        self.client.post(SHELTER_REMOTES_SYNC_PATH, {
+            'repository': repo['_href'],
+            'remotes': [remote['_href'] for remote in remotes],
+        })
+        self.assert_animals(repo, 100)
+
+    def test_not_modified(self):
+        """Assert that pictures without digests are only downloaded again once changed.
+
+        Do the following:
+
+        1. Sync a repository from an upstream whose manifest has no digests.
+        2. Sync it again, and assert every picture was answered ``304 Not Modified``.
+        3. Change half of the pictures, sync again, and assert only those were downloaded.
+        """
+        generator = ShelterGenerator(animals=20, digests=False, changed=0.5)
+        upstream = self.upstream(generator)
+        repo, (remote,) = self.repo_and_remotes(upstream)
+        sync(self.cfg, remote, repo)
+        downloaded = upstream.requests['GET', 'picture', 200]
+        self.assertEqual(downloaded, 20)
+
+        sync(self.cfg, remote, repo)
+        self.assertEqual(upstream.requests['HEAD', 'picture', 304], 20)
+
+        generator.generation += 1
+        changed = sum(
+            generator.picture(index) != ShelterGenerator(animals=20).picture(index)
+            for index in range(20)
+        )
+        sync(self.cfg, remote, repo)
+        self.assertEqual(upstream.requests['GET', 'picture', 200], downloaded + changed)
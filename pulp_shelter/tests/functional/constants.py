@@ -1,4 +1,5 @@
 # coding=utf-8
+import os
 from urllib.parse import urljoin
 
 from pulp_smash.constants import PULP_FIXTURES_BASE_URL
@@ -20,6 +21,10 @@ SHELTER_CONTENT_NAME = 'shelter.unit'
 # FIXME: replace 'unit' with your own content type names, and duplicate as necessary for each type
 SHELTER_CONTENT_PATH = urljoin(CONTENT_PATH, 'shelter/units/')
 
+SHELTER_CONTENT_DIFF_PATH = urljoin(SHELTER_CONTENT_PATH, 'diff/')
+
+SHELTER_CONTENT_MODIFY_PATH = urljoin(SHELTER_CONTENT_PATH, 'modify/')
+
 SHELTER_REMOTE_PATH = urljoin(BASE_REMOTE_PATH, 'shelter/shelter/')
 
 SHELTER_PUBLISHER_PATH = urljoin(BASE_PUBLISHER_PATH, 'shelter/shelter/')
@@ -43,3 +48,11 @@ SHELTER_LARGE_FIXTURE_URL = urljoin(PULP_FIXTURES_BASE_URL, 'shelter_large/')
 
 # FIXME: replace this with the actual number of content units in your test fixture
 SHELTER_LARGE_FIXTURE_COUNT = 25
+
+SHELTER_REMOTES_SYNC_PATH = urljoin(SHELTER_REMOTE_PATH, 'sync/')
+
+# The host Pulp reaches the mock upstream of the tests at, see upstream.MockShelterUpstream.
+SHELTER_UPSTREAM_HOST = os.environ.get('SHELTER_UPSTREAM_HOST', '127.0.0.1')
+
+# The number of animals of the load tests, which sync them from a mock upstream.
+SHELTER_LOAD_ANIMALS = int(os.environ.get('SHELTER_LOAD_ANIMALS', 1000000))
@@ -0,0 +1,318 @@
+# coding=utf-8
+"""A local shelter upstream, for sync tests at any scale without network access.
+
+The manifests and pictures served are generated from a seed, so two upstreams with the same
+parameters serve the same bytes, and nothing is kept in memory: an entry or picture is made
+when it is asked for. The animals can be split into several manifests, served as shards at
+``/shard-<n>/animals.ndjson``. Latency, bandwidth, errors and ``ETag`` handling are set per
+upstream, to test how sync behaves when an upstream is slow or failing::
+
+    with MockShelterUpstream(ShelterGenerator(animals=1000000, shards=4),
+                             error_rate=0.01) as upstream:
+        remotes = [gen_shelter_remote(url=url) for url in upstream.manifest_urls()]
+
+Only the standard library is used, so the upstream runs wherever the tests do.
+"""
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+BREEDS = {
+    'cat': ('siamese', 'persian', 'maine coon', 'sphynx', 'bengal'),
+    'dog': ('beagle', 'boxer', 'poodle', 'labrador', 'dachshund'),
+    'rabbit': ('rex', 'lionhead', 'dutch'),
+    'parrot': ('macaw', 'cockatoo', 'budgerigar'),
+}
+
+SEXES = ('male', 'female', 'hermaphrodite', 'unknown')
+
+WORDS = ('friendly', 'shy', 'playful', 'calm', 'loves', 'children', 'walks', 'naps', 'food',
+         'toys', 'garden', 'other', 'pets', 'quiet', 'curious', 'old', 'young', 'cuddly')
+
+# The number of manifest entries sent at once.
+CHUNK_ENTRIES = 256
+
+PATH = re.compile(r'^/shard-(?P<shard>\d+)/(?:animals\.ndjson|pictures/(?P<index>\d+)\.jpg)$')
+
+ETAG_MODES = ('strong', 'weak', 'ignored', 'none')
+
+
+class ShelterGenerator:
+    """Generate the manifest entries and pictures of an upstream from a seed.
+
+    Every entry and picture is derived from the seed and the index of its animal alone, so any
+    of them is made in constant time and memory, in any order.
+    """
+
+    def __init__(self, seed=0, animals=1000, shards=1, shelters=100,
+                 picture_sizes=(256, 4096), digests=True, changed=0.0, generation=0):
+        """Generate the manifest entries and pictures of an upstream.
+
+        :param seed: What the animals and pictures are derived from.
+        :param animals: The number of animals.
+        :param shards: The number of manifests the animals are dealt into.
+        :param shelters: The number of distinct shelters.
+        :param picture_sizes: The smallest and largest size of a picture, in bytes.
+        :param digests: Whether entries carry the digest of their picture.
+        :param changed: The share of the pictures that differ between generations.
+        :param generation: The generation of the changed pictures.
+        """
+        self.seed = seed
+        self.animals = animals
+        self.shards = shards
+        self.shelters = shelters
+        self.picture_sizes = picture_sizes
+        self.digests = digests
+        self.changed = changed
+        self.generation = generation
+
+    def random(self, index, purpose):
+        """Return the random generator of one purpose of an animal."""
+        return random.Random('{}-{}-{}'.format(self.seed, index, purpose))
+
+    def entry(self, index):
+        """Return the manifest entry of an animal.
+
+        :param index: The index of the animal.
+        :returns: A dict of the fields of the entry.
+        """
+        rng = self.random(index, 'entry')
+        species = rng.choice(sorted(BREEDS))
+        entry = {
+            'species': species,
+            'breed': rng.choice(BREEDS[species]),
+            'name': 'Animal {}'.format(index),
+            'age': rng.randint(0, 20),
+            'sex': rng.choice(SEXES),
+            'weight': round(rng.uniform(0.1, 60), 1),
+            'bio': ' '.join(rng.choice(WORDS) for _ in range(rng.randint(3, 12))),
+            'shelter': 'Shelter {}'.format(rng.randrange(self.shelters)),
+            'reserved': rng.random() < 0.2,
+            'picture': 'pictures/{}.jpg'.format(index),
+        }
+        if self.digests:
+            picture = self.picture(index)
+            entry['size'] = len(picture)
+            entry['sha256'] = hashlib.sha256(picture).hexdigest()
+        return entry
+
+    def picture(self, index):
+        """Return the bytes of the picture of an animal.
+
+        :param index: The index of the animal.
+        :returns: The picture, of the current generation if it is one of those changing.
+        """
+        rng = self.random(index, 'picture')
+        size = rng.randint(*self.picture_sizes)
+        generation = self.generation if rng.random() < self.changed else 0
+        block = hashlib.blake2b(
+            '{}-{}-{}'.format(self.seed, index, generation).encode(), digest_size=64
+        ).digest()
+        return (block * (size // len(block) + 1))[:size]
+
+    def shard(self, shard):
+        """Return the indexes of the animals of a manifest, which are dealt in turn."""
+        return range(shard, self.animals, self.shards)
+
+    def manifest(self, shard):
+        """Yield the manifest of a shard, a chunk of lines at a time.
+
+        :param shard: The index of the shard.
+        :returns: An iterator of bytes.
+        """
+        indexes = self.shard(shard)
+        for start in range(0, len(indexes), CHUNK_ENTRIES):
+            yield ''.join(
+                json.dumps(self.entry(index), sort_keys=True) + '\n'
+                for index in indexes[start:start + CHUNK_ENTRIES]
+            ).encode()
+
+
+class UpstreamHandler(BaseHTTPRequestHandler):
+    """Serve the manifests and pictures of a :class:`MockShelterUpstream`."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):  # noqa: N802
+        """Serve a GET request."""
+        self.respond(body=True)
+
+    def do_HEAD(self):  # noqa: N802
+        """Serve a HEAD request."""
+        self.respond(body=False)
+
+    def log_message(self, format, *args):
+        """Keep the output of the tests clean."""
+
+    def respond(self, body):
+        """Serve a request for a manifest or a picture.
+
+        :param body: Whether to send the body of the response.
+        """
+        upstream = self.server.upstream
+        generator = upstream.generator
+        if upstream.latency:
+            time.sleep(upstream.latency)
+
+        match = PATH.match(self.path.split('?')[0])
+        if match is None or int(match.group('shard')) >= generator.shards:
+            return self.empty('other', 404)
+        index = match.group('index')
+        kind = 'manifest' if index is None else 'picture'
+        if index is not None and int(index) >= generator.animals:
+            return self.empty(kind, 404)
+        if upstream.fail():
+            return self.empty(kind, upstream.error_status, {'Retry-After': '0'})
+
+        if kind == 'manifest':
+            upstream.count(self.command, kind, 200)
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/x-ndjson')
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            if body:
+                for chunk in generator.manifest(int(match.group('shard'))):
+                    self.send_body(b'%x\r\n%s\r\n' % (len(chunk), chunk))
+                self.send_body(b'0\r\n\r\n')
+            return
+
+        picture = generator.picture(int(index))
+        headers = {'Content-Type': 'image/jpeg'}
+        etag = '"{}"'.format(hashlib.sha256(picture).hexdigest())
+        if upstream.etag == 'weak':
+            etag = 'W/' + etag
+        if upstream.etag != 'none':
+            headers['ETag'] = etag
+            if upstream.etag != 'ignored' and self.headers.get('If-None-Match') == etag:
+                return self.empty(kind, 304, headers)
+        upstream.count(self.command, kind, 200)
+        self.send_response(200)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(picture)))
+        self.end_headers()
+        if body:
+            self.send_body(picture)
+
+    def empty(self, kind, status, headers=None):
+        """Send a response without a body."""
+        self.server.upstream.count(self.command, kind, status)
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if status != 304:
+            self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def send_body(self, data):
+        """Send bytes, no faster than the bandwidth of the upstream."""
+        bandwidth = self.server.upstream.bandwidth
+        if not bandwidth:
+            self.wfile.write(data)
+            return
+        # Send a tenth of a second worth of bytes at a time.
+        step = max(1, bandwidth // 10)
+        for start in range(0, len(data), step):
+            piece = data[start:start + step]
+            self.wfile.write(piece)
+            time.sleep(len(piece) / bandwidth)
+
+
+class UpstreamServer(ThreadingMixIn, HTTPServer):
+    """Serve every connection in a thread of its own."""
+
+    daemon_threads = True
+
+
+class MockShelterUpstream:
+    """Serve generated shelter manifests and pictures from a local HTTP server.
+
+    Every response is counted in :attr:`requests`, by method, kind (``manifest``, ``picture``
+    or ``other``) and status.
+    """
+
+    def __init__(self, generator=None, host='127.0.0.1', port=0, public_host=None,
+                 latency=0.0, bandwidth=None, error_rate=0.0, error_status=503,
+                 etag='strong'):
+        """Serve generated shelter manifests and pictures from a local HTTP server.
+
+        :param generator: The :class:`ShelterGenerator` of what is served, a default one if
+            None.
+        :param host: The address to listen on.
+        :param port: The port to listen on, any free one if 0.
+        :param public_host: The host Pulp reaches the upstream at, ``host`` if None.
+        :param latency: The seconds to wait before answering every request.
+        :param bandwidth: The bytes per second every response is sent at, None for no limit.
+        :param error_rate: The share of the requests answered with ``error_status``.
+        :param error_status: The status of failed requests, sent with ``Retry-After: 0``.
+        :param etag: How pictures are tagged: with a ``strong`` or ``weak`` ``ETag`` honoured
+            by ``If-None-Match``, with an ``ignored`` one, or with ``none``.
+        """
+        if etag not in ETAG_MODES:
+            raise ValueError('etag must be one of: {}'.format(', '.join(ETAG_MODES)))
+        self.generator = generator or ShelterGenerator()
+        self.host = host
+        self.port = port
+        self.public_host = public_host or host
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.etag = etag
+        self.requests = Counter()
+        self.server = None
+        self.thread = None
+        self._lock = threading.Lock()
+        self._random = random.Random(self.generator.seed)
+
+    def start(self):
+        """Start serving in a background thread."""
+        self.server = UpstreamServer((self.host, self.port), UpstreamHandler)
+        self.server.upstream = self
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stop serving."""
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+    def __enter__(self):
+        """Start serving."""
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        """Stop serving."""
+        self.stop()
+
+    @property
+    def url(self):
+        """Return the base URL of the upstream."""
+        return 'http://{}:{}/'.format(self.public_host, self.port)
+
+    def manifest_url(self, shard=0):
+        """Return the URL of the manifest of a shard, to create a remote with."""
+        return '{}shard-{}/animals.ndjson'.format(self.url, shard)
+
+    def manifest_urls(self):
+        """Return the URLs of the manifests of every shard."""
+        return [self.manifest_url(shard) for shard in range(self.generator.shards)]
+
+    def fail(self):
+        """Tell whether to fail the current request."""
+        with self._lock:
+            return self._random.random() < self.error_rate
+
+    def count(self, method, kind, status):
+        """Count a response."""
+        with self._lock:
+            self.requests[method, kind, status] += 1
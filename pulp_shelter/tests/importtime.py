@@ -0,0 +1,96 @@
+"""Profile how long loading the plugin takes, and which of its modules it imports.
+
+Every API and task worker loads the plugin when Django sets up its apps, and API workers import
+its viewsets. Run this module to list the modules of the plugin they import, the slowest first,
+with the time spent importing each and the modules it imported first::
+
+    DJANGO_SETTINGS_MODULE=pulpcore.app.settings python -m pulp_shelter.tests.importtime
+
+Import times are measured with the ``-X importtime`` option of Python 3.7 and later.
+"""
+import os
+import subprocess
+import sys
+
+# Set Django up as a worker does, and import the viewsets, which are loaded by API workers.
+SETUP = 'import django; django.setup(); import pulp_shelter.app.viewsets'
+
+PLUGIN = 'pulp_shelter'
+
+
+def run(statement):
+    """Run a statement in a new interpreter, with the Django settings of the current one.
+
+    :param statement: The Python code to run.
+    :returns: The completed process, with its standard output and error as text.
+    """
+    env = dict(os.environ)
+    env.setdefault('DJANGO_SETTINGS_MODULE', 'pulpcore.app.settings')
+    return subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', statement], env=env, check=True,
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True
+    )
+
+
+def parse(output):
+    """Parse the report of ``-X importtime``.
+
+    :param output: The standard error of an interpreter run with ``-X importtime``.
+    :returns: A list of tuples of the module name, its nesting depth, and the microseconds
+        spent importing the module itself and along with what it imported first, in the
+        order the imports completed.
+    """
+    imports = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        imports.append((name.strip(), depth, int(own), int(cumulative)))
+    return imports
+
+
+def plugin_imports(imports):
+    """Select the outermost imports of the plugin modules.
+
+    :param imports: Imports, as returned by :func:`parse`.
+    :returns: A list of the tuples of the plugin modules not imported by another plugin module.
+        Their cumulative times add up to the cost of loading the plugin.
+    """
+    selected = []
+    # The depth of the plugin import being inside of, walking the imports backwards.
+    outer = None
+    for name, depth, own, cumulative in reversed(imports):
+        if outer is not None and depth <= outer:
+            outer = None
+        if outer is None and name.split('.')[0] == PLUGIN:
+            selected.append((name, depth, own, cumulative))
+            outer = depth
+    return selected[::-1]
+
+
+def profile(statement=SETUP):
+    """Measure the plugin imports of a statement.
+
+    :param statement: The Python code to run, setting up Django by default.
+    :returns: The outermost plugin imports, as returned by :func:`plugin_imports`.
+    """
+    return plugin_imports(parse(run(statement).stderr))
+
+
+def imported_modules(statement=SETUP):
+    """List the modules a statement leaves imported.
+
+    :param statement: The Python code to run, setting up Django by default.
+    :returns: A set of module names.
+    """
+    output = run(statement + '; import sys; print("\\n".join(sys.modules))').stdout
+    return set(output.split())
+
+
+if __name__ == '__main__':
+    imports = profile()
+    print('{:>10} {:>10}  {}'.format('total [ms]', 'own [ms]', 'module'))
+    for name, depth, own, cumulative in sorted(imports, key=lambda item: -item[3]):
+        print('{:10.1f} {:10.1f}  {}'.format(cumulative / 1000, own / 1000, name))
+    print('{:10.1f} {:>10}  {}'.format(sum(item[3] for item in imports) / 1000, '', 'total'))
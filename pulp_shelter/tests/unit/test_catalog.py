@@ -0,0 +1,63 @@
+import gzip
+import json
+import os
+from tempfile import TemporaryDirectory
+
+from django.test import TestCase
+
+from pulp_shelter.app.catalog import CatalogWriter
+
+
+class TestCatalogWriter(TestCase):
+    """Test writing the catalog of a publication."""
+
+    shelters = {
+        'Brno': [{'name': 'Tom', 'species': 'cat'}, {'name': 'Rex', 'species': 'dog'}],
+        'Prague': [{'name': 'Kitty', 'species': 'cat'}],
+    }
+
+    def setUp(self):
+        """Write the catalog into a temporary working directory."""
+        cwd = os.getcwd()
+        working_dir = TemporaryDirectory()
+        self.addCleanup(working_dir.cleanup)
+        self.addCleanup(os.chdir, cwd)
+        os.chdir(working_dir.name)
+
+        with CatalogWriter() as catalog:
+            for shelter, entries in self.shelters.items():
+                catalog.write_shelter(shelter, entries)
+        self.paths = catalog.paths
+        with open('index.json') as fp:
+            self.index = json.load(fp)
+
+    def read_range(self, name, shelter):
+        """Return the bytes of a shelter within a catalog file."""
+        offset, length = self.index['shelters'][shelter]['ranges'][name]
+        with open(name, 'rb') as fp:
+            fp.seek(offset)
+            return fp.read(length)
+
+    def test_paths(self):
+        """Test that the index is written last."""
+        self.assertEqual(self.paths[:2], ['animals.ndjson', 'animals.ndjson.gz'])
+        self.assertEqual(self.paths[-1], 'index.json')
+
+    def test_whole_files(self):
+        """Test that every catalog file holds all animals."""
+        with open('animals.ndjson', 'rb') as fp:
+            plain = fp.read()
+        with gzip.open('animals.ndjson.gz') as fp:
+            self.assertEqual(fp.read(), plain)
+        self.assertEqual(len(plain.splitlines()), 3)
+        self.assertEqual(self.index['files']['animals.ndjson']['size'], len(plain))
+
+    def test_shelter_ranges(self):
+        """Test that each shelter can be read on its own from every catalog file."""
+        for shelter, entries in self.shelters.items():
+            with self.subTest(shelter=shelter):
+                self.assertEqual(self.index['shelters'][shelter]['count'], len(entries))
+                plain = self.read_range('animals.ndjson', shelter)
+                self.assertEqual([json.loads(line) for line in plain.splitlines()], entries)
+                compressed = self.read_range('animals.ndjson.gz', shelter)
+                self.assertEqual(gzip.decompress(compressed), plain)
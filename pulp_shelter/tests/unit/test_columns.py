@@ -0,0 +1,124 @@
+import os
+from tempfile import TemporaryDirectory
+from types import SimpleNamespace
+from unittest import mock, skipIf
+from uuid import UUID
+
+from django.test import TestCase
+
+from pulp_shelter.app import columns
+from pulp_shelter.app.columns import ColumnSnapshot, SnapshotCache, write_columns
+
+
+ROWS = [
+    (UUID(int=1), 'cat', 'siamese', 'Brno', 'female', 2, 4.0, False, 'Playful and cuddly.'),
+    (UUID(int=2), 'cat', 'persian', 'Brno', 'male', 12, 6.5, False, 'A calm old gentleman.'),
+    (UUID(int=3), 'dog', 'beagle', 'Prague', 'female', 3, 20.0, False,
+     'Loves long walks, playful.'),
+    (UUID(int=4), 'cat', 'siamese', 'Prague', 'female', 3, 4.5, True, 'Playful and cuddly too.'),
+    (UUID(int=5), 'cat', 'siamese', 'Brno', 'male', 1, 40.0, False, 'Shy.'),
+]
+
+
+@skipIf(columns.numpy is None, 'numpy is not installed')
+class TestColumnSnapshot(TestCase):
+    """Test the columnar snapshot of animals."""
+
+    def setUp(self):
+        """Write a few animals into a snapshot."""
+        self.directory = TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'version')
+        write_columns(self.path, ROWS)
+        self.snapshot = ColumnSnapshot(self.path)
+
+    def tearDown(self):
+        """Remove the snapshot."""
+        self.directory.cleanup()
+
+    def test_columns(self):
+        """Test that fields are read back from memory-mapped columns."""
+        self.assertEqual(len(self.snapshot), 5)
+        self.assertEqual(self.snapshot.dictionaries['species'], ['cat', 'dog'])
+        self.assertEqual(self.snapshot['species'].tolist(), [0, 0, 1, 0, 0])
+        self.assertEqual(self.snapshot['age'].tolist(), [2, 12, 3, 3, 1])
+        self.assertEqual(self.snapshot.code('breed', 'siamese'), 2)
+        self.assertIsNone(self.snapshot.code('breed', 'lop'))
+        self.assertEqual(self.snapshot.pks([4, 0]), [UUID(int=5), UUID(int=1)])
+        self.assertEqual(self.snapshot.word_hits(['playful', 'cuddly']).tolist(), [2, 0, 1, 2, 0])
+
+    def test_counts(self):
+        """Test counting animals by a categorical field, within groups."""
+        self.assertEqual(self.snapshot.counts('breed'),
+                         {'beagle': 1, 'persian': 1, 'siamese': 3})
+        self.assertEqual(self.snapshot.counts('sex', group_by='shelter'), {
+            'Brno': {'female': 1, 'male': 2},
+            'Prague': {'female': 2},
+        })
+
+    def test_describe(self):
+        """Test summarizing a numeric field, with its outliers."""
+        summary = self.snapshot.describe('weight')
+        self.assertEqual(summary['count'], 5)
+        self.assertEqual(summary['quartiles'], [4.5, 6.5, 20.0])
+        self.assertEqual(summary['outliers'], 0)
+        summary = self.snapshot.describe('weight', group_by='species')['cat']
+        self.assertEqual(summary['count'], 4)
+        self.assertEqual(summary['max'], 40.0)
+        self.assertEqual(summary['outliers'], 1)
+
+    def test_rewrite(self):
+        """Test that a snapshot written meanwhile by another process is kept."""
+        write_columns(self.path, ROWS[:1])
+        self.assertEqual(len(ColumnSnapshot(self.path)), 5)
+        self.assertEqual(os.listdir(self.directory.name), ['version'])
+
+    def test_empty(self):
+        """Test the snapshot of a version without animals."""
+        path = os.path.join(self.directory.name, 'empty')
+        write_columns(path, [])
+        snapshot = ColumnSnapshot(path)
+        self.assertEqual(len(snapshot), 0)
+        self.assertEqual(snapshot.counts('species'), {})
+
+
+class TestSnapshotCache(TestCase):
+    """Test keeping the snapshots of repository versions open."""
+
+    def version(self, repository, number):
+        """Return a repository version."""
+        return SimpleNamespace(pk='{}-{}'.format(repository, number), repository_id=repository,
+                               number=number)
+
+    @mock.patch('pulp_shelter.app.columns.read_columns', lambda version: version.pk)
+    def test_newer_version(self):
+        """Test that using a newer version of a repository drops the older ones."""
+        cache = SnapshotCache(maxsize=4)
+        cache.get(self.version('cats', 1))
+        cache.get(self.version('dogs', 1))
+        cache.get(self.version('cats', 2))
+        self.assertEqual(list(cache.snapshots), ['dogs-1', 'cats-2'])
+        self.assertEqual(cache.get(self.version('cats', 2)), 'cats-2')
+
+    @mock.patch('pulp_shelter.app.columns.read_columns', lambda version: version.pk)
+    def test_invalidate(self):
+        """Test that the snapshots of a repository, or of a version, are dropped."""
+        cache = SnapshotCache(maxsize=4)
+        cache.get(self.version('cats', 1))
+        cache.get(self.version('dogs', 1))
+        cache.invalidate(repository_pk='cats')
+        self.assertEqual(list(cache.snapshots), ['dogs-1'])
+        cache.invalidate(repository_version_pk='dogs-1')
+        self.assertEqual(list(cache.snapshots), [])
+
+    def test_read_unlocked(self):
+        """Test that snapshots are read without holding the lock, and not kept if invalidated."""
+        cache = SnapshotCache(maxsize=4)
+
+        def read_columns(version):
+            self.assertFalse(cache.lock.locked())
+            cache.invalidate(repository_pk='dogs')
+            return version.pk
+
+        with mock.patch('pulp_shelter.app.columns.read_columns', read_columns):
+            self.assertEqual(cache.get(self.version('cats', 1)), 'cats-1')
+        self.assertEqual(list(cache.snapshots), [])
@@ -0,0 +1,28 @@
+from django.test import TestCase
+
+from pulp_shelter.app.downloaders import response_validators
+
+
+class TestResponseValidators(TestCase):
+    """Test picking the validators of a response."""
+
+    def test_validators(self):
+        """Test that ETag, Last-Modified and Content-Length are picked."""
+        headers = {
+            'ETag': '"5b2b"',
+            'Last-Modified': 'Wed, 21 Oct 2015 07:28:00 GMT',
+            'Content-Length': '2048',
+            'Content-Type': 'image/jpeg',
+        }
+        self.assertEqual(response_validators(headers), {
+            'etag': '"5b2b"',
+            'last_modified': 'Wed, 21 Oct 2015 07:28:00 GMT',
+            'size': 2048,
+        })
+
+    def test_missing(self):
+        """Test that validators which are not sent are None."""
+        self.assertEqual(
+            response_validators({}),
+            {'etag': None, 'last_modified': None, 'size': None}
+        )
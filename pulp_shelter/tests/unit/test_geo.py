@@ -0,0 +1,57 @@
+import math
+
+from django.test import TestCase
+
+from pulp_shelter.app.geo import EARTH_RADIUS, cell_ranges, distance, grid_cell
+
+
+class TestGeo(TestCase):
+    """Test the geometry of finding shelters near a point."""
+
+    def test_distance(self):
+        """Test the great-circle distance between two cities, and across the antimeridian."""
+        self.assertAlmostEqual(distance(49.1951, 16.6068, 50.0755, 14.4378), 185, delta=1)
+        self.assertAlmostEqual(distance(0, 179.5, 0, -179.5), 111.2, delta=0.1)
+        self.assertEqual(distance(10, 20, 10, 20), 0)
+
+    def test_grid_cell(self):
+        """Test that points are bucketed by whole degrees, wrapping the longitude."""
+        self.assertEqual(grid_cell(49.1951, 16.6068), (49, 196))
+        self.assertEqual(grid_cell(-0.5, -180), (-1, 0))
+        self.assertEqual(grid_cell(0, 180), (0, 0))
+
+    def test_cell_ranges(self):
+        """Test that the cells of a circle cover every point within its radius."""
+        latitude, longitude, radius = 49.1951, 16.6068, 200
+        latitudes, longitude_ranges = cell_ranges(latitude, longitude, radius)
+        for bearing in range(0, 360, 15):
+            for fraction in (0.5, 0.99):
+                point = destination(latitude, longitude, bearing, radius * fraction)
+                cell_latitude, cell_longitude = grid_cell(*point)
+                self.assertTrue(latitudes[0] <= cell_latitude <= latitudes[1])
+                self.assertTrue(any(
+                    start <= cell_longitude <= end for start, end in longitude_ranges
+                ))
+
+    def test_cell_ranges_antimeridian(self):
+        """Test that a circle across the antimeridian spans both of its sides."""
+        latitudes, longitude_ranges = cell_ranges(0, 179.5, 200)
+        self.assertEqual(latitudes, (-2, 1))
+        self.assertEqual(longitude_ranges, [(357, 359), (0, 1)])
+
+    def test_cell_ranges_pole(self):
+        """Test that a circle around a pole spans every longitude."""
+        latitudes, longitude_ranges = cell_ranges(89, 0, 300)
+        self.assertEqual(latitudes, (86, 90))
+        self.assertEqual(longitude_ranges, [(0, 359)])
+
+
+def destination(latitude, longitude, bearing, kilometres):
+    """Return the point a distance away from another, along a bearing."""
+    angle = kilometres / EARTH_RADIUS
+    phi, theta = math.radians(latitude), math.radians(bearing)
+    sine = math.sin(phi) * math.cos(angle) + math.cos(phi) * math.sin(angle) * math.cos(theta)
+    other_phi = math.asin(sine)
+    delta_lambda = math.atan2(math.sin(theta) * math.sin(angle) * math.cos(phi),
+                              math.cos(angle) - math.sin(phi) * math.sin(other_phi))
+    return math.degrees(other_phi), longitude + math.degrees(delta_lambda)
@@ -0,0 +1,41 @@
+import io
+import tarfile
+
+from django.test import TestCase
+
+from pulp_shelter.app.tasks.importing import is_relative, safe_members
+
+
+class TestSafeMembers(TestCase):
+    """Test which archive members are extracted during an import."""
+
+    def make_archive(self, *names):
+        """Return an in-memory tarball with an empty regular file for each name."""
+        fp = io.BytesIO()
+        with tarfile.open(fileobj=fp, mode='w') as tarball:
+            for name in names:
+                tarball.addfile(tarfile.TarInfo(name), io.BytesIO())
+        fp.seek(0)
+        return tarfile.open(fileobj=fp)
+
+    def test_relative_paths(self):
+        """Test that paths within the archive root are relative."""
+        for path in ('animals.ndjson', 'cats/tom.jpg', 'cats/../dogs/rex.jpg'):
+            with self.subTest(path=path):
+                self.assertTrue(is_relative(path))
+
+    def test_escaping_paths(self):
+        """Test that absolute paths and paths escaping the archive root are rejected."""
+        for path in ('/etc/passwd', '..', '../tom.jpg', 'cats/../../tom.jpg'):
+            with self.subTest(path=path):
+                self.assertFalse(is_relative(path))
+
+    def test_members(self):
+        """Test that regular files are extracted and escaping members abort the import."""
+        tarball = self.make_archive('animals.ndjson', 'cats/tom.jpg')
+        self.assertEqual(
+            [member.name for member in safe_members(tarball)],
+            ['animals.ndjson', 'cats/tom.jpg']
+        )
+        with self.assertRaises(ValueError):
+            list(safe_members(self.make_archive('animals.ndjson', '../tom.jpg')))
@@ -0,0 +1,61 @@
+import sys
+from unittest import skipIf
+
+from django.test import TestCase
+
+from pulp_shelter.tests.importtime import imported_modules, parse, plugin_imports, profile
+
+
+# The seconds loading the plugin may take at most, with a margin for slow machines.
+IMPORT_TIME_BUDGET = 0.5
+
+# Modules only imported by the tasks using them, or on first use.
+LAZY_MODULES = (
+    'numpy',
+    'pulp_shelter.app.stages',
+    'pulp_shelter.app.tasks.exporting',
+    'pulp_shelter.app.tasks.importing',
+    'pulp_shelter.app.tasks.modifying',
+    'pulp_shelter.app.tasks.planning',
+    'pulp_shelter.app.tasks.prefetching',
+    'pulp_shelter.app.tasks.publishing',
+    'pulp_shelter.app.tasks.retention',
+    'pulp_shelter.app.tasks.synchronizing',
+)
+
+REPORT = """\
+import time: self [us] | cumulative | imported package
+import time:       100 |        100 |       pulp_shelter.app.geo
+import time:       300 |        300 |         numpy
+import time:       200 |        500 |       pulp_shelter.app.columns
+import time:       400 |       1000 |     pulp_shelter.app.models
+import time:        50 |         50 |     json
+import time:        70 |       1120 |   pulpcore.app.models
+import time:        10 |         10 |   pulp_shelter.app.utils
+"""
+
+
+class TestImportTime(TestCase):
+    """Test the time it takes to load the plugin."""
+
+    def test_plugin_imports(self):
+        """Test that only the outermost plugin imports of a report are selected."""
+        imports = plugin_imports(parse(REPORT))
+        self.assertEqual(imports, [
+            ('pulp_shelter.app.models', 2, 400, 1000),
+            ('pulp_shelter.app.utils', 1, 10, 10),
+        ])
+
+    def test_lazy_modules(self):
+        """Test that loading the plugin imports no task, stage nor numpy."""
+        modules = imported_modules()
+        self.assertIn('pulp_shelter.app.viewsets', modules)
+        for module in LAZY_MODULES:
+            with self.subTest(module=module):
+                self.assertNotIn(module, modules)
+
+    @skipIf(sys.version_info < (3, 7), 'import times are measured from Python 3.7')
+    def test_import_time(self):
+        """Test that loading the plugin stays within its budget."""
+        imports = profile()
+        self.assertLess(sum(cumulative for *_, cumulative in imports) / 1e6, IMPORT_TIME_BUDGET)
@@ -0,0 +1,36 @@
+from django.test import TestCase
+
+from pulp_shelter.app.lookup import ContentLookup
+from pulp_shelter.app.models import Animal
+
+
+def animal(name):
+    """Return an unsaved animal."""
+    return Animal(species='cat', breed='siamese', name=name, shelter='Brno')
+
+
+class TestContentLookup(TestCase):
+    """Test the cache of animals by natural key."""
+
+    def setUp(self):
+        """Create a cache of two animals."""
+        self.lookup = ContentLookup(maxsize=2)
+
+    def put(self, name, pk):
+        """Cache an animal."""
+        self.lookup.put(('cat', 'siamese', name, 'Brno'), pk)
+
+    def test_get(self):
+        """Test that animals are found by natural key."""
+        self.put('Kitty', 1)
+        self.assertEqual(self.lookup.get(animal('Kitty')), 1)
+        self.assertIsNone(self.lookup.get(animal('Tom')))
+
+    def test_full(self):
+        """Test that animals beyond the size of the cache are not cached."""
+        self.put('Kitty', 1)
+        self.put('Tom', 2)
+        self.put('Felix', 3)
+        self.assertEqual(len(self.lookup), 2)
+        self.assertEqual(self.lookup.get(animal('Tom')), 2)
+        self.assertIsNone(self.lookup.get(animal('Felix')))
@@ -0,0 +1,69 @@
+import io
+import json
+
+from django.test import TestCase
+
+from pulp_shelter.app.manifest import AnimalRecord, InvalidLine, read_manifest, read_records
+
+
+class TestAnimalRecord(TestCase):
+    """Test the compact form of manifest entries."""
+
+    entry = {
+        'species': 'cat',
+        'breed': 'siamese',
+        'name': 'Kitty',
+        'age': 3,
+        'weight': 4.2,
+        'bio': 'Purrs a lot.',
+        'shelter': 'Brno',
+        'picture': 'cats/kitty.jpg',
+        'sha256': '0' * 64,
+    }
+
+    def test_from_entry(self):
+        """Test that missing fields are None and repeated values are shared."""
+        record = AnimalRecord.from_entry(self.entry)
+        other = AnimalRecord.from_entry(dict(self.entry, shelter=''.join(['Br', 'no'])))
+        self.assertEqual(record.name, 'Kitty')
+        self.assertEqual(record.sha256, '0' * 64)
+        self.assertIsNone(record.size)
+        self.assertIsNone(record.sex)
+        self.assertIs(record.shelter, other.shelter)
+        self.assertFalse(hasattr(record, '__dict__'))
+
+    def test_animal(self):
+        """Test that the animal gets the manifest fields, and defaults for missing ones."""
+        animal = AnimalRecord.from_entry(self.entry).animal()
+        self.assertEqual(animal.name, 'Kitty')
+        self.assertEqual(animal.picture, 'cats/kitty.jpg')
+        self.assertEqual(animal.sex, 'unknown')
+        self.assertFalse(animal.reserved)
+
+
+class TestReadRecords(TestCase):
+    """Test reading the records of a manifest with invalid lines."""
+
+    lines = [
+        json.dumps({'name': 'Kitty', 'shelter': 'Brno'}),
+        '',
+        '{"name": "Kitty"',
+        '["Kitty"]',
+        json.dumps({'name': 'Rex', 'shelter': 'Brno'}),
+    ]
+
+    def test_read_records(self):
+        """Test that invalid lines are returned with their number, between the records."""
+        records = list(read_records(io.StringIO('\n'.join(self.lines))))
+        self.assertEqual([type(record) for record in records],
+                         [AnimalRecord, InvalidLine, InvalidLine, AnimalRecord])
+        self.assertEqual(records[0].name, 'Kitty')
+        self.assertEqual(records[1].number, 3)
+        self.assertEqual(records[1].text, '{"name": "Kitty"')
+        self.assertEqual(records[2].number, 4)
+        self.assertEqual(records[3].name, 'Rex')
+
+    def test_read_manifest(self):
+        """Test that a line which is not a JSON object stops reading entries."""
+        with self.assertRaises(ValueError):
+            list(read_manifest(io.StringIO('\n'.join(self.lines[:1] + self.lines[3:]))))
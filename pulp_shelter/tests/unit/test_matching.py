@@ -0,0 +1,68 @@
+import os
+from tempfile import TemporaryDirectory
+from unittest import skipIf
+from uuid import UUID
+
+from django.test import TestCase
+
+from pulp_shelter.app import matching
+from pulp_shelter.app.columns import ColumnSnapshot, write_columns
+from pulp_shelter.app.matching import Ranker
+
+
+ROWS = [
+    (UUID(int=1), 'cat', 'siamese', 'Brno', 'female', 2, 4.0, False, 'Playful and cuddly.'),
+    (UUID(int=2), 'cat', 'persian', 'Brno', 'male', 12, 6.5, False, 'A calm old gentleman.'),
+    (UUID(int=3), 'dog', 'beagle', 'Prague', 'female', 3, 20.0, False,
+     'Loves long walks, playful.'),
+    (UUID(int=4), 'cat', 'siamese', 'Prague', 'female', 3, 4.5, True, 'Playful and cuddly too.'),
+    (UUID(int=5), 'rabbit', 'lop', 'Brno', 'unknown', 1, 2.0, False, 'Shy.'),
+]
+
+
+@skipIf(matching.numpy is None, 'numpy is not installed')
+class TestRanker(TestCase):
+    """Test ranking animals against the profile of an adopter."""
+
+    def setUp(self):
+        """Write a few animals into a snapshot."""
+        self.directory = TemporaryDirectory()
+        path = os.path.join(self.directory.name, 'version')
+        write_columns(path, ROWS)
+        self.ranker = Ranker(ColumnSnapshot(path))
+
+    def tearDown(self):
+        """Remove the snapshot."""
+        self.directory.cleanup()
+
+    def test_top(self):
+        """Test that animals are ranked by every criterion, and reserved ones left out."""
+        profile = {'species': ['cat'], 'max_age': 5, 'sex': 'female', 'keywords': ['playful']}
+        self.assertEqual(self.ranker.top(profile, 3),
+                         [(UUID(int=1), 10.0), (UUID(int=3), 6.0), (UUID(int=2), 4.0)])
+
+    def test_top_ties(self):
+        """Test that ties are broken by the order of the animals."""
+        ranked = self.ranker.top({'species': ['dog', 'rabbit', 'horse']}, 2)
+        self.assertEqual(ranked, [(UUID(int=3), 4.0), (UUID(int=5), 4.0)])
+
+    def test_batches(self):
+        """Test that the best animals are kept across batches."""
+        batch_size = matching.BATCH_SIZE
+        matching.BATCH_SIZE = 2
+        try:
+            ranked = self.ranker.top({'min_weight': 3, 'max_weight': 10}, 10)
+        finally:
+            matching.BATCH_SIZE = batch_size
+        self.assertEqual([score for pk, score in ranked], [2.0, 2.0, 0.0, 0.0])
+        self.assertEqual([pk.int for pk, score in ranked], [1, 2, 3, 5])
+
+    def test_batches_ties(self):
+        """Test that ties are broken by the order of the animals across batches."""
+        batch_size = matching.BATCH_SIZE
+        matching.BATCH_SIZE = 3
+        try:
+            ranked = self.ranker.top({}, 3)
+        finally:
+            matching.BATCH_SIZE = batch_size
+        self.assertEqual(ranked, [(UUID(int=1), 0.0), (UUID(int=2), 0.0), (UUID(int=3), 0.0)])
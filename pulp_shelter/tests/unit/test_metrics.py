@@ -0,0 +1,115 @@
+import os
+import subprocess
+import threading
+from tempfile import TemporaryDirectory
+from unittest import mock, skipIf
+
+from django.test import TestCase
+
+from pulp_shelter.app import metrics
+
+
+def dead_pid():
+    """
+    Run a process until it is gone.
+
+    :returns: the pid of the process
+    """
+    process = subprocess.Popen(['true'])
+    process.wait()
+    return process.pid
+
+
+def write_values(directory, pid, animals):
+    """
+    Write the values of a process the way prometheus_client does in its multiprocess mode.
+
+    :param directory: the directory of the values of every process
+    :param pid: the pid of the process
+    :param animals: the count of animals synced by the process
+    :returns: the path of the written file
+    """
+    path = os.path.join(directory, 'counter_{pid}.db'.format(pid=pid))
+    values = metrics.MmapedDict(path)
+    key = metrics.mmap_key(
+        'animals', 'animals_total', ['task'], ['sync'], 'Animals processed, by task.'
+    )
+    values.write_value(key, animals, 0.0)
+    values.close()
+    return path
+
+
+def collect(directory):
+    """
+    Collect the values of every process.
+
+    :param directory: the directory of the values of every process
+    :returns: the values by sample name and labels
+    """
+    registry = metrics.prometheus_client.CollectorRegistry()
+    metrics.multiprocess.MultiProcessCollector(registry, path=directory)
+    return {
+        (sample.name, tuple(sorted(sample.labels.items()))): sample.value
+        for metric in registry.collect() for sample in metric.samples
+    }
+
+
+@skipIf(metrics.prometheus_client is None, 'prometheus_client is not installed')
+class TestMetrics(TestCase):
+    """Test collecting the metrics of every process and writing them for the node exporter."""
+
+    def setUp(self):
+        """Create the directory of the values of every process."""
+        self.directory = TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.multiprocess_dir = os.path.join(self.directory.name, metrics.MULTIPROCESS_NAME)
+        os.mkdir(self.multiprocess_dir)
+
+    def test_compact(self):
+        """Test that the files of processes which are gone are merged, keeping the totals."""
+        alive = write_values(self.multiprocess_dir, os.getpid(), 1)
+        write_values(self.multiprocess_dir, dead_pid(), 2)
+        write_values(self.multiprocess_dir, dead_pid(), 3)
+        before = collect(self.multiprocess_dir)
+        metrics.compact(self.multiprocess_dir)
+        self.assertEqual(
+            sorted(os.listdir(self.multiprocess_dir)),
+            sorted(['counter_archive.db', os.path.basename(alive)])
+        )
+        self.assertEqual(collect(self.multiprocess_dir), before)
+
+        # Later processes are added to the archive.
+        write_values(self.multiprocess_dir, dead_pid(), 4)
+        metrics.compact(self.multiprocess_dir)
+        self.assertEqual(
+            collect(self.multiprocess_dir)[('animals_total', (('task', 'sync'),))], 10
+        )
+
+    def test_write_metrics(self):
+        """Test that the values of every process are written into a single file."""
+        write_values(self.multiprocess_dir, os.getpid(), 1)
+        write_values(self.multiprocess_dir, dead_pid(), 2)
+        path = metrics.write_metrics(self.directory.name, self.multiprocess_dir)
+        self.assertEqual(path, os.path.join(self.directory.name, metrics.METRICS_NAME))
+        self.assertEqual(
+            sorted(os.listdir(self.directory.name)),
+            [metrics.MULTIPROCESS_NAME, metrics.METRICS_NAME]
+        )
+        with open(path) as fp:
+            self.assertIn('animals_total{task="sync"} 3.0\n', fp.read())
+
+    def test_background_writer(self):
+        """Test that the writer returns at once and writes the metrics from its own thread."""
+        written = threading.Event()
+        threads = []
+
+        def write_metrics():
+            threads.append(threading.current_thread())
+            written.set()
+
+        writer = metrics.BackgroundWriter(interval=0)
+        with mock.patch.object(metrics, 'METRICS_DIR', self.directory.name), \
+                mock.patch.object(metrics, 'write_metrics', side_effect=write_metrics):
+            writer.request()
+            self.assertTrue(written.wait(5))
+        self.assertIsNot(threads[0], threading.current_thread())
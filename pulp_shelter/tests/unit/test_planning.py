@@ -0,0 +1,75 @@
+import math
+
+from django.test import TestCase
+
+from pulpcore.plugin.models import ProgressBar, Remote, Repository
+
+from pulp_shelter.app.manifest import animal_from_entry
+from pulp_shelter.app.models import Animal, ShelterRemote
+from pulp_shelter.app.tasks.planning import MEGABYTE, plan_sync
+from pulp_shelter.tests.functional.upstream import MockShelterUpstream, ShelterGenerator
+from pulp_shelter.tests.unit.utils import running_task
+
+
+# The animals of the manifest, the last of which repeat the first ones.
+ANIMALS = 20
+
+REPEATED = 5
+
+# The index of the animal with an invalid entry.
+INVALID = 10
+
+
+class RepeatingGenerator(ShelterGenerator):
+    """Generate a manifest with an invalid entry, ending with repeats of its first entries."""
+
+    def entry(self, index):
+        """Return the manifest entry of an animal, or of an earlier one it repeats."""
+        if index >= ANIMALS - REPEATED:
+            return super().entry(index - (ANIMALS - REPEATED))
+        entry = super().entry(index)
+        if index == INVALID:
+            entry['age'] = 'old'
+        return entry
+
+
+class TestPlanSync(TestCase):
+    """Test estimating what a sync would do."""
+
+    def setUp(self):
+        """Serve a manifest, and create a repository version holding two of its animals."""
+        self.generator = RepeatingGenerator(animals=ANIMALS)
+        upstream = MockShelterUpstream(self.generator)
+        upstream.start()
+        self.addCleanup(upstream.stop)
+        self.remote = ShelterRemote.objects.create(
+            name='shelter-plan-sync',
+            url=upstream.manifest_url(),
+            policy=Remote.IMMEDIATE
+        )
+        animals = [animal_from_entry(self.generator.entry(index)) for index in (1, 2)]
+        removed = animal_from_entry(dict(self.generator.entry(0), name='Gone'))
+        removed.picture = 'gone.jpg'
+        for animal in animals + [removed]:
+            animal.save()
+        self.repository = Repository.objects.create(name='shelter-plan-sync')
+        with running_task():
+            with self.repository.new_version() as version:
+                version.add_content(Animal.objects.all())
+
+    def test_plan_sync(self):
+        """Test that the entries the sync would quarantine are left out of the estimate."""
+        with running_task() as task:
+            plan_sync(self.remote.pk, self.repository.pk, mirror=True)
+        reports = dict(ProgressBar.objects.filter(task=task).values_list('message', 'done'))
+        new = [index for index in range(ANIMALS - REPEATED) if index not in (1, 2, INVALID)]
+        size = sum(len(self.generator.picture(index)) for index in new)
+        self.assertEqual(reports, {
+            'Animals In Manifest': ANIMALS - REPEATED - 1,
+            'Animals To Quarantine': REPEATED + 1,
+            'Animals New To Repository': len(new),
+            'Animals Removed From Repository': 1,
+            'Pictures To Download': len(new),
+            'Pictures Of Unknown Size': 0,
+            'Megabytes To Download': math.ceil(size / MEGABYTE),
+        })
@@ -0,0 +1,92 @@
+from django.test import TestCase
+
+from pulpcore.plugin.models import Publication, PublishedArtifact, Repository
+
+from pulp_shelter.app.models import Animal, ShelterPublisher
+from pulp_shelter.app.queries import query_budget
+from pulp_shelter.app.tasks.publishing import partition_path, publish, published_paths
+from pulp_shelter.tests.unit.utils import create_animals, running_task
+
+
+# The number of animals of the fixtures, more than any query may be repeated in a budget.
+ANIMALS = 50
+
+SHELTERS = 5
+
+
+class TestPartitionPath(TestCase):
+    """Test the paths shelters are published under."""
+
+    def test_slug(self):
+        """Test that a shelter is published under the slug of its name."""
+        self.assertEqual(partition_path('Happy Paws'), 'happy-paws')
+        self.assertEqual(partition_path('Refuge Élan'), 'refuge-élan')
+        self.assertEqual(partition_path('!!!'), '_')
+
+    def test_collision(self):
+        """Test that shelters whose names have the same slug get paths of their own."""
+        paths = set()
+        for shelter in ('Happy Paws', 'Happy Paws!', 'happy paws'):
+            path = partition_path(shelter, paths)
+            self.assertTrue(path.startswith('happy-paws'))
+            paths.add(path)
+        self.assertEqual(len(paths), 3)
+        self.assertIn('happy-paws', paths)
+
+    def test_stable(self):
+        """Test that a shelter whose slug is taken keeps its path in the next publication."""
+        animals = create_animals(3)
+        for animal, shelter in zip(animals, ('Happy Paws', 'Happy Paws!', 'Paws Up')):
+            animal.shelter = shelter
+            animal.save()
+        repository = Repository.objects.create(name='shelter-partition-path-stable')
+        publisher = ShelterPublisher.objects.create(
+            name='shelter-partition-path-stable', partitioned=True
+        )
+        paths = []
+        for added in (animals[:2], animals[2:]):
+            with running_task():
+                with repository.new_version() as version:
+                    version.add_content(Animal.objects.filter(pk__in=[a.pk for a in added]))
+            with running_task():
+                publish(publisher.pk, version.pk)
+            publication = Publication.objects.get(publisher=publisher, repository_version=version)
+            paths.append(published_paths(publication))
+        self.assertEqual(paths[0]['Happy Paws'], 'happy-paws/')
+        self.assertRegex(paths[0]['Happy Paws!'], r'^happy-paws-[0-9a-f]{8}/$')
+        self.assertEqual(paths[1], dict(paths[0], **{'Paws Up': 'paws-up/'}))
+
+
+class TestPublishQueryBudget(TestCase):
+    """Test that publishing does not run a query per animal."""
+
+    def setUp(self):
+        """Create a repository version of animals of several shelters."""
+        create_animals(ANIMALS, shelters=SHELTERS)
+        self.repository = Repository.objects.create(name='shelter-publish-query-budget')
+        with running_task():
+            with self.repository.new_version() as version:
+                version.add_content(Animal.objects.all())
+        self.version = version
+
+    def test_publish(self):
+        """Test that a version is published within a fixed budget of queries."""
+        publisher = ShelterPublisher.objects.create(name='shelter-publish-query-budget')
+        with running_task(), query_budget(max_queries=40):
+            publish(publisher.pk, self.version.pk)
+        self.assertEqual(
+            PublishedArtifact.objects.filter(publication__publisher=publisher).count(), ANIMALS
+        )
+
+    def test_publish_partitions(self):
+        """Test that a partitioned publication only saves the files of every shelter."""
+        publisher = ShelterPublisher.objects.create(
+            name='shelter-publish-partitions-query-budget', partitioned=True
+        )
+        # The catalog and the index of every shelter are saved one by one.
+        with running_task(), query_budget(max_queries=40 + 3 * SHELTERS,
+                                          max_repeats=3 * SHELTERS):
+            publish(publisher.pk, self.version.pk)
+        self.assertEqual(
+            PublishedArtifact.objects.filter(publication__publisher=publisher).count(), ANIMALS
+        )
@@ -0,0 +1,60 @@
+from django.test import TestCase
+
+from pulp_shelter.app.models import Animal
+from pulp_shelter.app.queries import QueryRecorder, query_budget, query_shape
+
+
+class TestQueryShape(TestCase):
+    """Test grouping queries by shape."""
+
+    def test_literals(self):
+        """Test that literals and lists of placeholders are left out."""
+        self.assertEqual(
+            query_shape("SELECT * FROM animal WHERE name = 'Rex' AND age > 3 AND "
+                        "id IN (%s, %s,\n %s) LIMIT 21"),
+            'SELECT * FROM animal WHERE name = ? AND age > ? AND id IN (...) LIMIT ?'
+        )
+
+    def test_same_shape(self):
+        """Test that runs of a query with different parameters share their shape."""
+        self.assertEqual(
+            query_shape('SELECT * FROM animal WHERE id IN (%s, %s)'),
+            query_shape('SELECT * FROM animal WHERE id IN (%s, %s, %s)')
+        )
+
+
+class TestQueryRecorder(TestCase):
+    """Test recording the queries run within a block."""
+
+    def test_record(self):
+        """Test that queries are counted and grouped by shape."""
+        with QueryRecorder() as queries:
+            for _ in range(3):
+                Animal.objects.filter(name='Rex').count()
+        self.assertEqual(queries.count, 3)
+        self.assertEqual(len(queries.shapes), 1)
+        self.assertEqual(queries.repeated(threshold=3)[0][1], 3)
+        self.assertEqual(queries.repeated(threshold=4), [])
+
+
+class TestQueryBudget(TestCase):
+    """Test asserting budgets of queries."""
+
+    def test_within_budget(self):
+        """Test that a block within its budget passes."""
+        with query_budget(max_queries=2):
+            list(Animal.objects.all())
+
+    def test_too_many_queries(self):
+        """Test that a block exceeding its budget fails."""
+        with self.assertRaises(AssertionError):
+            with query_budget(max_queries=1):
+                Animal.objects.count()
+                Animal.objects.count()
+
+    def test_repeated_queries(self):
+        """Test that a block repeating a query beyond its budget fails, as an N+1 would."""
+        with self.assertRaises(AssertionError):
+            with query_budget(max_queries=100, max_repeats=2):
+                for name in ('Tom', 'Rex', 'Kitty'):
+                    Animal.objects.filter(name=name).exists()
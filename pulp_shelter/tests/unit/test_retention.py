@@ -0,0 +1,155 @@
+import os
+from datetime import datetime, timedelta
+from tempfile import TemporaryDirectory
+
+from django.test import TestCase
+
+from pulpcore.plugin.models import Artifact, ContentArtifact, Repository, RepositoryVersion
+
+from pulp_shelter.app.models import Animal
+from pulp_shelter.app.tasks.retention import delete_orphans, squash, version_gaps
+from pulp_shelter.app.utils import save_artifact
+from pulp_shelter.tests.unit.utils import running_task
+
+
+NOW = datetime(2018, 6, 1)
+
+VERSIONS = [('v{}'.format(number), number, NOW - timedelta(days=10 - number))
+            for number in range(10)]
+
+
+class TestVersionGaps(TestCase):
+    """Test which repository versions a retention policy squashes."""
+
+    def test_keep_versions(self):
+        """Test that the versions before the most recent ones are squashed into the first."""
+        gaps = version_gaps(VERSIONS, set(), 3, None)
+        self.assertEqual(gaps, [(['v1', 'v2', 'v3', 'v4', 'v5', 'v6'], 'v7')])
+
+    def test_keep_days(self):
+        """Test that the versions created since a time are kept."""
+        gaps = version_gaps(VERSIONS, set(), None, NOW - timedelta(days=2))
+        self.assertEqual(gaps, [(['v1', 'v2', 'v3', 'v4', 'v5', 'v6', 'v7'], 'v8')])
+
+    def test_published(self):
+        """Test that published versions are kept, splitting the squashed ones."""
+        gaps = version_gaps(VERSIONS, {'v4'}, 2, None)
+        self.assertEqual(gaps, [(['v1', 'v2', 'v3'], 'v4'), (['v5', 'v6', 'v7'], 'v8')])
+
+    def test_latest(self):
+        """Test that version 0 and the latest version are always kept."""
+        self.assertEqual(version_gaps(VERSIONS[:2], set(), None, NOW), [])
+        self.assertEqual(version_gaps(VERSIONS[:3], set(), None, NOW), [(['v1'], 'v2')])
+
+
+def create_animal(name, artifact):
+    """Create an animal with a picture.
+
+    :param name: The name of the animal.
+    :param artifact: The Artifact of its picture.
+    :returns: The animal.
+    """
+    animal = Animal.objects.create(species='cat', breed='siamese', name=name, age=3,
+                                   weight=4.2, bio='Purrs a lot.', shelter='Brno',
+                                   picture='cats/{}.jpg'.format(name))
+    ContentArtifact.objects.create(content=animal, artifact=artifact,
+                                   relative_path=animal.picture)
+    return animal
+
+
+class TestCleanUp(TestCase):
+    """Test squashing repository versions and deleting what only they held."""
+
+    def setUp(self):
+        """Create versions of a repository adding and removing animals.
+
+        Version 1 adds Kitty, Tom, Felix and Garfield, version 2 removes Kitty, Tom and Felix
+        and adds Simba, version 3 removes Simba and adds Nala, and version 4 adds Leo. Tom is
+        also in another repository, and Nala shares the picture of Kitty.
+        """
+        with TemporaryDirectory() as directory:
+            self.pictures = {}
+            for name in ('shared', 'tom', 'felix', 'other'):
+                path = os.path.join(directory, name + '.jpg')
+                with open(path, 'wb') as fp:
+                    fp.write(name.encode() * 100)
+                self.pictures[name] = save_artifact(path)
+        other = self.pictures['other']
+        self.animals = {
+            'Kitty': create_animal('Kitty', self.pictures['shared']),
+            'Tom': create_animal('Tom', self.pictures['tom']),
+            'Felix': create_animal('Felix', self.pictures['felix']),
+            'Garfield': create_animal('Garfield', other),
+            'Simba': create_animal('Simba', other),
+            'Nala': create_animal('Nala', self.pictures['shared']),
+            'Leo': create_animal('Leo', other),
+        }
+        self.repository = Repository.objects.create(name='shelter-clean-up')
+        self.versions = []
+        for added, removed in (
+            (['Kitty', 'Tom', 'Felix', 'Garfield'], []),
+            (['Simba'], ['Kitty', 'Tom', 'Felix']),
+            (['Nala'], ['Simba']),
+            (['Leo'], []),
+        ):
+            with running_task():
+                with self.repository.new_version() as version:
+                    version.add_content(self.content(added))
+                    version.remove_content(self.content(removed))
+            self.versions.append(version)
+        with running_task():
+            with Repository.objects.create(name='shelter-clean-up-other').new_version() as other:
+                other.add_content(self.content(['Tom']))
+
+    def content(self, names):
+        """Return the animals of some names.
+
+        :param names: The names of the animals.
+        :returns: A queryset of the animals.
+        """
+        return Animal.objects.filter(pk__in=[self.animals[name].pk for name in names])
+
+    def kept_content(self):
+        """Return the animals of every version of the repository.
+
+        :returns: A dict of the PKs of the animals of every version, by its PK.
+        """
+        versions = RepositoryVersion.objects.filter(repository=self.repository)
+        return {version.pk: set(version.content.values_list('pk', flat=True))
+                for version in versions}
+
+    def squash(self):
+        """Squash versions 1 and 3 into the versions following them.
+
+        :returns: The PKs of the animals which might be orphans.
+        """
+        first, second, third, fourth = self.versions
+        candidates = set()
+        for gap, successor in (([first.pk], second.pk), ([third.pk], fourth.pk)):
+            candidates.update(squash(self.repository, gap, successor))
+        return candidates
+
+    def test_squash(self):
+        """Test that every kept version holds the same animals after squashing."""
+        before = self.kept_content()
+        candidates = self.squash()
+        after = self.kept_content()
+        squashed = {self.versions[0].pk, self.versions[2].pk}
+        self.assertEqual(set(after), set(before) - squashed)
+        for pk, animals in after.items():
+            self.assertEqual(animals, before[pk])
+        self.assertEqual(candidates, {self.animals[name].pk for name in ('Kitty', 'Tom', 'Felix')})
+
+    def test_delete_orphans(self):
+        """Test that only unreferenced animals and the pictures no other animal has are deleted."""
+        deleted = delete_orphans(self.squash())
+        felix = self.pictures['felix']
+        self.assertEqual(deleted, (2, 1, felix.size))
+        self.assertEqual(
+            set(Animal.objects.values_list('name', flat=True)),
+            {'Tom', 'Garfield', 'Simba', 'Nala', 'Leo'}
+        )
+        self.assertEqual(
+            set(Artifact.objects.values_list('pk', flat=True)),
+            {self.pictures[name].pk for name in ('shared', 'tom', 'other')}
+        )
@@ -0,0 +1,229 @@
+import asyncio
+import json
+import uuid
+from concurrent.futures import Executor, Future
+from unittest import mock
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+from aiohttp.test_utils import make_mocked_request
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from rest_framework.settings import api_settings
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from pulpcore.plugin.models import Publication, Repository, RepositoryVersion
+
+from pulp_shelter.app.models import Animal, ShelterPublisher
+from pulp_shelter.app.serving.handler import AnimalHandler, ForwardedRequest
+from pulp_shelter.app.viewsets import AnimalViewSet
+from pulp_shelter.tests.unit.utils import create_animals, running_task
+
+
+# The animals created, all but the last of which are in the repository version.
+ANIMALS = 8
+
+
+class TestForwardedRequest(TestCase):
+    """Test the Django request standing in for an aiohttp one."""
+
+    @override_settings(ALLOWED_HOSTS=['pulp.example.com'])
+    def test_request(self):
+        """Test that the path, query and host of the aiohttp request are kept."""
+        request = ForwardedRequest(make_mocked_request(
+            'GET',
+            '/pulp/shelter/api/v3/publications/1/animals/?species=cat&species=dog&limit=5',
+            headers={'Host': 'pulp.example.com'}
+        ))
+        self.assertEqual(request.GET.getlist('species'), ['cat', 'dog'])
+        self.assertEqual(
+            request.build_absolute_uri(),
+            'http://pulp.example.com/pulp/shelter/api/v3/publications/1/animals/'
+            '?species=cat&species=dog&limit=5'
+        )
+
+
+class InlineExecutor(Executor):
+    """Run calls in the calling thread, which holds the transaction of the test."""
+
+    def submit(self, fn, *args, **kwargs):
+        """Run a call at once.
+
+        :returns: The future of its result.
+        """
+        future = Future()
+        future.set_result(fn(*args, **kwargs))
+        return future
+
+
+def without_paths(data):
+    """Drop the path of the links to other pages, which differs between the APIs.
+
+    :param data: The data of a response.
+    :returns: The data, with only the query of the ``next`` and ``previous`` links.
+    """
+    data = dict(data)
+    for link in ('next', 'previous'):
+        if data.get(link):
+            data[link] = urlsplit(data[link]).query
+    return data
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'])
+class TestAnimalHandler(TestCase):
+    """Test that the animals are served as the REST API serves them."""
+
+    def setUp(self):
+        """Create a complete and an incomplete version, and a publication of the first."""
+        self.user = get_user_model().objects.create(username='shelter-serving')
+        animals = create_animals(ANIMALS, shelters=2)
+        self.repository = Repository.objects.create(name='shelter-serving')
+        with running_task():
+            with self.repository.new_version() as version:
+                version.add_content(Animal.objects.filter(pk__in=[
+                    animal.pk for animal in animals[:-1]
+                ]))
+            publisher = ShelterPublisher.objects.create(name='shelter-serving')
+            with Publication.create(version, publisher) as publication:
+                pass
+        self.version = version
+        self.publication = publication
+        self.outside = animals[-1]
+        self.incomplete = RepositoryVersion.objects.create(
+            repository=self.repository, number=version.number + 1, complete=False
+        )
+
+        self.handler = AnimalHandler(connections=1)
+        self.handler.executor.shutdown()
+        self.handler.executor = InlineExecutor()
+        # The connection of the test holds its transaction, it may not be closed.
+        patcher = mock.patch('pulp_shelter.app.serving.handler.close_old_connections')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # Pages of a few animals, of both APIs.
+        patcher = mock.patch.object(api_settings.DEFAULT_PAGINATION_CLASS, 'page_size', 3)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def api(self, params, animal=None):
+        """List animals, or show one, with the REST API.
+
+        :param params: The query parameters.
+        :param animal: The animal to show, None to list them.
+        :returns: The status and data of the response.
+        """
+        path = '/pulp/api/v3/content/shelter/animal/'
+        if animal is None:
+            view, kwargs = AnimalViewSet.as_view({'get': 'list'}), {}
+        else:
+            view, kwargs = AnimalViewSet.as_view({'get': 'retrieve'}), {'pk': animal.pk}
+            path += '{}/'.format(animal.pk)
+        request = APIRequestFactory().get(path, params)
+        force_authenticate(request, user=self.user)
+        response = view(request, **kwargs)
+        response.render()
+        return response.status_code, without_paths(json.loads(response.content.decode()))
+
+    def serve(self, handle, match_info, params=()):
+        """Serve a request with the handler.
+
+        :param handle: The method of the handler serving the request.
+        :param match_info: The variables of the path.
+        :param params: The query parameters.
+        :returns: The status and data of the response.
+        """
+        request = make_mocked_request(
+            'GET', '/pulp/shelter/api/v3/animals/?' + urlencode(params),
+            headers={'Host': 'testserver'}, match_info=match_info
+        )
+        response = asyncio.get_event_loop().run_until_complete(handle(request))
+        return response.status, without_paths(json.loads(response.body.decode()))
+
+    def version_match_info(self, version=None):
+        """Return the variables of the path of a repository version.
+
+        :param version: The version, the complete one by default.
+        :returns: A dict of the variables.
+        """
+        version = version or self.version
+        return {'repository_pk': str(self.repository.pk), 'number': str(version.number)}
+
+    def version_href(self):
+        """Return the href of the complete version, which the REST API filters by."""
+        return '/pulp/api/v3/repositories/{}/versions/{}/'.format(
+            self.repository.pk, self.version.number
+        )
+
+    def compare_pages(self, params):
+        """Compare every page of animals of the version served with those of the REST API.
+
+        :param params: The query parameters of the first page.
+        :returns: The number of pages.
+        """
+        query = urlencode(params)
+        pages = 0
+        while query is not None:
+            served = self.serve(self.handler.version_list, self.version_match_info(),
+                                parse_qsl(query))
+            status, expected = self.api(
+                dict(parse_qsl(query), repository_version=self.version_href())
+            )
+            self.assertEqual(status, 200)
+            # The REST API links to the other pages with the version filter added.
+            for link in ('next', 'previous'):
+                if expected.get(link):
+                    expected[link] = urlencode([
+                        (key, value) for key, value in parse_qsl(expected[link])
+                        if key != 'repository_version'
+                    ])
+            self.assertEqual(served, (200, expected))
+            query = served[1].get('next')
+            pages += 1
+        return pages
+
+    def test_list(self):
+        """Test that every page of the animals of a version is the same as the API's."""
+        self.assertGreater(self.compare_pages({}), 1)
+
+    def test_filters(self):
+        """Test that filtered animals of a version are the same as the API's."""
+        for params in ({'shelter': 'Shelter 1'}, {'search': 'kitty 1'}):
+            with self.subTest(params=params):
+                self.compare_pages(params)
+
+    def test_publication(self):
+        """Test that the animals of a publication are those of its repository version."""
+        match_info = {'publication_pk': str(self.publication.pk)}
+        self.assertEqual(
+            self.serve(self.handler.publication_list, match_info),
+            self.serve(self.handler.version_list, self.version_match_info())
+        )
+        animal = self.version.content.first()
+        self.assertEqual(
+            self.serve(self.handler.publication_detail,
+                       dict(match_info, animal_pk=str(animal.pk))),
+            self.api({}, animal=animal)
+        )
+
+    def test_detail(self):
+        """Test that an animal is shown as the API shows it, only in versions holding it."""
+        animal = self.version.content.first()
+        self.assertEqual(
+            self.serve(self.handler.version_detail,
+                       dict(self.version_match_info(), animal_pk=str(animal.pk))),
+            self.api({}, animal=animal)
+        )
+        status, data = self.serve(self.handler.version_detail,
+                                  dict(self.version_match_info(), animal_pk=str(self.outside.pk)))
+        self.assertEqual(status, 404)
+
+    def test_not_found(self):
+        """Test that unknown and incomplete versions and publications are not found."""
+        unknown = dict(self.version_match_info(), number='99')
+        for handle, match_info in (
+            (self.handler.version_list, unknown),
+            (self.handler.version_list, self.version_match_info(self.incomplete)),
+            (self.handler.publication_list, {'publication_pk': str(uuid.uuid4())}),
+        ):
+            with self.subTest(match_info=match_info):
+                status, data = self.serve(handle, match_info)
+                self.assertEqual(status, 404)
@@ -0,0 +1,123 @@
+import asyncio
+import json
+import os
+from tempfile import TemporaryDirectory
+
+from django.test import TestCase
+
+from pulpcore.plugin.models import CreatedResource, PublishedMetadata, Repository
+
+from pulp_shelter.app.manifest import AnimalRecord, InvalidLine
+from pulp_shelter.app.models import Animal, ShelterRemote
+from pulp_shelter.app.stages import QUARANTINE_NAME, RecordValidator
+from pulp_shelter.tests.unit.utils import running_task
+
+
+def record(name, picture, **changes):
+    """Return the record of a valid manifest entry."""
+    entry = {
+        'species': 'cat',
+        'breed': 'siamese',
+        'name': name,
+        'age': 3,
+        'weight': 4.2,
+        'bio': 'Purrs a lot.',
+        'shelter': 'Brno',
+        'picture': picture,
+    }
+    entry.update(changes)
+    return AnimalRecord.from_entry(entry)
+
+
+class TestRecordValidator(TestCase):
+    """Test quarantining and skipping the records of a sync."""
+
+    def setUp(self):
+        """Create two remotes, a saved animal and a repository version."""
+        self.first = ShelterRemote.objects.create(name='first', url='http://first/')
+        self.second = ShelterRemote.objects.create(name='second', url='http://second/')
+        Animal.objects.create(species='cat', breed='siamese', name='Tom', age=5, weight=5.0,
+                              bio='Chases mice.', shelter='Brno', picture='cats/tom.jpg')
+        repository = Repository.objects.create(name='shelter-record-validator')
+        with running_task():
+            with repository.new_version() as version:
+                pass
+        self.version = version
+
+    def validate(self, items):
+        """Run the stage over items, in the working directory of a task.
+
+        :param items: Tuples of a remote and a record, as emitted by the first stage.
+        :returns: A tuple of the items passed on, the stage and the published quarantine report,
+            a list of its entries or None.
+        """
+        stage = RecordValidator(lambda item: item, self.version, workers=1)
+        in_q, out_q = asyncio.Queue(), asyncio.Queue()
+        for item in items + [None]:
+            in_q.put_nowait(item)
+        cwd = os.getcwd()
+        with TemporaryDirectory() as directory, running_task() as task:
+            os.chdir(directory)
+            try:
+                asyncio.get_event_loop().run_until_complete(stage(in_q, out_q))
+            finally:
+                os.chdir(cwd)
+        passed = []
+        while True:
+            item = out_q.get_nowait()
+            if item is None:
+                break
+            passed.append(item)
+        created = CreatedResource.objects.filter(task=task).first()
+        report = None
+        if created is not None:
+            metadata = PublishedMetadata.objects.get(
+                publication=created.content_object, relative_path=QUARANTINE_NAME
+            )
+            with metadata.file.open('rb') as fp:
+                report = [json.loads(line) for line in fp.read().decode().splitlines()]
+        return passed, stage, report
+
+    def test_valid(self):
+        """Test that valid records are passed on, and no report is attached."""
+        items = [(self.first, record('Kitty', 'cats/kitty.jpg')),
+                 (self.first, record('Tom', 'cats/tom.jpg'))]
+        passed, stage, report = self.validate(items)
+        self.assertEqual(passed, items)
+        self.assertEqual(stage.quarantined.done, 0)
+        self.assertIsNone(report)
+
+    def test_quarantine(self):
+        """Test that invalid lines, invalid records and repeats of one remote are quarantined."""
+        kitty = (self.first, record('Kitty', 'cats/kitty.jpg'))
+        passed, stage, report = self.validate([
+            kitty,
+            (self.first, InvalidLine(2, '{"name": "Rex"', 'Not valid JSON.')),
+            (self.first, record('Rex', 'dogs/rex.jpg', age='old')),
+            (self.first, record('Kitty', 'cats/kitty-2.jpg')),
+            (self.first, record('Felix', 'cats/tom.jpg')),
+        ])
+        self.assertEqual(passed, [kitty])
+        self.assertEqual(stage.quarantined.done, 4)
+        self.assertEqual(stage.skipped.done, 0)
+        self.assertEqual([entry['remote'] for entry in report], ['first'] * 4)
+        self.assertEqual(report[0]['line'], 2)
+        self.assertEqual(report[0]['text'], '{"name": "Rex"')
+        self.assertEqual(list(report[1]['errors']), ['age'])
+        self.assertEqual(report[2]['entry']['picture'], 'cats/kitty-2.jpg')
+        self.assertEqual(list(report[3]['errors']), ['picture'])
+
+    def test_conflicts(self):
+        """Test that a repeat of an animal of a remote listed before is skipped."""
+        kitty = (self.first, record('Kitty', 'cats/kitty.jpg'))
+        felix = (self.second, record('Felix', 'cats/felix.jpg'))
+        passed, stage, report = self.validate([
+            kitty,
+            (self.second, record('Kitty', 'cats/kitty-2.jpg')),
+            (self.second, record('Garfield', 'cats/kitty.jpg')),
+            felix,
+        ])
+        self.assertEqual(passed, [kitty, felix])
+        self.assertEqual(stage.skipped.done, 2)
+        self.assertEqual(stage.quarantined.done, 0)
+        self.assertIsNone(report)
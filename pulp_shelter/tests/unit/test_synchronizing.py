@@ -0,0 +1,116 @@
+from django.test import TestCase
+
+from pulpcore.plugin.models import Remote, RemoteArtifact, Repository
+
+from pulp_shelter.app.models import Animal, ShelterRemote
+from pulp_shelter.app.queries import query_budget
+from pulp_shelter.app.tasks.synchronizing import synchronize, synchronize_remotes
+from pulp_shelter.tests.functional.upstream import MockShelterUpstream, ShelterGenerator
+from pulp_shelter.tests.unit.utils import running_task
+
+
+# The number of animals of the upstream, more than any query may be repeated in the budget.
+ANIMALS = 50
+
+
+class TestSynchronizeQueryBudget(TestCase):
+    """Test that syncing does not run a query per animal."""
+
+    def setUp(self):
+        """Serve a manifest of animals."""
+        self.upstream = MockShelterUpstream(ShelterGenerator(animals=ANIMALS))
+        self.upstream.start()
+        self.addCleanup(self.upstream.stop)
+        self.repository = Repository.objects.create(name='shelter-sync-query-budget')
+
+    def sync(self, name, **fields):
+        """Sync the repository from a new remote of the upstream, within a budget of queries."""
+        remote = ShelterRemote.objects.create(
+            name=name,
+            url=self.upstream.manifest_url(),
+            policy=Remote.ON_DEMAND,
+            **fields
+        )
+        # Progress reports are saved a few times each, whatever the number of animals.
+        with running_task(), query_budget(max_queries=100, max_repeats=ANIMALS // 2):
+            synchronize(remote.pk, self.repository.pk, mirror=True)
+        self.assertEqual(
+            Animal.objects.filter(pk__in=self.repository.latest_version().content).count(),
+            ANIMALS
+        )
+
+    def test_synchronize(self):
+        """Test that new animals are synced within a fixed budget of queries."""
+        self.sync('shelter-sync-query-budget')
+
+    def test_synchronize_warm(self):
+        """Test that animals synced again from a warm lookup cache stay within the budget."""
+        self.sync('shelter-sync-query-budget')
+        self.sync('shelter-sync-warm-query-budget', warm_lookup=True)
+
+
+class ConflictingGenerator(ShelterGenerator):
+    """Generate animals conflicting with those of another generator of the same seed.
+
+    Of the animals the other generator has too, a third are the same, a third have the same
+    natural key but another picture, and a third the same picture but another name.
+    """
+
+    def __init__(self, conflicting, **kwargs):
+        """Generate animals conflicting with those of another generator of the same seed.
+
+        :param conflicting: The number of animals of the other generator.
+        :param kwargs: The parameters of the generator.
+        """
+        super().__init__(**kwargs)
+        self.conflicting = conflicting
+
+    def entry(self, index):
+        """Return the manifest entry of an animal, conflicting with the other generator."""
+        entry = super().entry(index)
+        if index < self.conflicting and index % 3 == 1:
+            entry['picture'] = 'moved/{}.jpg'.format(index)
+        elif index < self.conflicting and index % 3 == 2:
+            entry['name'] = 'Other {}'.format(index)
+        return entry
+
+
+class TestSynchronizeRemotes(TestCase):
+    """Test syncing several remotes into a single repository version."""
+
+    def setUp(self):
+        """Serve two manifests of conflicting animals."""
+        self.remotes = []
+        for name, generator in (
+            ('shelter-sync-first', ShelterGenerator(animals=ANIMALS // 2)),
+            ('shelter-sync-second', ConflictingGenerator(ANIMALS // 2, animals=ANIMALS)),
+        ):
+            upstream = MockShelterUpstream(generator)
+            upstream.start()
+            self.addCleanup(upstream.stop)
+            self.remotes.append(ShelterRemote.objects.create(
+                name=name,
+                url=upstream.manifest_url(),
+                policy=Remote.ON_DEMAND
+            ))
+        self.repository = Repository.objects.create(name='shelter-sync-remotes')
+
+    def test_conflicts(self):
+        """Test that every conflicting animal is taken from the remote listed first."""
+        first, second = self.remotes
+        with running_task():
+            synchronize_remotes([first.pk, second.pk], self.repository.pk, mirror=True)
+        animals = Animal.objects.filter(pk__in=self.repository.latest_version().content)
+        self.assertEqual(
+            sorted(animals.values_list('name', flat=True)),
+            sorted('Animal {}'.format(index) for index in range(ANIMALS))
+        )
+        remotes = dict(RemoteArtifact.objects.filter(
+            content_artifact__content__in=animals
+        ).values_list('content_artifact__content_id', 'remote_id'))
+        for animal in animals:
+            index = int(animal.name.split()[-1])
+            with self.subTest(index=index):
+                self.assertEqual(animal.picture, 'pictures/{}.jpg'.format(index))
+                expected = first if index < ANIMALS // 2 else second
+                self.assertEqual(remotes[animal.pk], expected.pk)
@@ -0,0 +1,116 @@
+from datetime import datetime, timezone
+
+from django.test import TestCase
+
+from pulp_shelter.app.throttling import (
+    AdaptiveConcurrency,
+    Throttle,
+    TokenBucket,
+    parse_retry_after,
+)
+
+
+class FakeClock:
+    """A clock which only moves when told to."""
+
+    def __init__(self):
+        """Start at zero."""
+        self.now = 0.0
+
+    def __call__(self):
+        """Return the current time."""
+        return self.now
+
+
+class TestTokenBucket(TestCase):
+    """Test the rate limit of requests."""
+
+    def test_rate(self):
+        """Test that tokens are handed out at the configured rate after a burst."""
+        clock = FakeClock()
+        bucket = TokenBucket(2, clock=clock)
+        self.assertEqual([bucket.delay(), bucket.delay()], [0, 0])
+        self.assertEqual(bucket.delay(), 0.5)
+        clock.now = 0.5
+        self.assertEqual(bucket.delay(), 0)
+
+    def test_unlimited(self):
+        """Test that no rate hands out tokens without delay."""
+        bucket = TokenBucket(None, clock=FakeClock())
+        self.assertEqual([bucket.delay() for _ in range(100)], [0] * 100)
+
+    def test_pause(self):
+        """Test that no token is handed out while paused."""
+        clock = FakeClock()
+        bucket = TokenBucket(None, clock=clock)
+        bucket.pause(30)
+        self.assertEqual(bucket.delay(), 30)
+        clock.now = 30
+        self.assertEqual(bucket.delay(), 0)
+
+
+class TestAdaptiveConcurrency(TestCase):
+    """Test the AIMD limit on concurrent requests."""
+
+    def test_additive_increase(self):
+        """Test that the limit grows by one per window of fast responses."""
+        concurrency = AdaptiveConcurrency(maximum=3, clock=FakeClock())
+        for limit in (2, 3, 3):
+            for _ in range(concurrency.limit):
+                concurrency.succeeded(0.1)
+            self.assertEqual(concurrency.limit, limit)
+
+    def test_multiplicative_decrease(self):
+        """Test that the limit halves when throttled, once per response time."""
+        clock = FakeClock()
+        concurrency = AdaptiveConcurrency(maximum=16, clock=clock)
+        concurrency.limit = 16
+        concurrency.succeeded(1)
+        clock.now = 10
+        concurrency.decrease()
+        concurrency.decrease()
+        self.assertEqual(concurrency.limit, 8)
+        clock.now = 20
+        concurrency.decrease()
+        self.assertEqual(concurrency.limit, 4)
+
+    def test_slow_responses(self):
+        """Test that responses much slower than the fastest one shrink the limit."""
+        clock = FakeClock()
+        concurrency = AdaptiveConcurrency(maximum=16, clock=clock)
+        concurrency.limit = 8
+        concurrency.succeeded(0.1)
+        clock.now = 10
+        for _ in range(20):
+            concurrency.succeeded(10)
+        self.assertLess(concurrency.limit, 8)
+
+
+class TestThrottle(TestCase):
+    """Test backing off from a throttling upstream."""
+
+    def test_throttled(self):
+        """Test that Retry-After is honored, falling back to an exponential backoff."""
+        throttle = Throttle(clock=FakeClock())
+        self.assertEqual(throttle.throttled(1, 7), 7)
+        self.assertEqual(throttle.throttled(3), 8)
+        self.assertEqual(throttle.bucket.delay(), 8)
+
+
+class TestParseRetryAfter(TestCase):
+    """Test parsing the Retry-After header."""
+
+    def test_seconds(self):
+        """Test a number of seconds."""
+        self.assertEqual(parse_retry_after('120'), 120)
+
+    def test_date(self):
+        """Test an HTTP date."""
+        now = datetime(2015, 10, 21, 7, 28, tzinfo=timezone.utc)
+        self.assertEqual(parse_retry_after('Wed, 21 Oct 2015 07:29:00 GMT', now), 60)
+
+    def test_invalid(self):
+        """Test that missing and invalid values are ignored."""
+        for value in (None, '', 'soon'):
+            with self.subTest(value=value):
+                self.assertIsNone(parse_retry_after(value))
@@ -0,0 +1,46 @@
+import hashlib
+import os
+from tempfile import TemporaryDirectory
+
+from django.test import TestCase
+
+from pulp_shelter.app.uploads import create_file, missing_ranges, write_chunk
+
+
+class TestUploads(TestCase):
+    """Test writing the chunks of a picture upload."""
+
+    def test_chunks_out_of_order(self):
+        """Test that chunks written in any order make up the picture."""
+        picture = os.urandom(1000)
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'upload', 'picture')
+            create_file(path, len(picture))
+            for offset in (600, 0, 300):
+                chunk = picture[offset:offset + 300] if offset < 600 else picture[offset:]
+                size, sha256 = write_chunk(path, offset, [chunk[:100], chunk[100:]])
+                self.assertEqual(size, len(chunk))
+                self.assertEqual(sha256, hashlib.sha256(chunk).hexdigest())
+            with open(path, 'rb') as fp:
+                self.assertEqual(fp.read(), picture)
+
+    def test_resend_bad_digest(self):
+        """Test that a resent chunk not matching its digest leaves the received bytes alone."""
+        picture = os.urandom(600)
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'upload', 'picture')
+            create_file(path, len(picture))
+            chunk = picture[:300]
+            write_chunk(path, 0, [chunk], sha256=hashlib.sha256(chunk).hexdigest())
+            corrupted = os.urandom(300)
+            with self.assertRaises(ValueError):
+                write_chunk(path, 0, [corrupted], sha256=hashlib.sha256(chunk).hexdigest())
+            with open(path, 'rb') as fp:
+                self.assertEqual(fp.read(300), chunk)
+            self.assertEqual(os.listdir(os.path.dirname(path)), ['picture'])
+
+    def test_missing_ranges(self):
+        """Test that the gaps between received chunks are reported."""
+        self.assertEqual(missing_ranges([], 10), [[0, 10]])
+        self.assertEqual(missing_ranges([(4, 2), (0, 2)], 10), [[2, 4], [6, 10]])
+        self.assertEqual(missing_ranges([(5, 5), (0, 5)], 10), [])
@@ -0,0 +1,80 @@
+import hashlib
+import json
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+from django.test import TestCase
+
+from pulp_shelter.tests.functional.upstream import MockShelterUpstream, ShelterGenerator
+
+
+class TestShelterGenerator(TestCase):
+    """Test the generation of the animals of a mock upstream."""
+
+    def test_deterministic(self):
+        """Test that the same seed generates the same entries and pictures."""
+        generator = ShelterGenerator(seed=7)
+        self.assertEqual(generator.entry(3), ShelterGenerator(seed=7).entry(3))
+        self.assertEqual(generator.picture(3), ShelterGenerator(seed=7).picture(3))
+        self.assertNotEqual(generator.picture(3), ShelterGenerator(seed=8).picture(3))
+
+    def test_shards(self):
+        """Test that every animal is in exactly one shard."""
+        generator = ShelterGenerator(animals=10, shards=3)
+        lines = [
+            json.loads(line)
+            for shard in range(3)
+            for chunk in generator.manifest(shard)
+            for line in chunk.decode().splitlines()
+        ]
+        self.assertEqual(sorted(entry['name'] for entry in lines),
+                         sorted('Animal {}'.format(index) for index in range(10)))
+
+    def test_changed(self):
+        """Test that only the changing pictures differ between generations."""
+        old = ShelterGenerator(animals=200, changed=0.5)
+        new = ShelterGenerator(animals=200, changed=0.5, generation=1)
+        changed = sum(old.picture(index) != new.picture(index) for index in range(200))
+        self.assertTrue(0 < changed < 200)
+
+
+class TestMockShelterUpstream(TestCase):
+    """Test serving the manifests and pictures of a mock upstream."""
+
+    def test_serve(self):
+        """Test that pictures match the digests of the manifest, and unknown paths are 404."""
+        with MockShelterUpstream(ShelterGenerator(animals=5, shards=2)) as upstream:
+            with urlopen(upstream.manifest_url(1)) as response:
+                entries = [json.loads(line) for line in response.read().decode().splitlines()]
+            self.assertEqual(len(entries), 2)
+            url = upstream.manifest_url(1).replace('animals.ndjson', entries[0]['picture'])
+            with urlopen(url) as response:
+                self.assertEqual(hashlib.sha256(response.read()).hexdigest(),
+                                 entries[0]['sha256'])
+            with self.assertRaises(HTTPError) as exc:
+                urlopen(upstream.manifest_url(2))
+            self.assertEqual(exc.exception.code, 404)
+        self.assertEqual(upstream.requests['GET', 'manifest', 200], 1)
+        self.assertEqual(upstream.requests['GET', 'picture', 200], 1)
+
+    def test_etag(self):
+        """Test that a picture whose ETag matches is not sent again, unless ETags are ignored."""
+        for mode, status in (('strong', 304), ('ignored', 200)):
+            with MockShelterUpstream(etag=mode) as upstream:
+                url = upstream.url + 'shard-0/pictures/0.jpg'
+                with urlopen(Request(url, method='HEAD')) as response:
+                    etag = response.headers['ETag']
+                try:
+                    with urlopen(Request(url, headers={'If-None-Match': etag})) as response:
+                        code = response.status
+                except HTTPError as error:
+                    code = error.code
+                self.assertEqual(code, status)
+
+    def test_errors(self):
+        """Test that failing requests are answered with the error status and Retry-After."""
+        with MockShelterUpstream(error_rate=1.0) as upstream:
+            with self.assertRaises(HTTPError) as exc:
+                urlopen(upstream.manifest_url())
+        self.assertEqual(exc.exception.code, 503)
+        self.assertEqual(exc.exception.headers['Retry-After'], '0')
@@ -0,0 +1,74 @@
+import hashlib
+import json
+import os
+from tempfile import NamedTemporaryFile, TemporaryDirectory
+
+from django.test import TestCase
+
+from pulp_shelter.app.utils import (
+    LazyModule,
+    batched,
+    file_digests,
+    optional_module,
+    save_artifact
+)
+
+
+class TestBatched(TestCase):
+    """Test splitting iterables into batches."""
+
+    def test_batches(self):
+        """Test that all items are split into batches of the given size."""
+        self.assertEqual(list(batched(range(5), 2)), [[0, 1], [2, 3], [4]])
+
+    def test_empty(self):
+        """Test that an empty iterable yields no batch."""
+        self.assertEqual(list(batched([], 2)), [])
+
+
+class TestFileDigests(TestCase):
+    """Test computing the size and digests of a file."""
+
+    def test_digests(self):
+        """Test that the size and every requested digest are computed."""
+        data = b'woof' * 1000
+        with NamedTemporaryFile() as fp:
+            fp.write(data)
+            fp.flush()
+            digests = file_digests(fp.name, algorithms=('sha256', 'md5'))
+        self.assertEqual(digests, {
+            'size': len(data),
+            'sha256': hashlib.sha256(data).hexdigest(),
+            'md5': hashlib.md5(data).hexdigest(),
+        })
+
+
+class TestSaveArtifact(TestCase):
+    """Test saving files as Artifacts."""
+
+    def test_same_content(self):
+        """Test that a file with the content of an existing Artifact reuses it."""
+        with TemporaryDirectory() as directory:
+            artifacts = []
+            for name in ('first', 'second'):
+                path = os.path.join(directory, name)
+                with open(path, 'wb') as fp:
+                    fp.write(b'meow' * 100)
+                artifacts.append(save_artifact(path))
+        self.assertEqual(artifacts[0].pk, artifacts[1].pk)
+
+
+class TestLazyModule(TestCase):
+    """Test modules imported on first use."""
+
+    def test_import_on_use(self):
+        """Test that the module is imported by the first attribute used."""
+        module = LazyModule('json')
+        self.assertIsNone(module.module)
+        self.assertIs(module.dumps, json.dumps)
+        self.assertIs(module.module, json)
+
+    def test_optional(self):
+        """Test that a module which is not installed is None."""
+        self.assertIsInstance(optional_module('json'), LazyModule)
+        self.assertIsNone(optional_module('pulp_shelter_no_such_module'))
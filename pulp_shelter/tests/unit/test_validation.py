@@ -0,0 +1,64 @@
+from django.test import TestCase
+
+from pulp_shelter.app.manifest import RECORD_FIELDS, RECORD_SCHEMA
+from pulp_shelter.app.validation import is_relative_path, validate_batch, validate_record
+
+
+class TestValidateRecord(TestCase):
+    """Test the validation of manifest records."""
+
+    entry = {
+        'species': 'cat',
+        'breed': 'siamese',
+        'name': 'Kitty',
+        'age': 3,
+        'sex': 'female',
+        'weight': 4.2,
+        'bio': '',
+        'shelter': 'Brno',
+        'picture': 'cats/kitty.jpg',
+        'sha256': '0' * 64,
+    }
+
+    def errors(self, **changes):
+        """Validate the entry with some values changed."""
+        entry = dict(self.entry, **changes)
+        return validate_record(tuple(entry.get(field) for field in RECORD_FIELDS), RECORD_SCHEMA)
+
+    def test_valid(self):
+        """Test that a complete entry, and one without optional fields, are valid."""
+        self.assertEqual(self.errors(), {})
+        self.assertEqual(self.errors(sex=None, reserved=None, sha256=None, size=None), {})
+
+    def test_invalid(self):
+        """Test that each field is checked against the constraints of the model."""
+        self.assertEqual(set(self.errors(species=None)), {'species'})
+        self.assertEqual(set(self.errors(name='  ')), {'name'})
+        self.assertEqual(set(self.errors(breed='x' * 256)), {'breed'})
+        self.assertEqual(set(self.errors(age='3')), {'age'})
+        self.assertEqual(set(self.errors(age=True)), {'age'})
+        self.assertEqual(set(self.errors(age=-1)), {'age'})
+        self.assertEqual(set(self.errors(weight=float('nan'))), {'weight'})
+        self.assertEqual(set(self.errors(sex='other')), {'sex'})
+        self.assertEqual(set(self.errors(reserved=1)), {'reserved'})
+        self.assertEqual(set(self.errors(sha256='0' * 63)), {'sha256'})
+        self.assertEqual(set(self.errors(size=1.5, bio=[])), {'size', 'bio'})
+
+    def test_batch(self):
+        """Test that only the invalid records of a batch are returned, with their index."""
+        # None stands for a line which is not a record, quarantined by the sync itself.
+        valid = tuple(self.entry.get(field) for field in RECORD_FIELDS)
+        invalid = tuple(None for field in RECORD_FIELDS)
+        result = validate_batch([valid, invalid, None, valid], RECORD_SCHEMA)
+        self.assertEqual([index for index, errors in result], [1])
+        self.assertIn('picture', result[0][1])
+
+    def test_relative_path(self):
+        """Test that pictures must not point outside of the manifest directory."""
+        self.assertTrue(is_relative_path('cats/kitty.jpg'))
+        self.assertTrue(is_relative_path('cats/..kitty.jpg'))
+        self.assertFalse(is_relative_path('../kitty.jpg'))
+        self.assertFalse(is_relative_path('cats/../../kitty.jpg'))
+        self.assertFalse(is_relative_path('/kitty.jpg'))
+        self.assertFalse(is_relative_path('http://example.com/kitty.jpg'))
+        self.assertFalse(is_relative_path('//example.com/kitty.jpg'))
@@ -0,0 +1,119 @@
+import hashlib
+import os
+from tempfile import TemporaryDirectory
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from pulp_shelter.app.models import Animal, PictureUpload, PictureUploadChunk
+from pulp_shelter.app.queries import query_budget
+from pulp_shelter.app.uploads import create_file, write_chunk
+from pulp_shelter.app.utils import save_artifact
+from pulp_shelter.app.viewsets import AnimalViewSet
+
+
+class TestAnimalQueryBudget(TestCase):
+    """Test that the animal API runs a fixed number of queries."""
+
+    def setUp(self):
+        """Create a user and a page worth of animals."""
+        self.user = get_user_model().objects.create(username='shelter-query-budget')
+        for number in range(20):
+            Animal.objects.create(
+                species='cat',
+                breed='siamese',
+                name='Kitty {}'.format(number),
+                age=number,
+                weight=4.2,
+                bio='Purrs a lot.',
+                shelter='Brno',
+                picture='cats/kitty-{}.jpg'.format(number)
+            )
+
+    def test_list(self):
+        """Test that a page of animals is listed within a fixed budget of queries."""
+        request = APIRequestFactory().get('/pulp/api/v3/content/shelter/animal/')
+        force_authenticate(request, user=self.user)
+        view = AnimalViewSet.as_view({'get': 'list'})
+        with query_budget(max_queries=5):
+            response = view(request)
+            response.render()
+        self.assertEqual(response.status_code, 200)
+
+    def test_create(self):
+        """Test that an animal is created within a fixed budget of queries."""
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'rex.jpg')
+            with open(path, 'wb') as fp:
+                fp.write(b'woof' * 100)
+            artifact = save_artifact(path)
+        request = APIRequestFactory().post('/pulp/api/v3/content/shelter/animal/', {
+            '_artifact': '/pulp/api/v3/artifacts/{}/'.format(artifact.pk),
+            'species': 'dog',
+            'breed': 'beagle',
+            'name': 'Rex',
+            'shelter': 'Brno',
+            'picture': 'dogs/rex.jpg',
+        }, format='json')
+        force_authenticate(request, user=self.user)
+        view = AnimalViewSet.as_view({'post': 'create'})
+        with query_budget(max_queries=12):
+            response = view(request)
+            response.render()
+        self.assertEqual(response.status_code, 201)
+
+
+class TestCommitUpload(TestCase):
+    """Test creating an animal with a picture uploaded in chunks."""
+
+    def setUp(self):
+        """Create a user, an animal and a complete picture upload."""
+        self.user = get_user_model().objects.create(username='shelter-commit-upload')
+        Animal.objects.create(species='dog', breed='beagle', name='Rex', age=2, weight=12.5,
+                              bio='Fetches.', shelter='Brno', picture='dogs/rex.jpg')
+        picture = b'woof' * 100
+        self.upload = PictureUpload.objects.create(
+            size=len(picture), sha256=hashlib.sha256(picture).hexdigest()
+        )
+        create_file(self.upload.path, self.upload.size)
+        size, sha256 = write_chunk(self.upload.path, 0, [picture])
+        PictureUploadChunk.objects.create(upload=self.upload, offset=0, size=size, sha256=sha256)
+
+    def tearDown(self):
+        """Remove the file of the upload, if it is left."""
+        if os.path.exists(self.upload.path):
+            os.remove(self.upload.path)
+
+    def commit(self, **fields):
+        """Commit the upload.
+
+        :param fields: The fields of the animal.
+        :returns: The rendered response.
+        """
+        request = APIRequestFactory().post(
+            '/pulp/api/v3/content/shelter/animal/uploads/{}/commit/'.format(self.upload.pk),
+            dict(species='dog', breed='beagle', age=2, weight=12.5, bio='Fetches.',
+                 shelter='Brno', **fields),
+            format='json'
+        )
+        force_authenticate(request, user=self.user)
+        view = AnimalViewSet.as_view({'post': 'commit_upload'})
+        response = view(request, upload_pk=str(self.upload.pk))
+        response.render()
+        return response
+
+    def test_conflict_retry(self):
+        """Test that an animal saved meanwhile leaves the upload whole, to commit again."""
+        # The animal is saved by another request after the fields were validated.
+        with mock.patch.object(Animal, 'validate_unique'):
+            response = self.commit(name='Max', picture='dogs/rex.jpg')
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(PictureUpload.objects.filter(pk=self.upload.pk).exists())
+        self.assertTrue(os.path.exists(self.upload.path))
+
+        response = self.commit(name='Max', picture='dogs/max.jpg')
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse(PictureUpload.objects.filter(pk=self.upload.pk).exists())
+        self.assertEqual(Animal.objects.get(name='Max').picture, 'dogs/max.jpg')
@@ -0,0 +1,51 @@
+"""Utilities for the unit tests of the shelter plugin."""
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+from pulpcore.app.models import Task
+from pulpcore.plugin.models import ContentArtifact
+from rq.job import _job_stack
+
+from pulp_shelter.app.models import Animal
+
+
+@contextmanager
+def running_task(worker='shelter-unit-tests'):
+    """Run a block as the job of an rq worker, as tasks expect.
+
+    pulpcore attaches progress reports and created resources to the task of the current rq job,
+    and makes the working directory of a task after its job.
+
+    :param worker: The name of the worker, whose queue the job comes from.
+    :returns: The task.
+    """
+    task = Task.objects.create(state='running')
+    _job_stack.push(SimpleNamespace(id=str(task.pk), origin=worker))
+    try:
+        yield task
+    finally:
+        _job_stack.pop()
+
+
+def create_animals(count, shelters=1):
+    """Create animals, each with a picture not downloaded yet.
+
+    :param count: The number of animals.
+    :param shelters: The number of shelters the animals are dealt into.
+    :returns: A list of the animals.
+    """
+    animals = []
+    for number in range(count):
+        animal = Animal.objects.create(
+            species='cat',
+            breed='siamese',
+            name='Kitty {}'.format(number),
+            age=number,
+            weight=4.2,
+            bio='Purrs a lot.',
+            shelter='Shelter {}'.format(number % shelters),
+            picture='cats/kitty-{}.jpg'.format(number)
+        )
+        ContentArtifact.objects.create(content=animal, relative_path=animal.picture)
+        animals.append(animal)
+    return animals
@@ -16,6 +16,11 @@ setup(
     url='http://example.com/',
     python_requires='>=3.6',
     install_requires=requirements,
+    extras_require={
+        'zstd': ['zstandard'],
+        'numpy': ['numpy'],
+        'prometheus': ['prometheus_client'],
+    },
     include_package_data=True,
     packages=find_packages(exclude=['tests', 'tests.*']),
     classifiers=(